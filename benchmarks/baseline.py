@@ -0,0 +1,66 @@
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from benchmarks.measure import Measurement
+
+
+@dataclass(frozen=True)
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.metric} {self.current} vs baseline {self.baseline}"
+
+
+def load(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save(path: str, params: dict, measurements: list[Measurement]) -> None:
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "params": params,
+                "measurements": {m.name: m.to_dict() for m in measurements},
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+        f.write("\n")
+
+
+def compare(
+    baseline: dict, measurements: list[Measurement], threshold: float
+) -> list[Regression]:
+    # p50/p95 latency may grow by `threshold` (a fraction) before it counts
+    # as a regression, p99 is too noisy to gate on; query counts are
+    # deterministic and may not grow at all.
+    regressions = []
+    for m in measurements:
+        base = baseline["measurements"].get(m.name)
+        if base is None:
+            continue
+
+        for metric in ("p50_ms", "p95_ms"):
+            if getattr(m, metric) > base[metric] * (1 + threshold):
+                regressions.append(
+                    Regression(m.name, metric, base[metric], getattr(m, metric))
+                )
+
+        if m.queries_per_op > base["queries_per_op"]:
+            regressions.append(
+                Regression(
+                    m.name, "queries_per_op", base["queries_per_op"], m.queries_per_op
+                )
+            )
+
+    return regressions
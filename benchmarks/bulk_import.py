@@ -0,0 +1,83 @@
+# Imports the same outline tree task by task with create_task, as the task
+# form does, and at once with import_tasks, then a much larger tree with
+# import_tasks only. Both go into a file-backed WAL database.
+#
+#   python -m benchmarks.bulk_import
+#   python -m benchmarks.bulk_import --depth 3 --large-depth 5
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Iterator
+
+from benchmarks.generators import make_user
+from planner.core import migrations
+from planner.core.models import db as models_db
+from planner.core.usecase import bulk_import
+from planner.core.usecase import tasks as task_usecase
+from planner.web import database
+
+
+def outline(depth: int, fan_out: int) -> Iterator[str]:
+    def walk(level: int, name: str) -> Iterator[str]:
+        yield f"{'  ' * level}{name}\n"
+        if level < depth:
+            for i in range(fan_out):
+                yield from walk(level + 1, f"{name}.{i}")
+
+    yield from walk(0, "task")
+
+
+def import_one_by_one(username: str, depth: int, fan_out: int) -> None:
+    user = make_user(username)
+    parents = {}
+    for item in bulk_import.parse("outline", outline(depth, fan_out)):
+        parents[item.key] = task_usecase.create_task(
+            user, item.name, parent_task=parents.get(item.parent_key)
+        )
+
+
+def import_at_once(username: str, depth: int, fan_out: int) -> None:
+    task_usecase.import_tasks(
+        make_user(username), bulk_import.parse("outline", outline(depth, fan_out))
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument("--large-depth", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = database.open_database(os.path.join(tmp_dir, "planner.db"))
+        models_db.initialize(db)
+        migrations.migrate(db)
+
+        cases = [
+            ("create_task", import_one_by_one, args.depth),
+            ("import_tasks", import_at_once, args.depth),
+            ("import_tasks", import_at_once, args.large_depth),
+        ]
+        rates = []
+        for i, (name, run, depth) in enumerate(cases):
+            count = sum(args.fan_out**level for level in range(depth + 1))
+            started_at = time.perf_counter()
+            run(f"user-{i}", depth, args.fan_out)
+            seconds = time.perf_counter() - started_at
+            rates.append(count / seconds)
+            print(
+                f"{name:<13} {count:>8} tasks  {seconds:8.3f} s"
+                f"  {rates[-1]:10.0f} tasks/s"
+            )
+
+        print(f"import_tasks is {rates[1] / rates[0]:.0f}x faster on the same tree")
+        db.close_all()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
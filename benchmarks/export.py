@@ -0,0 +1,131 @@
+# Streams a user's task export of about a million rows in each format and
+# reports the peak RSS of the exporting process. It grows only by what SQLite
+# caches, at most the 64 MiB of the cache_size pragma, whatever the number of
+# rows. `--naive` also measures loading every task as a model instance
+# first, for comparison.
+#
+#   python -m benchmarks.export
+#   python -m benchmarks.export --depth 5 --fan-out 10 --naive
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import make_tree
+from benchmarks.generators import make_user
+from planner.core import migrations
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.models import db as models_db
+from planner.core.usecase import export as export_usecase
+from planner.web import database
+
+
+USERNAME = "export-user"
+
+
+def open_models_db(path: str) -> None:
+    models_db.initialize(database.open_database(path))
+
+
+def seed(path: str, depth: int, fan_out: int) -> None:
+    open_models_db(path)
+    migrations.migrate(models_db.obj)
+    make_tree(make_user(USERNAME), depth, fan_out)
+    models_db.obj.close_all()
+
+
+def export(path: str, format: str, gzip: bool, naive: bool, results) -> None:
+    open_models_db(path)
+    user_id = User.get(username=USERNAME).id
+    started_rss = current_rss_mb()
+    started_at = time.perf_counter()
+
+    if naive:
+        tasks = list(Task.select().where(Task.user_id == user_id).order_by(Task.id))
+        chunks = [
+            json.dumps(
+                {
+                    "id": t.id,
+                    "parent_id": t.parent_task_id,
+                    "name": t.name,
+                    "note": t.note,
+                    "progress": t.progress,
+                    "created_at": t.created_at.isoformat(),
+                }
+            ).encode("utf-8")
+            for t in tasks
+        ]
+    else:
+        chunks = export_usecase.export_tasks(user_id, format)
+    if gzip:
+        chunks = export_usecase.gzip_chunks(chunks)
+
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+
+    results.put(
+        (
+            time.perf_counter() - started_at,
+            size,
+            started_rss,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        )
+    )
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def run_in_process(context, target, *args) -> None:
+    process = context.Process(target=target, args=args)
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit(f"{target.__name__} failed with exit code {process.exitcode}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument(
+        "--naive", action="store_true", help="also measure an in-memory export"
+    )
+    args = parser.parse_args()
+
+    rows = sum(args.fan_out**level for level in range(args.depth + 1))
+    cases = [(f, gzip, False) for f in export_usecase.FORMATS for gzip in (False, True)]
+    if args.naive:
+        cases.append(("ndjson", False, True))
+
+    # Every step runs in its own process, so seeding does not inflate the
+    # peak RSS of the exports and each export starts from the same state.
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "planner.db")
+        print(f"seeding {rows} tasks")
+        run_in_process(context, seed, path, args.depth, args.fan_out)
+
+        results = context.SimpleQueue()
+        for format, gzip, naive in cases:
+            run_in_process(context, export, path, format, gzip, naive, results)
+            seconds, size, started_rss, peak_rss = results.get()
+            name = f"{'naive ' if naive else ''}{format}{'.gz' if gzip else ''}"
+            print(
+                f"{name:<14} {rows / seconds:10.0f} rows/s  {size / 2**20:8.1f} MiB"
+                f"  rss {started_rss:6.1f} MiB at start, {peak_rss:7.1f} MiB peak"
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import datetime
+from dataclasses import dataclass
+from typing import Callable
+from typing import Optional
+
+import peewee as pw
+
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.models import db
+
+
+@dataclass(frozen=True)
+class Tree:
+    root_id: int
+    # Task ids by depth, `levels[0] == [root_id]`.
+    levels: list[list[int]]
+
+    @property
+    def leaf_ids(self) -> list[int]:
+        return self.levels[-1]
+
+
+def make_user(username: str) -> User:
+    return User.create(username=username, password_hash="-")
+
+
+def make_tree(
+    user: User,
+    depth: int,
+    fan_out: int,
+    make_name: Callable[[int], str] = lambda task_id: f"task {task_id}",
+    make_note: Callable[[int], Optional[str]] = lambda task_id: None,
+) -> Tree:
+    # Inserts a full tree of `depth` levels below the root, every inner task
+    # having `fan_out` subtasks, with consistent hierarchy and aggregates.
+    # Ids are assigned up front so each level is a single multi-row insert.
+    next_id = (Task.select(pw.fn.MAX(Task.id)).scalar() or 0) + 1
+    root_id = next_id
+    created_at = datetime.datetime.utcnow()
+
+    def row(task_id, parent_id, path, level):
+        return {
+            "id": task_id,
+            "user": user.id,
+            "parent_task": parent_id,
+            "root_task": root_id,
+            "name": make_name(task_id),
+            "note": make_note(task_id),
+            "progress": 0,
+            "created_at": created_at,
+            "child_count": fan_out if level < depth else 0,
+            "child_progress_sum": 0,
+            "path": path,
+            "depth": level,
+        }
+
+    levels = [[next_id]]
+    paths = {next_id: "/"}
+    rows = [row(next_id, None, "/", 0)]
+    next_id += 1
+    for level in range(1, depth + 1):
+        ids = []
+        for parent_id in levels[-1]:
+            path = f"{paths[parent_id]}{parent_id}/"
+            for _ in range(fan_out):
+                paths[next_id] = path
+                rows.append(row(next_id, parent_id, path, level))
+                ids.append(next_id)
+                next_id += 1
+        levels.append(ids)
+
+    with db.atomic():
+        for batch in pw.chunked(rows, 500):
+            Task.insert_many(batch).execute()
+
+    return Tree(root_id=levels[0][0], levels=levels)
+
+
+def make_forest(users: int, depth: int, fan_out: int) -> list[tuple[User, Tree]]:
+    return [
+        (user, make_tree(user, depth, fan_out))
+        for user in (make_user(f"user-{i}") for i in range(users))
+    ]
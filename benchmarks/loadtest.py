@@ -0,0 +1,442 @@
+# Drives the whole app with a mix of logins, page views and task changes
+# from concurrent threads or processes, each one a user in a browser, and
+# reports throughput, latency percentiles and errors per endpoint. The app
+# runs against a throwaway database seeded with users and task trees and is
+# called in-process through WSGI, or over a local socket through a server.
+# PLANNER_* variables set in the environment configure the app.
+#
+#   python -m benchmarks.loadtest
+#   python -m benchmarks.loadtest --workers 8 --processes --transport socket
+#   python -m benchmarks.loadtest --mix browse=50,create=30,complete=20
+#   python -m benchmarks.loadtest --record trace.ndjson
+#   python -m benchmarks.loadtest --replay trace.ndjson
+#
+# Errors are requests answered with a 5xx status or with the error page; a
+# "database is locked" error is reported as lock contention on its own.
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+import flask
+from werkzeug.serving import make_server
+
+from benchmarks.generators import make_tree
+from planner import web
+from planner.core import sharding
+from planner.core.models import User
+from planner.web import database
+from planner.web.config import Config
+
+
+PASSWORD = "password"
+DEFAULT_MIX = "login=1,browse=70,create=15,complete=10,remove=4"
+# Set on responses to requests that failed on an unexpected error.
+ERROR_HEADER = "X-Loadtest-Error"
+
+
+@dataclass(frozen=True)
+class Request:
+    method: str
+    path: str
+    form: Optional[dict] = None
+
+    def to_dict(self) -> dict:
+        return {"method": self.method, "path": self.path, "form": self.form}
+
+
+@dataclass
+class SeededUser:
+    username: str
+    # Tasks with subtasks, where new tasks go, and the rest.
+    inner_task_ids: list[int]
+    leaf_task_ids: list[int]
+
+
+@dataclass(frozen=True)
+class Sample:
+    endpoint: str
+    seconds: float
+    # "ok", "error", "lock" or "busy" (the password hasher or the login
+    # throttle turned it down).
+    outcome: str
+
+
+@dataclass
+class WorkerResult:
+    samples: list[Sample] = field(default_factory=list)
+    trace: list[Request] = field(default_factory=list)
+
+
+def instrument(app: flask.Flask) -> None:
+    # The app answers unexpected errors with an error page and logs them;
+    # the log record tells which request failed and why.
+    class ErrorFlagHandler(logging.Handler):
+        def emit(self, record: logging.LogRecord) -> None:
+            if flask.has_request_context() and record.exc_info:
+                flask.g.loadtest_error = (
+                    "lock" if is_lock_error(record.exc_info[1]) else "error"
+                )
+
+    logging.getLogger("planner.web").addHandler(ErrorFlagHandler())
+
+    @app.after_request
+    def flag_error(response: flask.Response) -> flask.Response:
+        error = flask.g.pop("loadtest_error", None)
+        if error is not None:
+            response.headers[ERROR_HEADER] = error
+        return response
+
+
+def is_lock_error(exc: Optional[BaseException]) -> bool:
+    return isinstance(exc, sqlite3.OperationalError) and "locked" in str(exc)
+
+
+def create_app() -> flask.Flask:
+    app = web.create_app(Config.from_env())
+    instrument(app)
+    return app
+
+
+def seed(
+    app: flask.Flask, users: int, trees: int, depth: int, fan_out: int
+) -> list[SeededUser]:
+    # Users sign up through the app, their trees go straight to their shard.
+    client = app.test_client()
+    seeded = []
+    with app.app_context():
+        shards = database.get_shards()
+        for i in range(users):
+            username = f"user-{i}"
+            client.post(
+                "/forms/sign-up",
+                data={
+                    "username": username,
+                    "password": PASSWORD,
+                    "password_copy": PASSWORD,
+                },
+            )
+            with sharding.bound(shards.directory):
+                user = User.get(username=username)
+            shards.ensure_user(user.id)
+            seeded_user = SeededUser(username, [], [])
+            with sharding.bound(shards.for_user(user.id)):
+                for _ in range(trees):
+                    tree = make_tree(user, depth, fan_out)
+                    for level in tree.levels[:-1]:
+                        seeded_user.inner_task_ids.extend(level)
+                    seeded_user.leaf_task_ids.extend(tree.leaf_ids)
+            seeded.append(seeded_user)
+    return seeded
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in ("login", "browse", "create", "complete", "remove"):
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}")
+        mix[kind.strip()] = int(weight)
+    return mix
+
+
+def generate_requests(
+    user: SeededUser, mix: dict[str, int], seed: int
+) -> Iterator[Request]:
+    # A session of a user: a login, then requests drawn from the mix. Tasks
+    # are picked from the user's trees; a removed one is not picked again.
+    rng = random.Random(seed)
+    inner_task_ids = list(user.inner_task_ids)
+    leaf_task_ids = list(user.leaf_task_ids)
+    login = Request(
+        "POST", "/forms/login", {"username": user.username, "password": PASSWORD}
+    )
+    kinds, weights = list(mix), list(mix.values())
+
+    yield login
+    for i in itertools.count():
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "login":
+            yield login
+        elif kind == "browse":
+            task_id = rng.choice(inner_task_ids)
+            yield Request(
+                "GET",
+                rng.choice(
+                    [
+                        "/active-tasks",
+                        "/completed-tasks",
+                        f"/tasks/{task_id}",
+                        f"/tasks/{task_id}/tree",
+                    ]
+                ),
+            )
+        elif kind == "create":
+            yield Request(
+                "POST",
+                "/forms/tasks/create",
+                {"name": f"task #{i}", "parent_task_id": rng.choice(inner_task_ids)},
+            )
+        elif leaf_task_ids:
+            index = rng.randrange(len(leaf_task_ids))
+            task_id = leaf_task_ids[index]
+            if kind == "remove":
+                leaf_task_ids.pop(index)
+            yield Request("POST", f"/forms/tasks/{kind}", {"task_id": task_id})
+
+
+class WsgiClient:
+    def __init__(self, app: flask.Flask):
+        self.client = app.test_client()
+
+    def request(self, request: Request) -> tuple[int, Optional[str]]:
+        response = self.client.open(
+            request.path, method=request.method, data=request.form
+        )
+        return response.status_code, response.headers.get(ERROR_HEADER)
+
+
+class SocketClient:
+    # Keeps the session cookie like a browser, follows no redirects.
+
+    def __init__(self, port: int):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port)
+        self.cookies: dict[str, str] = {}
+
+    def request(self, request: Request) -> tuple[int, Optional[str]]:
+        headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items())}
+        body = None
+        if request.form is not None:
+            body = urllib.parse.urlencode(request.form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self.connection.request(request.method, request.path, body, headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, _, value = header.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value.strip()
+        return response.status, response.headers.get(ERROR_HEADER)
+
+
+def drive(
+    app: flask.Flask,
+    client,
+    requests: Iterable[Request],
+    count: Optional[int],
+    deadline: Optional[float],
+) -> WorkerResult:
+    # Sends `count` requests at most, stopping at `deadline` if any.
+    adapter = app.url_map.bind("localhost")
+    result = WorkerResult()
+    for i, request in enumerate(requests):
+        if (count is not None and i >= count) or (
+            deadline is not None and time.monotonic() >= deadline
+        ):
+            break
+
+        endpoint, _ = adapter.match(request.path, method=request.method)
+        started_at = time.perf_counter()
+        status, error = client.request(request)
+        seconds = time.perf_counter() - started_at
+
+        if error is not None:
+            outcome = error
+        elif status in (429, 503):
+            outcome = "busy"
+        elif status >= 500:
+            outcome = "error"
+        else:
+            outcome = "ok"
+        result.samples.append(Sample(f"{request.method} {endpoint}", seconds, outcome))
+        result.trace.append(request)
+    return result
+
+
+def run_worker(args, app, port, requests, barrier) -> WorkerResult:
+    client = WsgiClient(app) if port is None else SocketClient(port)
+    barrier.wait()
+    deadline = None if args.duration is None else time.monotonic() + args.duration
+    count = None if args.replay else args.requests
+    return drive(app, client, requests, count, deadline)
+
+
+def run_process(args, app, port, index, requests, barrier, results) -> None:
+    # Over WSGI the process runs its own app: the parent's background
+    # threads, the write queue among them, do not survive the fork.
+    if port is None:
+        app = create_app()
+    results.put((index, run_worker(args, app, port, requests, barrier)))
+
+
+def load_trace(path: str) -> tuple[dict, dict[int, list[Request]]]:
+    # The first line holds the seeding options, the others the requests of
+    # every worker in the order they were sent.
+    with open(path, encoding="utf-8") as f:
+        options = json.loads(f.readline())
+        requests: dict[int, list[Request]] = defaultdict(list)
+        for line in f:
+            item = json.loads(line)
+            requests[item["worker"]].append(
+                Request(item["method"], item["path"], item["form"])
+            )
+    return options, requests
+
+
+def save_trace(path: str, options: dict, results: list[WorkerResult]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(options) + "\n")
+        for worker, result in enumerate(results):
+            for request in result.trace:
+                f.write(json.dumps({"worker": worker, **request.to_dict()}) + "\n")
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    # Nearest rank of sorted `latencies`.
+    return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+
+def report(results: list[WorkerResult], elapsed: float) -> None:
+    by_endpoint: dict[str, list[Sample]] = defaultdict(list)
+    for result in results:
+        for sample in result.samples:
+            by_endpoint[sample.endpoint].append(sample)
+            by_endpoint["total"].append(sample)
+
+    print(
+        f"{'endpoint':<32} {'requests':>8} {'req/s':>8} {'p50 ms':>8}"
+        f" {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'locked':>6} {'busy':>6}"
+    )
+    for endpoint in sorted(by_endpoint, key=lambda e: (e == "total", e)):
+        samples = by_endpoint[endpoint]
+        latencies = sorted(s.seconds * 1000 for s in samples)
+        outcomes = defaultdict(int)
+        for sample in samples:
+            outcomes[sample.outcome] += 1
+        print(
+            f"{endpoint:<32} {len(samples):>8} {len(samples) / elapsed:>8.1f}"
+            f" {percentile(latencies, 0.50):>8.2f} {percentile(latencies, 0.95):>8.2f}"
+            f" {percentile(latencies, 0.99):>8.2f} {outcomes['error']:>6}"
+            f" {outcomes['lock']:>6} {outcomes['busy']:>6}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--processes", action="store_true", help="run workers as processes"
+    )
+    parser.add_argument("--transport", choices=("wsgi", "socket"), default="wsgi")
+    parser.add_argument("--requests", type=int, default=200, help="per worker")
+    parser.add_argument("--duration", type=float, default=None, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--trees", type=int, default=2, help="per user")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fan-out", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", type=str, default=None, help="trace to write")
+    parser.add_argument("--replay", type=str, default=None, help="trace to replay")
+    args = parser.parse_args()
+
+    options = {
+        "users": args.users,
+        "trees": args.trees,
+        "depth": args.depth,
+        "fan_out": args.fan_out,
+    }
+    if args.replay:
+        options, traces = load_trace(args.replay)
+        args.workers = len(traces)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update(
+            PLANNER_DB_PATH=os.path.join(tmp_dir, "planner.db"),
+            PLANNER_DB_SHARD_PATH=os.path.join(tmp_dir, "planner-shard-{shard}.db"),
+        )
+        for name, value in (
+            ("PLANNER_SECRET_KEY", "loadtest"),
+            ("PLANNER_PBKDF2_PWD_HASHER_HASH_FUNC", "sha256"),
+            ("PLANNER_PBKDF2_PWD_HASHER_ITERATIONS", "1000"),
+            ("PLANNER_PBKDF2_PWD_HASHER_SALT_LENGTH", "16"),
+        ):
+            os.environ.setdefault(name, value)
+        app = create_app()
+        users = seed(app, **options)
+        print(
+            f"{len(users)} users with {options['trees']} trees of"
+            f" {len(users[0].inner_task_ids) + len(users[0].leaf_task_ids)}"
+            f" tasks in all each, {args.workers} {args.transport}"
+            f" {'processes' if args.processes else 'threads'}"
+        )
+
+        if args.replay:
+            worker_requests = [traces[worker] for worker in sorted(traces)]
+        else:
+            worker_requests = [
+                generate_requests(users[i % len(users)], args.mix, args.seed + i)
+                for i in range(args.workers)
+            ]
+
+        server = port = None
+        if args.transport == "socket":
+            # Without a line logged per request.
+            logging.getLogger("werkzeug").setLevel(logging.WARNING)
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            port = server.server_port
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        started_at = time.perf_counter()
+        if args.processes:
+            context = multiprocessing.get_context("fork")
+            barrier = context.Barrier(args.workers)
+            results_queue = context.SimpleQueue()
+            processes = [
+                context.Process(
+                    target=run_process,
+                    args=(args, app, port, i, requests, barrier, results_queue),
+                )
+                for i, requests in enumerate(worker_requests)
+            ]
+            for process in processes:
+                process.start()
+            results = [r for _, r in sorted(results_queue.get() for _ in processes)]
+            for process in processes:
+                process.join()
+        else:
+            barrier = threading.Barrier(args.workers)
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                results = list(
+                    executor.map(
+                        lambda requests: run_worker(args, app, port, requests, barrier),
+                        worker_requests,
+                    )
+                )
+        elapsed = time.perf_counter() - started_at
+
+        if server is not None:
+            server.shutdown()
+        report(results, elapsed)
+        if args.record:
+            save_trace(args.record, options, results)
+        app.config["DATABASE"].close_all()
+
+
+if __name__ == "__main__":
+    main()
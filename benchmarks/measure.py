@@ -0,0 +1,74 @@
+import statistics
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Callable
+from typing import Iterator
+
+import peewee as pw
+
+
+@dataclass(frozen=True)
+class Measurement:
+    name: str
+    runs: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries_per_op: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class QueryCounter:
+    # Counts the statements a database executes while it is watched.
+
+    def __init__(self):
+        self.count = 0
+
+    @contextmanager
+    def watch(self, database: pw.Database) -> Iterator["QueryCounter"]:
+        execute_sql = database.execute_sql
+
+        def counting_execute_sql(*args, **kwargs):
+            self.count += 1
+            return execute_sql(*args, **kwargs)
+
+        database.execute_sql = counting_execute_sql
+        try:
+            yield self
+        finally:
+            del database.execute_sql
+
+
+def measure(
+    name: str,
+    database: pw.Database,
+    operation: Callable[[int], object],
+    runs: int,
+    warmup: int = 5,
+) -> Measurement:
+    # Calls `operation(i)` for i in [0, warmup + runs) and measures the last
+    # `runs` calls; every call must get its own `i` to work on.
+    for i in range(warmup):
+        operation(i)
+
+    latencies = []
+    counter = QueryCounter()
+    with counter.watch(database):
+        for i in range(warmup, warmup + runs):
+            started_at = time.perf_counter()
+            operation(i)
+            latencies.append(time.perf_counter() - started_at)
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return Measurement(
+        name=name,
+        runs=runs,
+        p50_ms=round(quantiles[49] * 1000, 3),
+        p95_ms=round(quantiles[94] * 1000, 3),
+        p99_ms=round(quantiles[98] * 1000, 3),
+        queries_per_op=round(counter.count / runs, 2),
+    )
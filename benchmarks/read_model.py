@@ -0,0 +1,124 @@
+# Loading and rendering a 10k-task tree as TaskNode tuples in a TaskTree
+# against model instances in a dict of child lists, the way the tree page
+# used to: build and render latency, and the memory the loaded tree holds.
+#
+#   python -m benchmarks.read_model
+#   python -m benchmarks.read_model --depth 4 --fan-out 10 --runs 20
+import argparse
+import os
+import tempfile
+import tracemalloc
+from typing import Callable
+
+from flask import render_template
+
+from benchmarks.generators import make_tree
+from benchmarks.generators import make_user
+from benchmarks.measure import measure
+from benchmarks.run import format_measurement
+from planner import web
+from planner.core.models import Task
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.web.config import Config
+
+
+class ModelTree:
+    # The former tree: every task a model instance, children in lists.
+
+    def __init__(self, task: Task, max_depth: int):
+        self.root = task
+        self.children: dict[int, list[Task]] = {task.id: []}
+        prefix = task.subtree_path()
+        # fmt: off
+        for node in (
+            Task
+            .select()
+            .where(
+                (Task.path >= prefix)
+                & (Task.path < prefix[:-1] + "0")
+                & (Task.depth <= task.depth + max_depth)
+            )
+            .order_by(Task.depth, Task.created_at, Task.id)
+        ):
+            siblings = self.children.get(node.parent_task_id)
+            if siblings is not None:
+                siblings.append(node)
+                self.children[node.id] = []
+        # fmt: on
+
+    def loaded_count(self) -> int:
+        return len(self.children) - 1
+
+    def completed_count(self) -> int:
+        return sum(
+            1 for nodes in self.children.values() for n in nodes if n.progress == 100
+        )
+
+    def children_of(self, node: Task) -> list[Task]:
+        return self.children.get(node.id, [])
+
+    def hidden_children_count(self, node: Task) -> int:
+        return node.child_count - len(self.children_of(node))
+
+
+def held_bytes(build: Callable[[], object]) -> int:
+    # Memory still allocated once the tree is built, i.e. what it holds.
+    tracemalloc.start()
+    try:
+        tree = build()
+        held, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tree
+    return held
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update(
+            PLANNER_SECRET_KEY="benchmark",
+            PLANNER_DB_PATH=os.path.join(tmp_dir, "planner.db"),
+            PLANNER_PBKDF2_PWD_HASHER_HASH_FUNC="sha256",
+            PLANNER_PBKDF2_PWD_HASHER_ITERATIONS="1000",
+            PLANNER_PBKDF2_PWD_HASHER_SALT_LENGTH="16",
+            # Its queries would be counted against the measured operations.
+            PLANNER_PURGE_ENABLED="false",
+        )
+        app = web.create_app(Config.from_env())
+        db = app.config["DATABASE"]
+        models_db.initialize(db)
+
+        tree = make_tree(make_user("user"), args.depth, args.fan_out)
+        root = Task.get_by_id(tree.root_id)
+        node_count = sum(len(level) for level in tree.levels)
+        builds = {
+            "model": lambda: ModelTree(root, args.depth),
+            "node": lambda: task_usecase.get_task_tree(root, args.depth, node_count),
+        }
+
+        print(f"{node_count} tasks in the tree")
+        for name, build in builds.items():
+            measurement = measure(f"build/{name}", db, lambda i: build(), args.runs)
+            print(format_measurement(measurement))
+        with app.test_request_context():
+            for name, build in builds.items():
+                render = lambda i, tree=build(): render_template(  # noqa: E731
+                    "pages/task-tree.html", tree=tree, depth=args.depth
+                )
+                measurement = measure(f"render/{name}", db, render, args.runs)
+                print(format_measurement(measurement))
+        for name, build in builds.items():
+            print(f"{'memory/' + name:<22} {held_bytes(build) / 2**20:8.2f} MiB")
+
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
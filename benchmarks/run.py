@@ -0,0 +1,176 @@
+# Measures task use cases and pages on synthetic trees in a file-backed WAL
+# database, reports p50/p95/p99 and queries per operation and compares them
+# with a JSON baseline; a regression beyond the threshold fails the run.
+#
+#   python -m benchmarks.run                   # compare with the baseline
+#   python -m benchmarks.run --save-baseline   # store a new baseline
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Callable
+
+from benchmarks import baseline
+from benchmarks.generators import make_forest
+from benchmarks.generators import make_tree
+from benchmarks.generators import make_user
+from benchmarks.measure import Measurement
+from benchmarks.measure import measure
+from planner import web
+from planner.core.models import Task
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.web.config import Config
+
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def load_tasks(task_ids: list[int]) -> list[Task]:
+    tasks = {t.id: t for t in Task.select().where(Task.id.in_(task_ids))}
+    return [tasks[i] for i in task_ids]
+
+
+def interleave(trees_ids: list[list[int]], count: int, skip: int = 0) -> list[int]:
+    # Picks `count` ids round-robin over the trees, so every user gets load.
+    longest = max(len(ids) for ids in trees_ids)
+    picked = [ids[j] for j in range(longest) for ids in trees_ids if j < len(ids)]
+    picked = picked[skip : skip + count]
+    if len(picked) < count:
+        raise SystemExit(f"the trees are too small for {count} runs, grow them")
+    return picked
+
+
+def run_benchmarks(args: argparse.Namespace, tmp_dir: str) -> list[Measurement]:
+    os.environ.update(
+        PLANNER_SECRET_KEY="benchmark",
+        PLANNER_DB_PATH=os.path.join(tmp_dir, "planner.db"),
+        PLANNER_PBKDF2_PWD_HASHER_HASH_FUNC="sha256",
+        PLANNER_PBKDF2_PWD_HASHER_ITERATIONS="1000",
+        PLANNER_PBKDF2_PWD_HASHER_SALT_LENGTH="16",
+        # Its queries would be counted against the measured operations.
+        PLANNER_PURGE_ENABLED="false",
+    )
+    app = web.create_app(Config.from_env())
+    db = app.config["DATABASE"]
+    models_db.initialize(db)
+
+    forest = make_forest(args.users, args.depth, args.fan_out)
+    page_user = make_user("page-user")
+    page_tree = make_tree(page_user, depth=1, fan_out=args.page_subtasks)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["uid"] = page_user.id
+        session["uname"] = page_user.username
+
+    total = args.runs + args.warmup
+    leaf_ids = [tree.leaf_ids for _, tree in forest]
+    deep_parents = load_tasks(interleave(leaf_ids, total))
+    completed = load_tasks(interleave(leaf_ids, total, skip=total))
+    removed = load_tasks(interleave(leaf_ids, total, skip=total * 2))
+    subtrees = load_tasks(interleave([t.levels[-3] for _, t in forest], total))
+    wide_parent = Task.get_by_id(page_tree.root_id)
+    users = {user.id: user for user, _ in forest}
+    etags: dict[str, str] = {}
+
+    def revalidate(url: str) -> None:
+        # The first, warmup call stores the ETag that later calls revalidate.
+        response = client.get(url, headers={"If-None-Match": etags.get(url, "")})
+        etags.setdefault(url, response.headers["ETag"])
+
+    cases: list[tuple[str, Callable[[int], object]]] = [
+        (
+            "create_task/deep",
+            lambda i: task_usecase.create_task(
+                users[deep_parents[i].user_id], "new", parent_task=deep_parents[i]
+            ),
+        ),
+        (
+            "create_task/wide",
+            lambda i: task_usecase.create_task(
+                page_user, "new", parent_task=wide_parent
+            ),
+        ),
+        ("complete_task/leaf", lambda i: task_usecase.complete_task(completed[i])),
+        ("remove_task/leaf", lambda i: task_usecase.remove_task(removed[i])),
+        ("remove_task/subtree", lambda i: task_usecase.remove_task(subtrees[i])),
+        ("page/task", lambda i: client.get(f"/tasks/{page_tree.root_id}")),
+        ("page/active-tasks", lambda i: client.get("/active-tasks")),
+        ("page/active-tasks/304", lambda i: revalidate("/active-tasks")),
+    ]
+
+    measurements = []
+    for name, operation in cases:
+        measurements.append(measure(name, db, operation, args.runs, args.warmup))
+        print(format_measurement(measurements[-1]))
+
+    db.close_all()
+    return measurements
+
+
+def format_measurement(m: Measurement) -> str:
+    return (
+        f"{m.name:<22} p50 {m.p50_ms:8.3f} ms  p95 {m.p95_ms:8.3f} ms"
+        f"  p99 {m.p99_ms:8.3f} ms  {m.queries_per_op:6.2f} queries/op"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--fan-out", type=int, default=4)
+    parser.add_argument("--page-subtasks", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store the results as baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="allowed latency growth over the baseline, as a fraction",
+    )
+    parser.add_argument("--output", type=str, default=None, help="results JSON path")
+    args = parser.parse_args()
+
+    params = {
+        "users": args.users,
+        "depth": args.depth,
+        "fan_out": args.fan_out,
+        "page_subtasks": args.page_subtasks,
+        "runs": args.runs,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        measurements = run_benchmarks(args, tmp_dir)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump([m.to_dict() for m in measurements], f, indent=2)
+
+    if args.save_baseline:
+        baseline.save(args.baseline, params, measurements)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    stored = baseline.load(args.baseline)
+    if stored is None:
+        print(f"no baseline at {args.baseline}, nothing to compare with")
+        return 0
+    if stored["params"] != params:
+        print(f"baseline was measured with {stored['params']}, not comparable")
+        return 0
+
+    regressions = baseline.compare(stored, measurements, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
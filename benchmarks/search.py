@@ -0,0 +1,91 @@
+# Full-text task search against a LIKE scan over names and notes, on 100k+
+# tasks of several users in a file-backed WAL database.
+#
+#   python -m benchmarks.search --users 10 --depth 4 --fan-out 10
+import argparse
+import random
+import tempfile
+
+from benchmarks.generators import make_tree
+from benchmarks.generators import make_user
+from benchmarks.measure import measure
+from benchmarks.run import format_measurement
+from planner.core import migrations
+from planner.core.models import Task
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.web import database
+
+
+SYLLABLES = "ba ce di fo gu ka le mi no pu ra se ti vo zu an el in or us".split()
+
+
+def make_words(rng: random.Random, count: int) -> list[str]:
+    # Pseudo-words, so that every one of them is rare like real task terms.
+    words: set[str] = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(3)))
+    return sorted(words)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = make_words(rng, args.vocabulary)
+
+    def make_name(task_id: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(3))
+
+    def make_note(task_id: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(12))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = database.open_database(f"{tmp_dir}/planner.db")
+        models_db.initialize(db)
+        migrations.migrate(db)
+
+        users = [make_user(f"user-{i}") for i in range(args.users)]
+        for user in users:
+            make_tree(user, args.depth, args.fan_out, make_name, make_note)
+        print(f"{Task.select().count()} tasks")
+
+        # A whole word and the prefix of another one, as while typing.
+        queries = [
+            f"{rng.choice(words)} {rng.choice(words)[:4]}" for _ in range(args.runs + 5)
+        ]
+
+        def search(i: int) -> list[Task]:
+            return task_usecase.search_tasks(
+                users[i % len(users)].id, queries[i], args.limit
+            )
+
+        def like_scan(i: int) -> list[Task]:
+            word, prefix = queries[i].split()
+            matches = lambda s: s.contains(word) & s.contains(prefix)  # noqa: E731
+            # fmt: off
+            return list(
+                Task
+                .select()
+                .where(
+                    (Task.user_id == users[i % len(users)].id)
+                    & (matches(Task.name) | matches(Task.note))
+                )
+                .limit(args.limit)
+            )
+            # fmt: on
+
+        print(format_measurement(measure("search/fts5", db, search, args.runs)))
+        print(format_measurement(measure("search/like", db, like_scan, args.runs)))
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Task creation throughput of concurrent writer processes, each one writing
+# the tasks of its own user, with every user in one database file and with
+# the users spread over as many shards as there are writers. Writers of one
+# file serialize on its write lock; writers of different shards do not.
+#
+#   python -m benchmarks.sharding
+#   python -m benchmarks.sharding --writers 1 2 4 8 --operations 2000
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from planner.core import migrations
+from planner.core import sharding
+from planner.core.models import User
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.web import database
+
+
+def open_shards(tmp_dir: str, shard_count: int) -> sharding.Shards:
+    return sharding.Shards(
+        database.open_database(os.path.join(tmp_dir, "planner.db")),
+        [
+            database.open_database(os.path.join(tmp_dir, f"shard-{i}.db"))
+            for i in range(shard_count)
+        ],
+    )
+
+
+def seed(tmp_dir: str, shard_count: int, writers: int) -> list[int]:
+    # A user per writer, each one in a shard of their own when sharded.
+    shards = open_shards(tmp_dir, shard_count)
+    for db in shards.all():
+        migrations.migrate(db)
+
+    models_db.initialize(shards.directory)
+    user_ids: list[int] = []
+    used_shards = set()
+    while len(user_ids) < writers:
+        user = User.create(username=f"writer-{time.monotonic_ns()}", password_hash="-")
+        shard = shards.for_user(user.id)
+        if shard_count and shard in used_shards:
+            continue
+        used_shards.add(shard)
+        shards.ensure_user(user.id)
+        user_ids.append(user.id)
+
+    for db in shards.all():
+        db.close_all()
+    return user_ids
+
+
+def write(tmp_dir, shard_count, user_id, operations, barrier, results) -> None:
+    shards = open_shards(tmp_dir, shard_count)
+    models_db.initialize(shards.for_user(user_id))
+    user = User.get_by_id(user_id)
+    root = task_usecase.create_task(user, "root")
+
+    barrier.wait()
+    started_at = time.perf_counter()
+    for i in range(operations):
+        task_usecase.create_task(user, f"#{i}", parent_task=root)
+    results.put((started_at, time.perf_counter()))
+
+
+def run(shard_count: int, writers: int, operations: int) -> float:
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        user_ids = seed(tmp_dir, shard_count, writers)
+        barrier = context.Barrier(writers)
+        results = context.SimpleQueue()
+        processes = [
+            context.Process(
+                target=write,
+                args=(tmp_dir, shard_count, user_id, operations, barrier, results),
+            )
+            for user_id in user_ids
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            if process.exitcode != 0:
+                raise SystemExit(f"writer failed with exit code {process.exitcode}")
+
+        spans = [results.get() for _ in processes]
+        seconds = max(end for _, end in spans) - min(start for start, _ in spans)
+        return writers * operations / seconds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--operations", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.operations} tasks per writer")
+    for writers in args.writers:
+        single_rate = run(0, writers, args.operations)
+        sharded_rate = run(writers, writers, args.operations)
+        if writers == args.writers[0]:
+            base_rate = sharded_rate / writers
+        print(
+            f"{writers:>2} writers  single file {single_rate:8.0f} tasks/s"
+            f"  {writers} shards {sharded_rate:8.0f} tasks/s"
+            f"  ({sharded_rate / single_rate:4.1f}x single file,"
+            f" {sharded_rate / base_rate:4.1f}x one writer)"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
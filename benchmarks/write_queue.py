@@ -0,0 +1,81 @@
+# Compares task creation throughput and latency of concurrent writers that
+# commit on their own (today's path) with the group-commit write queue.
+#
+#   python -m benchmarks.write_queue --threads 16 --operations 200
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from planner.core import migrations
+from planner.core.models import User
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.core.write_queue import WriteQueue
+from planner.web import database
+
+
+def run(
+    threads: int, operations: int, write: Callable[[Callable], object]
+) -> list[float]:
+    user = User.create(username=f"bench-{time.monotonic_ns()}", password_hash="-")
+    root = task_usecase.create_task(user, "root")
+    barrier = threading.Barrier(threads)
+
+    def worker(_: int) -> list[float]:
+        latencies = []
+        barrier.wait()
+        for i in range(operations):
+            started_at = time.perf_counter()
+            write(lambda: task_usecase.create_task(user, f"#{i}", parent_task=root))
+            latencies.append(time.perf_counter() - started_at)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return [
+            i for latencies in executor.map(worker, range(threads)) for i in latencies
+        ]
+
+
+def report(name: str, latencies: list[float], elapsed: float) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:>12}: {len(latencies) / elapsed:8.0f} ops/s"
+        f"  p50 {quantiles[49] * 1000:7.2f} ms"
+        f"  p99 {quantiles[98] * 1000:7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = database.open_database(f"{tmp_dir}/planner.db")
+        models_db.initialize(db)
+        migrations.migrate(db)
+
+        started_at = time.perf_counter()
+        latencies = run(args.threads, args.operations, lambda op: op())
+        report("direct", latencies, time.perf_counter() - started_at)
+
+        write_queue = WriteQueue(db, args.max_batch_size, args.max_delay_ms / 1000)
+        started_at = time.perf_counter()
+        latencies = run(args.threads, args.operations, write_queue.call)
+        report("write queue", latencies, time.perf_counter() - started_at)
+        write_queue.close()
+
+        stats = write_queue.stats()
+        print(f"{stats.operations / stats.batches:.1f} operations per commit")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import argparse
+import datetime
+import sys
+
+from planner.core import migrations
+from planner.core import sharding
+from planner.core.models import User
+from planner.core.models import db as models_db
+from planner.core.purger import TaskPurger
+from planner.core.usecase import bulk_import
+from planner.core.usecase import export as export_usecase
+from planner.core.usecase import stats as stats_usecase
+from planner.core.usecase import tasks as task_usecase
+from planner.web import database
+from planner.web.config import Config
+
+
+def migrate(args: argparse.Namespace) -> int:
+    for name in migrations.migrate(models_db.obj, target=args.target):
+        print(f"applied {name}")
+    print(f"schema version {migrations.current_version(models_db.obj)}")
+    return 0
+
+
+def schema_version(args: argparse.Namespace) -> int:
+    print(f"schema version {migrations.current_version(models_db.obj)}")
+    for version, name in migrations.pending_migrations(models_db.obj):
+        print(f"pending {name}")
+    return 0
+
+
+def check_task_aggregates(args: argparse.Namespace) -> int:
+    drift = task_usecase.check_task_aggregates()
+    for item in drift:
+        print(
+            f"task {item.task_id}: stored (count, sum, progress) = {item.stored},"
+            f" expected {item.expected}"
+        )
+    print(f"{len(drift)} task(s) with drifted aggregates")
+    return 1 if drift else 0
+
+
+def rebuild_task_aggregates(args: argparse.Namespace) -> int:
+    drift = task_usecase.rebuild_task_aggregates()
+    print(f"{len(drift)} task(s) rebuilt")
+    return 0
+
+
+def rebuild_task_hierarchy(args: argparse.Namespace) -> int:
+    updated = task_usecase.rebuild_task_hierarchy()
+    print(f"{updated} task(s) rebuilt")
+    return 0
+
+
+def rebuild_task_search(args: argparse.Namespace) -> int:
+    task_usecase.rebuild_task_search()
+    print("task search index rebuilt")
+    return 0
+
+
+def export_tasks(args: argparse.Namespace) -> int:
+    user = User.get_or_none(username=args.username)
+    if user is None:
+        print(f"no user {args.username!r}", file=sys.stderr)
+        return 1
+
+    chunks = export_usecase.export_tasks(user.id, args.format)
+    if args.gzip:
+        chunks = export_usecase.gzip_chunks(chunks)
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        with sharding.bound(args.shards.for_user(user.id)):
+            for chunk in chunks:
+                output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    return 0
+
+
+def import_tasks(args: argparse.Namespace) -> int:
+    user = User.get_or_none(username=args.username)
+    if user is None:
+        print(f"no user {args.username!r}", file=sys.stderr)
+        return 1
+
+    args.shards.ensure_user(user.id)
+    input = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    try:
+        with sharding.bound(args.shards.for_user(user.id)):
+            imported_count = task_usecase.import_tasks(
+                user, bulk_import.parse(args.format, input)
+            )
+    except bulk_import.InvalidImport as exc:
+        print(f"nothing imported: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if input is not sys.stdin:
+            input.close()
+
+    print(f"{imported_count} task(s) imported")
+    return 0
+
+
+def archive_completed_tasks(args: argparse.Namespace) -> int:
+    archived_count = task_usecase.archive_completed_trees(
+        datetime.datetime.utcnow() - datetime.timedelta(days=args.days),
+        args.batch_size,
+    )
+    print(f"{archived_count} completed tree(s) archived")
+    return 0
+
+
+def purge_removed_tasks(args: argparse.Namespace) -> int:
+    purged_count = TaskPurger(args.batch_size).run()
+    print(f"{purged_count} removed task(s) purged")
+    return 0
+
+
+def backfill_task_stats(args: argparse.Namespace) -> int:
+    user_count = stats_usecase.backfill_task_stats()
+    print(f"task statistics of {user_count} user(s) rebuilt")
+    return 0
+
+
+def rebalance_shards(args: argparse.Namespace) -> int:
+    shards = args.shards
+    # Shard files of a larger former shard count are moved from as well.
+    old_shards = [
+        database.open_database(sharding.shard_path(args.shard_path, i))
+        for i in range(len(shards.shards), args.from_shards)
+    ]
+    for db in [*shards.all(), *old_shards]:
+        migrations.migrate(db)
+        # Progress queued by deferred changes is not moved along.
+        with sharding.bound(db):
+            task_usecase.recompute_dirty_tasks(batch_size=500)
+    moved = sharding.rebalance(shards, [*shards.all(), *old_shards])
+    for user_id, task_count in moved:
+        print(f"user {user_id}: {task_count} task(s) moved")
+    print(f"{len(moved)} user(s) moved to {len(shards.shards)} shard(s)")
+    return 0
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--env", type=str, default=None, help="environment configuration file path"
+)
+subparsers = parser.add_subparsers(dest="command", required=True)
+
+migrate_parser = subparsers.add_parser(
+    "migrate", help="apply pending schema migrations"
+)
+migrate_parser.add_argument(
+    "--target", type=int, default=None, help="last schema version to apply"
+)
+migrate_parser.set_defaults(handler=migrate)
+
+subparsers.add_parser(
+    "schema-version", help="show the schema version and pending migrations"
+).set_defaults(handler=schema_version)
+
+subparsers.add_parser(
+    "check-task-aggregates",
+    help="recompute task aggregates from scratch and report drift",
+).set_defaults(handler=check_task_aggregates)
+
+subparsers.add_parser(
+    "rebuild-task-aggregates",
+    help="recompute task aggregates from scratch and store them",
+).set_defaults(handler=rebuild_task_aggregates)
+
+subparsers.add_parser(
+    "rebuild-task-hierarchy",
+    help="recompute root, path and depth of every task from parent links",
+).set_defaults(handler=rebuild_task_hierarchy)
+
+subparsers.add_parser(
+    "rebuild-task-search",
+    help="rebuild the full-text search index of task names and notes",
+).set_defaults(handler=rebuild_task_search)
+
+export_parser = subparsers.add_parser(
+    "export-tasks", help="stream every task of a user as NDJSON or CSV"
+)
+export_parser.add_argument("username", type=str)
+export_parser.add_argument("--format", choices=export_usecase.FORMATS, default="ndjson")
+export_parser.add_argument("--gzip", action="store_true", help="gzip the output")
+export_parser.add_argument(
+    "--output", type=str, default="-", help="output file path, stdout by default"
+)
+export_parser.set_defaults(handler=export_tasks)
+
+import_parser = subparsers.add_parser(
+    "import-tasks", help="import a tree of tasks for a user in one transaction"
+)
+import_parser.add_argument("username", type=str)
+import_parser.add_argument("path", type=str, help="input file path, - for stdin")
+import_parser.add_argument("--format", choices=bulk_import.FORMATS, default="outline")
+import_parser.set_defaults(handler=import_tasks)
+
+archive_parser = subparsers.add_parser(
+    "archive-completed-tasks",
+    help="move completed top-level tasks and their subtasks to the archive",
+)
+archive_parser.add_argument(
+    "--days", type=int, default=30, help="archive trees older than this many days"
+)
+archive_parser.add_argument(
+    "--batch-size", type=int, default=100, help="trees archived per transaction"
+)
+archive_parser.set_defaults(handler=archive_completed_tasks)
+
+purge_parser = subparsers.add_parser(
+    "purge-removed-tasks", help="delete the rows of removed tasks and their subtasks"
+)
+purge_parser.add_argument(
+    "--batch-size", type=int, default=500, help="tasks deleted per transaction"
+)
+purge_parser.set_defaults(handler=purge_removed_tasks)
+
+subparsers.add_parser(
+    "backfill-task-stats",
+    help="rebuild the daily task statistics of every user from their tasks",
+).set_defaults(handler=backfill_task_stats)
+
+rebalance_parser = subparsers.add_parser(
+    "rebalance-shards",
+    help="move every user's tasks to their shard, e.g. from a single database file",
+)
+rebalance_parser.add_argument(
+    "--from-shards",
+    type=int,
+    default=0,
+    help="former shard count, when it was larger than PLANNER_DB_SHARDS",
+)
+rebalance_parser.set_defaults(handler=rebalance_shards)
+
+# Schema commands run on every database, commands over all tasks on each
+# database that holds tasks: the shards, or the single database file.
+for name in ("migrate", "schema-version"):
+    subparsers.choices[name].set_defaults(databases="all")
+for name in (
+    "check-task-aggregates",
+    "rebuild-task-aggregates",
+    "rebuild-task-hierarchy",
+    "rebuild-task-search",
+    "archive-completed-tasks",
+    "purge-removed-tasks",
+    "backfill-task-stats",
+):
+    subparsers.choices[name].set_defaults(databases="tasks")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    config = Config.from_env(args.env)
+    shards = sharding.Shards(
+        database.open_database(config.DB_PATH),
+        [
+            database.open_database(sharding.shard_path(config.DB_SHARD_PATH, i))
+            for i in range(config.DB_SHARDS)
+        ],
+    )
+    models_db.initialize(shards.directory)
+    args.shards = shards
+    args.shard_path = config.DB_SHARD_PATH
+
+    databases = {
+        "all": shards.all(),
+        "tasks": shards.shards or [shards.directory],
+    }.get(getattr(args, "databases", None), [shards.directory])
+    status = 0
+    for db in databases:
+        if len(databases) > 1:
+            print(f"{db.database}:")
+        with sharding.bound(db):
+            status = max(status, args.handler(args))
+    sys.exit(status)
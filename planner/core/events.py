@@ -0,0 +1,49 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+from typing import Iterator
+
+
+@dataclass(frozen=True)
+class TasksChanged:
+    user_id: int
+    # Tasks whose own page shows something that has changed: the changed
+    # tasks themselves, their ancestors and, on removal, the removed subtree.
+    task_ids: frozenset[int]
+    root_tasks_changed: bool
+
+
+_handlers: defaultdict[type, list[Callable]] = defaultdict(list)
+_local = threading.local()
+
+
+def subscribe(event_type: type, handler: Callable) -> None:
+    _handlers[event_type].append(handler)
+
+
+def unsubscribe(event_type: type, handler: Callable) -> None:
+    _handlers[event_type].remove(handler)
+
+
+def emit(event: object) -> None:
+    collected = getattr(_local, "collected", None)
+    if collected is not None:
+        collected.append(event)
+        return
+
+    for handler in list(_handlers[type(event)]):
+        handler(event)
+
+
+@contextmanager
+def collect() -> Iterator[list[object]]:
+    # Holds back the events emitted by the calling thread inside the block;
+    # the caller emits them once the changes they describe are committed.
+    origin_collected = getattr(_local, "collected", None)
+    _local.collected = []
+    try:
+        yield _local.collected
+    finally:
+        _local.collected = origin_collected
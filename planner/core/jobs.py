@@ -0,0 +1,42 @@
+import logging
+import threading
+from typing import Callable
+
+import peewee as pw
+
+from planner.core.models import db
+
+
+class PeriodicJob:
+    # Calls `func` on its own thread, bound to `database`, every `interval`
+    # seconds until closed. A failing call is logged and retried on the next
+    # round, so the job resumes wherever its last committed batch ended.
+
+    def __init__(
+        self, database: pw.Database, name: str, interval: float, func: Callable
+    ):
+        self._database = database
+        self._interval = interval
+        self._func = func
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        db.bind_thread(self._database)
+        try:
+            while not self._closed.is_set():
+                try:
+                    self._func()
+                except Exception:
+                    logger = logging.getLogger(__name__)
+                    logger.exception("job %s failed:", self._thread.name)
+                self._closed.wait(self._interval)
+        finally:
+            db.unbind_thread()
+            self._database.close()
@@ -0,0 +1,73 @@
+import datetime
+import importlib
+import pkgutil
+import re
+from types import ModuleType
+from typing import Optional
+
+import peewee as pw
+
+
+class SchemaVersion(pw.Model):
+    class Meta:
+        table_name = "schema_version"
+
+    version = pw.IntegerField(primary_key=True)
+    name = pw.TextField()
+    applied_at = pw.DateTimeField()
+
+
+_MIGRATION_NAME_RE = re.compile(r"^v(?P<version>\d{4})_\w+$")
+
+
+def list_migrations() -> list[tuple[int, str]]:
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MIGRATION_NAME_RE.match(module_info.name)
+        if match is not None:
+            migrations.append((int(match["version"]), module_info.name))
+
+    return sorted(migrations)
+
+
+def current_version(db: pw.Database) -> int:
+    with db.bind_ctx([SchemaVersion]):
+        if not SchemaVersion.table_exists():
+            return 0
+        return SchemaVersion.select(pw.fn.MAX(SchemaVersion.version)).scalar() or 0
+
+
+def pending_migrations(db: pw.Database) -> list[tuple[int, str]]:
+    version = current_version(db)
+    return [i for i in list_migrations() if i[0] > version]
+
+
+def migrate(db: pw.Database, target: Optional[int] = None) -> list[str]:
+    applied = []
+    with db.bind_ctx([SchemaVersion]):
+        SchemaVersion.create_table()
+
+        for version, name in list_migrations():
+            if target is not None and version > target:
+                break
+
+            # IMMEDIATE takes the write lock up front, so of several workers
+            # starting at once only the first one applies the migration.
+            with db.atomic("IMMEDIATE"):
+                if SchemaVersion.get_or_none(version=version) is not None:
+                    continue
+
+                _load_migration(name).upgrade(db)
+                SchemaVersion.create(
+                    version=version,
+                    name=name,
+                    applied_at=datetime.datetime.utcnow(),
+                )
+
+            applied.append(name)
+
+    return applied
+
+
+def _load_migration(name: str) -> ModuleType:
+    return importlib.import_module(f"{__name__}.{name}")
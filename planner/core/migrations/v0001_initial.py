@@ -0,0 +1,29 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    db.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "users" ('
+        ' "id" INTEGER NOT NULL PRIMARY KEY,'
+        ' "username" VARCHAR(255) NOT NULL,'
+        ' "password_hash" TEXT NOT NULL)'
+    )
+    db.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS "user_username" ON "users" ("username")'
+    )
+    db.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "tasks" ('
+        ' "id" INTEGER NOT NULL PRIMARY KEY,'
+        ' "user_id" INTEGER NOT NULL,'
+        ' "parent_task_id" INTEGER,'
+        ' "name" TEXT NOT NULL,'
+        ' "note" TEXT,'
+        ' "progress" REAL NOT NULL,'
+        ' "created_at" DATETIME NOT NULL,'
+        ' FOREIGN KEY ("user_id") REFERENCES "users" ("id"),'
+        ' FOREIGN KEY ("parent_task_id") REFERENCES "tasks" ("id"))'
+    )
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "task_user_id" ON "tasks" ("user_id")')
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "task_parent_task_id" ON "tasks" ("parent_task_id")'
+    )
@@ -0,0 +1,49 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    columns = {c.name for c in db.get_columns("tasks")}
+    if "child_count" in columns:
+        return
+
+    db.execute_sql(
+        'ALTER TABLE "tasks" ADD COLUMN "child_count" INTEGER NOT NULL DEFAULT 0'
+    )
+    db.execute_sql(
+        'ALTER TABLE "tasks" ADD COLUMN "child_progress_sum" REAL NOT NULL DEFAULT 0'
+    )
+
+    rows = db.execute_sql(
+        'SELECT "id", "parent_task_id", "progress" FROM "tasks"'
+    ).fetchall()
+    progress = {task_id: task_progress for task_id, _, task_progress in rows}
+    children: dict[int, list[int]] = {}
+    for task_id, parent_task_id, _ in rows:
+        children.setdefault(parent_task_id, []).append(task_id)
+
+    updates = []
+    stack = [(i, False) for i in children.get(None, [])]
+    while stack:
+        task_id, is_visited = stack.pop()
+        child_ids = children.get(task_id, [])
+        if not child_ids:
+            continue
+        if not is_visited:
+            stack.append((task_id, True))
+            stack.extend((i, False) for i in child_ids)
+            continue
+
+        child_count = len(child_ids)
+        child_progress_sum = round(sum(progress[i] for i in child_ids), 2)
+        # A task at 100% may have been completed whatever its subtasks.
+        if progress[task_id] != 100:
+            progress[task_id] = round(
+                (child_progress_sum / (child_count * 100)) * 100, 2
+            )
+        updates.append((child_count, child_progress_sum, progress[task_id], task_id))
+
+    db.cursor().executemany(
+        'UPDATE "tasks" SET "child_count" = ?, "child_progress_sum" = ?,'
+        ' "progress" = ? WHERE "id" = ?',
+        updates,
+    )
@@ -0,0 +1,45 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    columns = {c.name for c in db.get_columns("tasks")}
+    if "path" in columns:
+        return
+
+    db.execute_sql(
+        'ALTER TABLE "tasks" ADD COLUMN "root_task_id" INTEGER'
+        ' REFERENCES "tasks" ("id")'
+    )
+    db.execute_sql('ALTER TABLE "tasks" ADD COLUMN "path" TEXT NOT NULL DEFAULT \'/\'')
+    db.execute_sql('ALTER TABLE "tasks" ADD COLUMN "depth" INTEGER NOT NULL DEFAULT 0')
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "task_root_task_id" ON "tasks" ("root_task_id")'
+    )
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "task_path" ON "tasks" ("path")')
+
+    db.execute_sql(
+        "CREATE TEMP TABLE task_hierarchy ("
+        " id INTEGER NOT NULL PRIMARY KEY,"
+        " root_task_id INTEGER NOT NULL,"
+        " path TEXT NOT NULL,"
+        " depth INTEGER NOT NULL)"
+    )
+    db.execute_sql(
+        "INSERT INTO temp.task_hierarchy"
+        " WITH RECURSIVE h(id, root_task_id, path, depth) AS ("
+        "  SELECT id, id, '/', 0 FROM tasks WHERE parent_task_id IS NULL"
+        "  UNION ALL"
+        "  SELECT t.id, h.root_task_id, h.path || h.id || '/', h.depth + 1"
+        "  FROM tasks AS t JOIN h ON t.parent_task_id = h.id"
+        " )"
+        " SELECT id, root_task_id, path, depth FROM h"
+    )
+    db.execute_sql(
+        "UPDATE tasks SET"
+        " root_task_id = (SELECT root_task_id FROM temp.task_hierarchy AS h"
+        "  WHERE h.id = tasks.id),"
+        " path = (SELECT path FROM temp.task_hierarchy AS h WHERE h.id = tasks.id),"
+        " depth = (SELECT depth FROM temp.task_hierarchy AS h WHERE h.id = tasks.id)"
+        " WHERE id IN (SELECT id FROM temp.task_hierarchy)"
+    )
+    db.execute_sql("DROP TABLE temp.task_hierarchy")
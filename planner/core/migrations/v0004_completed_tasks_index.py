@@ -0,0 +1,11 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # Completed root tasks page: equality on every column up to created_at,
+    # so the keyset range and its ORDER BY come straight from the index.
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS"
+        ' "task_user_id_parent_task_id_progress_created_at_id"'
+        ' ON "tasks" ("user_id", "parent_task_id", "progress", "created_at", "id")'
+    )
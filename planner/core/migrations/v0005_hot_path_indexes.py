@@ -0,0 +1,17 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # Active root tasks page: progress != 100 is not an equality, so it is
+    # kept after created_at and filtered from the index entries.
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "task_user_id_parent_task_id_created_at_progress"'
+        ' ON "tasks" ("user_id", "parent_task_id", "created_at", "progress")'
+    )
+    # Subtasks of a task in creation order; replaces the plain foreign key
+    # index, which is a prefix of this one.
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "task_parent_task_id_created_at_id"'
+        ' ON "tasks" ("parent_task_id", "created_at", "id")'
+    )
+    db.execute_sql('DROP INDEX IF EXISTS "task_parent_task_id"')
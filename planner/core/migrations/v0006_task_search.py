@@ -0,0 +1,37 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # External content table: the index stores only the terms, names and
+    # notes are read from "tasks". Triggers keep it in sync on every write,
+    # whichever code path makes it.
+    db.execute_sql(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS "task_search" USING fts5('
+        ' "name", "note", content="tasks", content_rowid="id",'
+        " tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    db.execute_sql(
+        'CREATE TRIGGER IF NOT EXISTS "task_search_insert" AFTER INSERT ON "tasks"'
+        " BEGIN"
+        '  INSERT INTO "task_search" ("rowid", "name", "note")'
+        "  VALUES (new.id, new.name, new.note);"
+        " END"
+    )
+    db.execute_sql(
+        'CREATE TRIGGER IF NOT EXISTS "task_search_delete" AFTER DELETE ON "tasks"'
+        " BEGIN"
+        '  INSERT INTO "task_search" ("task_search", "rowid", "name", "note")'
+        "  VALUES ('delete', old.id, old.name, old.note);"
+        " END"
+    )
+    db.execute_sql(
+        'CREATE TRIGGER IF NOT EXISTS "task_search_update"'
+        ' AFTER UPDATE OF "name", "note" ON "tasks"'
+        " BEGIN"
+        '  INSERT INTO "task_search" ("task_search", "rowid", "name", "note")'
+        "  VALUES ('delete', old.id, old.name, old.note);"
+        '  INSERT INTO "task_search" ("rowid", "name", "note")'
+        "  VALUES (new.id, new.name, new.note);"
+        " END"
+    )
+    db.execute_sql('INSERT INTO "task_search" ("task_search") VALUES (\'rebuild\')')
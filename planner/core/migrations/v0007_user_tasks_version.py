@@ -0,0 +1,11 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    columns = {c.name for c in db.get_columns("users")}
+    if "tasks_version" in columns:
+        return
+
+    db.execute_sql(
+        'ALTER TABLE "users" ADD COLUMN "tasks_version" INTEGER NOT NULL DEFAULT 0'
+    )
@@ -0,0 +1,41 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # Completed trees moved out of "tasks", row for row. Rows keep the ids
+    # the tasks had, so parent, root and path still describe the tree, but
+    # new tasks may take those ids meanwhile: rows are keyed by their own
+    # "archive_id" and grouped by "tree_id", a number per archived tree.
+    db.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "archived_tasks" ('
+        ' "archive_id" INTEGER NOT NULL PRIMARY KEY,'
+        ' "tree_id" INTEGER NOT NULL,'
+        ' "id" INTEGER NOT NULL,'
+        ' "user_id" INTEGER NOT NULL,'
+        ' "parent_task_id" INTEGER,'
+        ' "root_task_id" INTEGER NOT NULL,'
+        ' "name" TEXT NOT NULL,'
+        ' "note" TEXT,'
+        ' "progress" REAL NOT NULL,'
+        ' "created_at" DATETIME NOT NULL,'
+        ' "child_count" INTEGER NOT NULL,'
+        ' "child_progress_sum" REAL NOT NULL,'
+        ' "path" TEXT NOT NULL,'
+        ' "depth" INTEGER NOT NULL,'
+        ' "archived_at" DATETIME NOT NULL,'
+        ' FOREIGN KEY ("user_id") REFERENCES "users" ("id"))'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "archivedtask_tree_id"'
+        ' ON "archived_tasks" ("tree_id")'
+    )
+    # Archived roots on the completed tasks page, in its keyset order.
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "archivedtask_user_id_parent_task_id_created_at_id"'
+        ' ON "archived_tasks" ("user_id", "parent_task_id", "created_at", "id")'
+    )
+
+    # A restored tree is kept out of the archive for another full period.
+    columns = {c.name for c in db.get_columns("tasks")}
+    if "restored_at" not in columns:
+        db.execute_sql('ALTER TABLE "tasks" ADD COLUMN "restored_at" DATETIME')
@@ -0,0 +1,16 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    columns = {c.name for c in db.get_columns("tasks")}
+    if "removed_at" in columns:
+        return
+
+    # Set on the top task of a removed subtree; the purger deletes the rows.
+    db.execute_sql('ALTER TABLE "tasks" ADD COLUMN "removed_at" DATETIME')
+    # Only removed tasks waiting for the purger are indexed, so the index
+    # stays tiny and "is any ancestor removed?" is a probe into it.
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "task_removed_root_task_id"'
+        ' ON "tasks" ("root_task_id") WHERE "removed_at" IS NOT NULL'
+    )
@@ -0,0 +1,17 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # Tasks whose aggregates wait for the progress worker, one row per task
+    # however many times it changed; kept in the database so that a queued
+    # recomputation survives a restart.
+    db.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "dirty_tasks" ('
+        ' "task_id" INTEGER NOT NULL PRIMARY KEY,'
+        ' "user_id" INTEGER NOT NULL,'
+        ' "marked_at" DATETIME NOT NULL,'
+        ' FOREIGN KEY ("user_id") REFERENCES "users" ("id"))'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "dirtytask_user_id" ON "dirty_tasks" ("user_id")'
+    )
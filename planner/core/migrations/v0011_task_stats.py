@@ -0,0 +1,24 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # Set when a task is completed; existing tasks get theirs from the
+    # backfill command, which also fills "daily_task_stats".
+    for table in ("tasks", "archived_tasks"):
+        columns = {c.name for c in db.get_columns(table)}
+        if "completed_at" not in columns:
+            db.execute_sql(f'ALTER TABLE "{table}" ADD COLUMN "completed_at" DATETIME')
+
+    # Completions per user and UTC day, updated along with the tasks: the
+    # statistics read a row per day whatever the number of tasks.
+    db.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "daily_task_stats" ('
+        ' "user_id" INTEGER NOT NULL,'
+        ' "day" DATE NOT NULL,'
+        ' "completed_count" INTEGER NOT NULL,'
+        ' "timed_count" INTEGER NOT NULL,'
+        ' "completion_seconds" REAL NOT NULL,'
+        ' PRIMARY KEY ("user_id", "day"),'
+        ' FOREIGN KEY ("user_id") REFERENCES "users" ("id"))'
+        " WITHOUT ROWID"
+    )
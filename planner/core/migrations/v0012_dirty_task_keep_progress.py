@@ -0,0 +1,12 @@
+import peewee as pw
+
+
+def upgrade(db: pw.Database) -> None:
+    # Set on a queued task completed since its subtasks last changed: the
+    # progress worker recomputes its aggregates but leaves its progress.
+    columns = {c.name for c in db.get_columns("dirty_tasks")}
+    if "keep_progress" not in columns:
+        db.execute_sql(
+            'ALTER TABLE "dirty_tasks"'
+            ' ADD COLUMN "keep_progress" INTEGER NOT NULL DEFAULT 0'
+        )
@@ -1,7 +1,46 @@
+import threading
+from typing import Optional
+
 import peewee as pw
+from playhouse.sqlite_ext import FTS5Model
+from playhouse.sqlite_ext import RowIDField
+from playhouse.sqlite_ext import SearchField
+
+
+class ThreadBoundDatabaseProxy(pw.DatabaseProxy):
+    # `initialize` sets the process-wide database; `bind_thread` overrides
+    # it for the calling thread only, so several apps with their own
+    # databases can serve requests side by side.
+
+    __slots__ = ("_default", "_local")
+
+    def __init__(self):
+        object.__setattr__(self, "_default", None)
+        object.__setattr__(self, "_local", threading.local())
+        super().__init__()
+
+    def __setattr__(self, attr, value):
+        if attr not in ("obj", "_callbacks"):
+            raise AttributeError("Cannot set attribute on proxy.")
+        object.__setattr__(self, attr, value)
 
+    @property
+    def obj(self) -> Optional[pw.Database]:
+        database = getattr(self._local, "database", None)
+        return self._default if database is None else database
 
-db = pw.DatabaseProxy()
+    @obj.setter
+    def obj(self, database: Optional[pw.Database]) -> None:
+        object.__setattr__(self, "_default", database)
+
+    def bind_thread(self, database: pw.Database) -> None:
+        self._local.database = database
+
+    def unbind_thread(self) -> None:
+        self._local.database = None
+
+
+db = ThreadBoundDatabaseProxy()
 
 
 class BaseModel(pw.Model):
@@ -15,6 +54,8 @@ class User(BaseModel):
 
     username = pw.CharField(unique=True)
     password_hash = pw.TextField()
+    # Bumped in the transaction of every change to the user's tasks.
+    tasks_version = pw.IntegerField(default=0)
 
 
 class Task(BaseModel):
@@ -23,10 +64,101 @@ class Task(BaseModel):
 
     user = pw.ForeignKeyField(User)
     parent_task = pw.ForeignKeyField("self", null=True)
+    root_task = pw.ForeignKeyField("self", null=True, backref="tree_tasks")
     name = pw.TextField()
     note = pw.TextField(null=True)
     progress = pw.DoubleField()
     created_at = pw.DateTimeField()
+    child_count = pw.IntegerField(default=0)
+    child_progress_sum = pw.DoubleField(default=0)
+    # Ids of the ancestors from the root down to the parent: "/", "/1/", "/1/5/".
+    path = pw.TextField(default="/")
+    depth = pw.IntegerField(default=0)
+    restored_at = pw.DateTimeField(null=True)
+    # Set on the top task of a removed subtree until the purger deletes it.
+    removed_at = pw.DateTimeField(null=True)
+    # When the task was first completed; the creation time for tasks
+    # completed before completions were recorded or imported completed.
+    completed_at = pw.DateTimeField(null=True)
 
     def is_completed(self) -> bool:
         return self.progress == 100
+
+    def is_archived(self) -> bool:
+        return False
+
+    def ancestor_ids(self) -> list[int]:
+        return [int(i) for i in self.path.strip("/").split("/") if i]
+
+    def subtree_path(self) -> str:
+        return f"{self.path}{self.id}/"
+
+
+class ArchivedTask(BaseModel):
+    # A task of a completed tree moved out of "tasks". `id` is the id the
+    # task had, which a new task may have taken since; `tree_id` numbers the
+    # archived trees.
+    class Meta:
+        table_name = "archived_tasks"
+
+    archive_id = pw.AutoField()
+    tree_id = pw.IntegerField(index=True)
+    id = pw.IntegerField()
+    user = pw.ForeignKeyField(User)
+    parent_task_id = pw.IntegerField(null=True)
+    root_task_id = pw.IntegerField()
+    name = pw.TextField()
+    note = pw.TextField(null=True)
+    progress = pw.DoubleField()
+    created_at = pw.DateTimeField()
+    child_count = pw.IntegerField()
+    child_progress_sum = pw.DoubleField()
+    path = pw.TextField()
+    depth = pw.IntegerField()
+    archived_at = pw.DateTimeField()
+    completed_at = pw.DateTimeField(null=True)
+
+    def is_completed(self) -> bool:
+        return self.progress == 100
+
+    def is_archived(self) -> bool:
+        return True
+
+
+class DirtyTask(BaseModel):
+    # A task whose aggregates are recomputed by the progress worker. Not a
+    # foreign key: the task may be purged before the worker gets to it.
+    class Meta:
+        table_name = "dirty_tasks"
+
+    task_id = pw.IntegerField(primary_key=True)
+    user = pw.ForeignKeyField(User)
+    marked_at = pw.DateTimeField()
+    # Completed since its subtasks last changed: its progress is left as is.
+    keep_progress = pw.BooleanField(default=False)
+
+
+class DailyTaskStats(BaseModel):
+    # The user's task completions on a UTC day. `timed_count` of them have a
+    # known duration, which add up to `completion_seconds`.
+    class Meta:
+        table_name = "daily_task_stats"
+        primary_key = pw.CompositeKey("user", "day")
+        without_rowid = True
+
+    user = pw.ForeignKeyField(User)
+    day = pw.DateField()
+    completed_count = pw.IntegerField()
+    timed_count = pw.IntegerField()
+    completion_seconds = pw.DoubleField()
+
+
+class TaskSearch(FTS5Model):
+    # Full-text index over task names and notes, kept in sync by triggers.
+    class Meta:
+        database = db
+        table_name = "task_search"
+
+    rowid = RowIDField()
+    name = SearchField()
+    note = SearchField()
@@ -0,0 +1,50 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from planner.core.usecase import tasks as task_usecase
+
+
+@dataclass(frozen=True)
+class TaskPurgerStats:
+    batches: int
+    purged_tasks: int
+    seconds: float
+
+
+class TaskPurger:
+    # Deletes the rows of removed subtrees left by `remove_task`, in
+    # transactions of at most `batch_size` rows so that other writers get
+    # the lock in between. Nothing is kept outside of the database: a purge
+    # cut short resumes with the rows that are still there.
+
+    def __init__(self, batch_size: int):
+        self._batch_size = batch_size
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._purged_tasks = 0
+        self._seconds = 0.0
+
+    def run(self) -> int:
+        # Purges until nothing is left; returns the number of deleted rows.
+        purged_count = 0
+        while True:
+            started_at = time.monotonic()
+            batch_count = task_usecase.purge_removed_tasks(self._batch_size)
+            with self._stats_lock:
+                if batch_count:
+                    self._batches += 1
+                self._purged_tasks += batch_count
+                self._seconds += time.monotonic() - started_at
+
+            purged_count += batch_count
+            if batch_count < self._batch_size:
+                return purged_count
+
+    def stats(self) -> TaskPurgerStats:
+        with self._stats_lock:
+            return TaskPurgerStats(
+                batches=self._batches,
+                purged_tasks=self._purged_tasks,
+                seconds=self._seconds,
+            )
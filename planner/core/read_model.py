@@ -0,0 +1,112 @@
+import datetime
+from array import array
+from typing import Iterable
+from typing import NamedTuple
+from typing import Optional
+
+from planner.core.models import Task
+
+
+class TaskNode(NamedTuple):
+    # A task as lists and trees show it. A plain tuple made straight from a
+    # row: a fraction of the memory and build time of a model instance, with
+    # nothing to track since it is never saved.
+    id: int
+    parent_task_id: Optional[int]
+    name: str
+    progress: float
+    created_at: datetime.datetime
+    child_count: int
+    depth: int
+
+    @classmethod
+    def from_task(cls, task: Task) -> "TaskNode":
+        return cls(
+            task.id,
+            task.parent_task_id,
+            task.name,
+            task.progress,
+            task.created_at,
+            task.child_count,
+            task.depth,
+        )
+
+    def is_completed(self) -> bool:
+        return self.progress == 100
+
+    def is_archived(self) -> bool:
+        return False
+
+
+# The columns of a TaskNode in its field order, for `.tuples()` and, named
+# like its fields, for `.objects(TaskNode)`.
+TASK_NODE_FIELDS = (
+    Task.id,
+    Task.parent_task.alias("parent_task_id"),
+    Task.name,
+    Task.progress,
+    Task.created_at,
+    Task.child_count,
+    Task.depth,
+)
+
+
+class TaskTree:
+    # A loaded subtree: the nodes in load order, parents before their
+    # children, and the children of every node as a run of positions in
+    # `nodes`, the node at position `i` having the children listed at
+    # `_child_positions[_child_starts[i]:_child_starts[i + 1]]`.
+
+    __slots__ = ("root", "nodes", "_positions", "_child_starts", "_child_positions")
+
+    def __init__(self, root: TaskNode, rows: Iterable[tuple]):
+        # `rows` hold TASK_NODE_FIELDS, a parent before its children; a row
+        # under a node that is not loaded is left out.
+        nodes = [root]
+        positions = {root.id: 0}
+        parent_positions = array("q", [-1])
+        for row in rows:
+            node = TaskNode._make(row)
+            parent_position = positions.get(node.parent_task_id)
+            if parent_position is not None:
+                positions[node.id] = len(nodes)
+                nodes.append(node)
+                parent_positions.append(parent_position)
+
+        child_starts = array("q", bytes(8 * (len(nodes) + 1)))
+        for parent_position in parent_positions[1:]:
+            child_starts[parent_position + 1] += 1
+        for i in range(len(nodes)):
+            child_starts[i + 1] += child_starts[i]
+        child_positions = array("q", bytes(8 * (len(nodes) - 1)))
+        next_slots = child_starts[:-1]
+        for position in range(1, len(nodes)):
+            parent_position = parent_positions[position]
+            child_positions[next_slots[parent_position]] = position
+            next_slots[parent_position] += 1
+
+        self.root = root
+        self.nodes = nodes
+        self._positions = positions
+        self._child_starts = child_starts
+        self._child_positions = child_positions
+
+    def loaded_count(self) -> int:
+        # Tasks loaded below the root.
+        return len(self.nodes) - 1
+
+    def children_of(self, node: TaskNode) -> list[TaskNode]:
+        # Loaded children in creation order.
+        position = self._positions[node.id]
+        start, end = self._child_starts[position], self._child_starts[position + 1]
+        return [self.nodes[i] for i in self._child_positions[start:end]]
+
+    def hidden_children_count(self, node: TaskNode) -> int:
+        # Children left out by the depth or size limit, to load on demand.
+        position = self._positions[node.id]
+        loaded_count = self._child_starts[position + 1] - self._child_starts[position]
+        return node.child_count - loaded_count
+
+    def completed_count(self) -> int:
+        # Completed tasks among the loaded ones below the root.
+        return sum(1 for node in self.nodes[1:] if node.progress == 100)
@@ -1,10 +1,28 @@
+import threading
+import time
 from abc import ABC
 from abc import abstractmethod
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
 
 from werkzeug.security import check_password_hash
 from werkzeug.security import generate_password_hash
 
 
+class PasswordHasherBusy(Exception):
+    ...
+
+
+@dataclass(frozen=True)
+class PasswordHasherStats:
+    completed: int
+    rejected: int
+    queue_wait_seconds: float
+    hash_seconds: float
+
+
 class PasswordHasher(ABC):
     @abstractmethod
     def make_hash(self, password: str) -> str:
@@ -14,6 +32,9 @@ class PasswordHasher(ABC):
     def is_hash_correct(self, password_hash: str, password: str) -> bool:
         ...
 
+    def needs_rehash(self, password_hash: str) -> bool:
+        return False
+
 
 class PBKDF2_PasswordHasher(PasswordHasher):
     def __init__(
@@ -27,3 +48,68 @@ class PBKDF2_PasswordHasher(PasswordHasher):
 
     def is_hash_correct(self, password_hash: str, password: str) -> bool:
         return check_password_hash(password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return not password_hash.startswith(f"{self._method}$")
+
+
+class PooledPasswordHasher(PasswordHasher):
+    # Runs another hasher on an executor and admits at most `max_pending`
+    # calls at once (running plus queued); the rest fail fast with
+    # PasswordHasherBusy instead of waiting for a worker.
+
+    def __init__(self, hasher: PasswordHasher, executor: Executor, max_pending: int):
+        self._hasher = hasher
+        self._executor = executor
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._stats_lock = threading.Lock()
+        self._completed = 0
+        self._rejected = 0
+        self._queue_wait_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    def make_hash(self, password: str) -> str:
+        return self._run(self._hasher.make_hash, password)
+
+    def is_hash_correct(self, password_hash: str, password: str) -> bool:
+        return self._run(self._hasher.is_hash_correct, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return self._hasher.needs_rehash(password_hash)
+
+    def stats(self) -> PasswordHasherStats:
+        with self._stats_lock:
+            return PasswordHasherStats(
+                completed=self._completed,
+                rejected=self._rejected,
+                queue_wait_seconds=self._queue_wait_seconds,
+                hash_seconds=self._hash_seconds,
+            )
+
+    def _run(self, func: Callable, *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            raise PasswordHasherBusy()
+
+        try:
+            submitted_at = time.time()
+            future = self._executor.submit(_timed_call, func, *args)
+            result, started_at, finished_at = future.result()
+        finally:
+            self._slots.release()
+
+        with self._stats_lock:
+            self._completed += 1
+            self._queue_wait_seconds += max(started_at - submitted_at, 0)
+            self._hash_seconds += finished_at - started_at
+
+        return result
+
+
+def _timed_call(func: Callable, *args: Any) -> tuple[Any, float, float]:
+    # Wall clock rather than a monotonic one, so the timestamps stay
+    # comparable when the call runs in a worker process.
+    started_at = time.time()
+    result = func(*args)
+    return result, started_at, time.time()
@@ -0,0 +1,253 @@
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+from typing import Optional
+
+import peewee as pw
+
+from planner.core.models import db
+
+
+_BATCH_SIZE = 500
+
+
+class Shards:
+    # The directory database holds the users; the tasks of each user live
+    # in one of the shard databases, picked by a stable hash of the user id.
+    # Every shard also keeps a row per user of its own, which the tasks
+    # reference and which holds the user's tasks version, so a task change
+    # and its version bump commit together. Without shards everything is
+    # in the directory database.
+
+    def __init__(self, directory: pw.Database, shards: list[pw.Database]):
+        self.directory = directory
+        self.shards = shards
+
+    def for_user(self, user_id: Optional[int]) -> pw.Database:
+        if user_id is None or not self.shards:
+            return self.directory
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    def all(self) -> list[pw.Database]:
+        return [self.directory, *self.shards]
+
+    def ensure_user(self, user_id: int) -> None:
+        # Copies the user's row to their shard unless it is there already.
+        shard = self.for_user(user_id)
+        if shard is self.directory:
+            return
+
+        with shard.atomic("IMMEDIATE"):
+            if shard.execute_sql(
+                'SELECT 1 FROM "users" WHERE "id" = ?', (user_id,)
+            ).fetchone():
+                return
+            username = self.directory.execute_sql(
+                'SELECT "username" FROM "users" WHERE "id" = ?', (user_id,)
+            ).fetchone()[0]
+            shard.execute_sql(
+                'INSERT INTO "users" ("id", "username", "password_hash")'
+                " VALUES (?, ?, '')",
+                (user_id, username),
+            )
+
+
+def rebalance(shards: Shards, sources: list[pw.Database]) -> list[tuple[int, int]]:
+    # Moves the tasks of every user found in `sources` that belong to
+    # another shard there, e.g. from the single file layout (the directory
+    # database) or from the shard files of a different shard count. Meant to
+    # run with the app stopped. Returns (user id, moved tasks) per user.
+    # Every user ends up with a row in their shard.
+    moved = []
+    for source in sources:
+        # fmt: off
+        user_ids = [
+            user_id for (user_id,) in source.execute_sql(
+                'SELECT "user_id" FROM "tasks"'
+                ' UNION SELECT "user_id" FROM "archived_tasks"'
+                ' UNION SELECT "user_id" FROM "daily_task_stats"'
+            )
+        ]
+        # fmt: on
+        for user_id in user_ids:
+            target = shards.for_user(user_id)
+            if target is not source:
+                moved.append(
+                    (
+                        user_id,
+                        move_user(
+                            user_id,
+                            source,
+                            target,
+                            delete_user=source is not shards.directory,
+                        ),
+                    )
+                )
+
+    if shards.shards:
+        cursor = shards.directory.execute_sql('SELECT "id" FROM "users"')
+        for (user_id,) in cursor.fetchall():
+            shards.ensure_user(user_id)
+    return moved
+
+
+def move_user(
+    user_id: int, source: pw.Database, target: pw.Database, delete_user: bool
+) -> int:
+    # Moves the user's tasks, archived tasks, task statistics and tasks
+    # version from `source` to `target`; `delete_user` drops the user's row
+    # from `source` too.
+    # The tasks keep their ids unless one of them is taken in `target`.
+    # Returns the number of moved tasks.
+    task_columns = [c.name for c in source.get_columns("tasks")]
+    archived_columns = [
+        c.name for c in source.get_columns("archived_tasks") if c.name != "archive_id"
+    ]
+    task_rows = _select_user_rows(
+        source, "tasks", task_columns, user_id, '"depth", "id"'
+    )
+    archived_rows = _select_user_rows(
+        source, "archived_tasks", archived_columns, user_id, '"archive_id"'
+    )
+    stats_columns = [c.name for c in source.get_columns("daily_task_stats")]
+    stats_rows = _select_user_rows(
+        source, "daily_task_stats", stats_columns, user_id, '"day"'
+    )
+    username, tasks_version = source.execute_sql(
+        'SELECT "username", "tasks_version" FROM "users" WHERE "id" = ?', (user_id,)
+    ).fetchone()
+
+    with target.atomic("IMMEDIATE"):
+        (target_task_count,) = target.execute_sql(
+            'SELECT COUNT(*) FROM "tasks" WHERE "user_id" = ?', (user_id,)
+        ).fetchone()
+        # Rows left behind by a run that stopped between the two commits.
+        is_copied = target_task_count > 0 and target_task_count == len(task_rows)
+        if not is_copied:
+            _insert_user(target, user_id, username, tasks_version)
+            _insert_tasks(target, task_columns, task_rows)
+            _insert_archived_tasks(target, archived_columns, archived_rows)
+            # The statistics are per user, they replace any in `target`.
+            target.execute_sql(
+                'DELETE FROM "daily_task_stats" WHERE "user_id" = ?', (user_id,)
+            )
+            _insert_rows(target, "daily_task_stats", stats_columns, stats_rows)
+
+    with source.atomic("IMMEDIATE"):
+        source.execute_sql('DELETE FROM "tasks" WHERE "user_id" = ?', (user_id,))
+        source.execute_sql(
+            'DELETE FROM "archived_tasks" WHERE "user_id" = ?', (user_id,)
+        )
+        source.execute_sql(
+            'DELETE FROM "daily_task_stats" WHERE "user_id" = ?', (user_id,)
+        )
+        if delete_user:
+            source.execute_sql('DELETE FROM "users" WHERE "id" = ?', (user_id,))
+
+    return len(task_rows)
+
+
+def shard_index(user_id: int, shard_count: int) -> int:
+    # crc32 rather than hash(), which differs between processes.
+    return zlib.crc32(str(user_id).encode("ascii")) % shard_count
+
+
+def shard_path(path_template: str, index: int) -> str:
+    return path_template.format(shard=index)
+
+
+def _select_user_rows(
+    database: pw.Database, table: str, columns: list[str], user_id: int, order: str
+) -> list[list]:
+    names = ", ".join(f'"{c}"' for c in columns)
+    cursor = database.execute_sql(
+        f'SELECT {names} FROM "{table}" WHERE "user_id" = ? ORDER BY {order}',
+        (user_id,),
+    )
+    return [list(row) for row in cursor]
+
+
+def _insert_user(
+    database: pw.Database, user_id: int, username: str, tasks_version: int
+) -> None:
+    # The version only goes up, so no stale ETag matches afterwards.
+    database.execute_sql(
+        'INSERT OR IGNORE INTO "users" ("id", "username", "password_hash")'
+        " VALUES (?, ?, '')",
+        (user_id, username),
+    )
+    database.execute_sql(
+        'UPDATE "users" SET "tasks_version" = MAX("tasks_version", ?) + 1'
+        ' WHERE "id" = ?',
+        (tasks_version, user_id),
+    )
+
+
+def _insert_tasks(database: pw.Database, columns: list[str], rows: list[list]) -> None:
+    # Parents come before their subtasks: rows are ordered by depth.
+    task_ids = [row[columns.index("id")] for row in rows]
+    is_any_id_taken = any(
+        database.execute_sql(
+            f'SELECT 1 FROM "tasks" WHERE "id" IN ({", ".join("?" * len(batch))})',
+            batch,
+        ).fetchone()
+        for batch in pw.chunked(task_ids, _BATCH_SIZE)
+    )
+    if is_any_id_taken:
+        (max_id,) = database.execute_sql('SELECT MAX("id") FROM "tasks"').fetchone()
+        new_ids = {task_id: (max_id or 0) + 1 + i for i, task_id in enumerate(task_ids)}
+        for row in rows:
+            _remap_task_row(columns, row, new_ids)
+
+    _insert_rows(database, "tasks", columns, rows)
+
+
+def _insert_archived_tasks(
+    database: pw.Database, columns: list[str], rows: list[list]
+) -> None:
+    # Archived trees are renumbered after those in `database`; the tasks in
+    # them keep their ids, which archived rows need not have to themselves.
+    (max_tree_id,) = database.execute_sql(
+        'SELECT MAX("tree_id") FROM "archived_tasks"'
+    ).fetchone()
+    tree_ids: dict[int, int] = {}
+    tree_id_index = columns.index("tree_id")
+    for row in rows:
+        tree_id = row[tree_id_index]
+        if tree_id not in tree_ids:
+            tree_ids[tree_id] = (max_tree_id or 0) + 1 + len(tree_ids)
+        row[tree_id_index] = tree_ids[tree_id]
+
+    _insert_rows(database, "archived_tasks", columns, rows)
+
+
+def _remap_task_row(columns: list[str], row: list, new_ids: dict[int, int]) -> None:
+    for column in ("id", "parent_task_id", "root_task_id"):
+        index = columns.index(column)
+        if row[index] is not None:
+            row[index] = new_ids[row[index]]
+    path_index = columns.index("path")
+    ancestor_ids = [new_ids[int(i)] for i in row[path_index].split("/") if i]
+    row[path_index] = "".join(f"/{i}" for i in ancestor_ids) + "/"
+
+
+def _insert_rows(
+    database: pw.Database, table: str, columns: list[str], rows: list[list]
+) -> None:
+    names = ", ".join(f'"{c}"' for c in columns)
+    placeholders = ", ".join("?" * len(columns))
+    for batch in pw.chunked(rows, _BATCH_SIZE):
+        database.cursor().executemany(
+            f'INSERT INTO "{table}" ({names}) VALUES ({placeholders})', batch
+        )
+
+
+@contextmanager
+def bound(database: pw.Database) -> Iterator[None]:
+    # Runs the block with the models on `database` in the calling thread.
+    origin_database = db.obj
+    db.bind_thread(database)
+    try:
+        yield
+    finally:
+        db.bind_thread(origin_database)
@@ -0,0 +1,157 @@
+import json
+import re
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+from planner.core.usecase.tasks import ImportedTask
+
+
+FORMATS = ("json", "ndjson", "outline")
+
+# "- [x] Buy tiles": an optional list marker and an optional checkbox.
+_OUTLINE_ITEM_RE = re.compile(r"^(?:[-*+]\s+)?(?:\[(?P<mark>[ xX])\]\s+)?(?P<name>.*)$")
+
+
+class InvalidImport(Exception):
+    ...
+
+
+def parse(
+    format: str, lines: Iterable[str], max_tasks: Optional[int] = None
+) -> Iterator[ImportedTask]:
+    # Imported tasks in an order `import_tasks` accepts: every parent before
+    # its subtasks. Problems are raised while iterating, so a caller that
+    # imports as it parses rolls the whole import back.
+    if format not in FORMATS:
+        raise ValueError(f"unknown import format {format!r}")
+
+    keys = set()
+    try:
+        if format == "json":
+            # The standard library has no incremental JSON parser, so a nested
+            # document is read whole; NDJSON and outlines are read line by line.
+            items = _parse_json("".join(lines))
+        elif format == "ndjson":
+            items = _parse_ndjson(lines)
+        else:
+            items = _parse_outline(lines)
+
+        for count, item in enumerate(items, 1):
+            if max_tasks is not None and count > max_tasks:
+                raise InvalidImport(f"more than {max_tasks} tasks")
+            if item.key in keys:
+                raise InvalidImport(f"task {item.key!r} is imported twice")
+            if item.parent_key is not None and item.parent_key not in keys:
+                raise InvalidImport(
+                    f"task {item.key!r} comes before its parent {item.parent_key!r}"
+                )
+            keys.add(item.key)
+            yield item
+    except UnicodeDecodeError:
+        raise InvalidImport("the input is not UTF-8 text")
+
+
+def _parse_json(text: str) -> Iterator[ImportedTask]:
+    # A task or a list of tasks, each one with optional "subtasks".
+    try:
+        document = json.loads(text)
+    except ValueError as exc:
+        raise InvalidImport(f"invalid JSON: {exc}")
+
+    next_key = 0
+    stack = [(None, item) for item in reversed(_as_list(document, "the document"))]
+    while stack:
+        parent_key, item = stack.pop()
+        next_key += 1
+        yield _imported_task(item, next_key, parent_key, f"task {next_key}")
+        subtasks = _as_list(item.get("subtasks", []), f"subtasks of task {next_key}")
+        stack.extend((next_key, subtask) for subtask in reversed(subtasks))
+
+
+def _parse_ndjson(lines: Iterable[str]) -> Iterator[ImportedTask]:
+    # One task per line as written by the export: subtasks refer to their
+    # parent by "parent_id", tasks without "id" are keyed by line number.
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+
+        where = f"line {line_number}"
+        try:
+            item = json.loads(line)
+        except ValueError as exc:
+            raise InvalidImport(f"{where}: invalid JSON: {exc}")
+        if not isinstance(item, dict):
+            raise InvalidImport(f"{where}: a task must be an object")
+
+        key = item.get("id", f"line {line_number}")
+        parent_key = item.get("parent_id")
+        if not all(isinstance(k, (int, str, type(None))) for k in (key, parent_key)):
+            raise InvalidImport(f"{where}: ids must be numbers or text")
+        yield _imported_task(item, key, parent_key, where)
+
+
+def _parse_outline(lines: Iterable[str]) -> Iterator[ImportedTask]:
+    # One task per line, a subtask indented deeper than its parent. Tabs
+    # count as four spaces; "[x]" marks a completed task.
+    stack: list[tuple[int, int]] = []  # (indent, key) of the open parents
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip().expandtabs(4)
+        if not line.strip():
+            continue
+
+        indent = len(line) - len(line.lstrip())
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+
+        match = _OUTLINE_ITEM_RE.match(line.strip())
+        name = match["name"].strip()
+        if not name:
+            raise InvalidImport(f"line {line_number}: a task needs a name")
+
+        yield ImportedTask(
+            key=line_number,
+            parent_key=stack[-1][1] if stack else None,
+            name=name,
+            note=None,
+            progress=100.0 if match["mark"] in ("x", "X") else 0.0,
+        )
+        stack.append((indent, line_number))
+
+
+def _imported_task(item: Any, key: Any, parent_key: Any, where: str) -> ImportedTask:
+    if not isinstance(item, dict):
+        raise InvalidImport(f"{where}: a task must be an object")
+
+    name = item.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise InvalidImport(f"{where}: a task needs a name")
+
+    note = item.get("note")
+    if note is not None and not isinstance(note, str):
+        raise InvalidImport(f"{where}: a note must be text")
+
+    progress = item.get("progress", 0)
+    if (
+        isinstance(progress, bool)
+        or not isinstance(progress, (int, float))
+        or not 0 <= progress <= 100
+    ):
+        raise InvalidImport(f"{where}: progress must be a number from 0 to 100")
+
+    return ImportedTask(
+        key=key,
+        parent_key=parent_key,
+        name=name.strip(),
+        note=note or None,
+        progress=round(float(progress), 2),
+    )
+
+
+def _as_list(value: Any, what: str) -> list:
+    if isinstance(value, dict):
+        return [value]
+    if not isinstance(value, list):
+        raise InvalidImport(f"{what} must be a task or a list of tasks")
+    return value
@@ -0,0 +1,145 @@
+import datetime
+from typing import Iterable
+from typing import NamedTuple
+from typing import Optional
+
+import peewee as pw
+
+from planner.core.models import ArchivedTask
+from planner.core.models import DailyTaskStats
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.models import db
+from planner.core.usecase import tasks as task_usecase
+
+
+class TaskStats(NamedTuple):
+    # Completions from `first_day` on, over a day or a week.
+    first_day: datetime.date
+    completed_count: int
+    # Completions with a known duration and the sum of their durations.
+    timed_count: int
+    completion_seconds: float
+
+    def average_completion_time(self) -> Optional[datetime.timedelta]:
+        if not self.timed_count:
+            return None
+        return datetime.timedelta(seconds=self.completion_seconds / self.timed_count)
+
+
+def get_daily_stats(
+    user_id: int, first_day: datetime.date, last_day: datetime.date
+) -> list[TaskStats]:
+    # A row per day from `first_day` to `last_day`, days without completions
+    # included. Reads the rollups, a row per day, never the tasks.
+    # fmt: off
+    rows = {
+        day: (completed_count, timed_count, completion_seconds)
+        for day, completed_count, timed_count, completion_seconds in (
+            DailyTaskStats
+            .select(
+                DailyTaskStats.day,
+                DailyTaskStats.completed_count,
+                DailyTaskStats.timed_count,
+                DailyTaskStats.completion_seconds,
+            )
+            .where(
+                (DailyTaskStats.user == user_id)
+                & (DailyTaskStats.day >= first_day)
+                & (DailyTaskStats.day <= last_day)
+            )
+            .tuples()
+        )
+    }
+    # fmt: on
+    days = (
+        first_day + datetime.timedelta(days=i)
+        for i in range((last_day - first_day).days + 1)
+    )
+    return [TaskStats(day, *rows.get(day, (0, 0, 0.0))) for day in days]
+
+
+def get_weekly_stats(
+    user_id: int, first_day: datetime.date, last_day: datetime.date
+) -> list[TaskStats]:
+    # The daily rows summed up by week, weeks starting on Monday.
+    weeks: dict[datetime.date, list[TaskStats]] = {}
+    for row in get_daily_stats(user_id, first_day, last_day):
+        week = row.first_day - datetime.timedelta(days=row.first_day.weekday())
+        weeks.setdefault(week, []).append(row)
+    return [sum_task_stats(week, rows) for week, rows in weeks.items()]
+
+
+def sum_task_stats(first_day: datetime.date, rows: Iterable[TaskStats]) -> TaskStats:
+    completed_count, timed_count, completion_seconds = 0, 0, 0.0
+    for row in rows:
+        completed_count += row.completed_count
+        timed_count += row.timed_count
+        completion_seconds += row.completion_seconds
+    return TaskStats(first_day, completed_count, timed_count, completion_seconds)
+
+
+def backfill_task_stats(user_id: Optional[int] = None) -> int:
+    # Rebuilds the statistics of a user, or of every user, from their tasks
+    # and returns the number of users. Completed tasks from before
+    # completions were recorded get their creation time as completion time,
+    # so they count without a duration. One transaction per user.
+    if user_id is None:
+        user_ids = [i for (i,) in User.select(User.id).order_by(User.id).tuples()]
+    else:
+        user_ids = [user_id]
+
+    for user_id in user_ids:
+        with db.atomic("IMMEDIATE"):
+            for model in (Task, ArchivedTask):
+                # fmt: off
+                (
+                    model
+                    .update(completed_at=model.created_at)
+                    .where(
+                        (model.user_id == user_id)
+                        & (model.progress == 100)
+                        & (model.child_count == 0)
+                        & model.completed_at.is_null()
+                    )
+                    .execute()
+                )
+                # fmt: on
+
+            # Live and archived tasks both count, removed ones do not.
+            totals: dict[str, list] = {}
+            for model, query in (
+                (Task, task_usecase.select_tasks(user_id)),
+                (
+                    ArchivedTask,
+                    ArchivedTask.select().where(ArchivedTask.user_id == user_id),
+                ),
+            ):
+                # fmt: off
+                rows = (
+                    query
+                    .select(*task_usecase.completion_stats_columns(model))
+                    .where(model.completed_at.is_null(False))
+                    .group_by(pw.fn.DATE(model.completed_at))
+                    .tuples()
+                )
+                # fmt: on
+                for day, *values in rows:
+                    total = totals.setdefault(day, [0, 0, 0.0])
+                    for i, value in enumerate(values):
+                        total[i] += value
+
+            DailyTaskStats.delete().where(DailyTaskStats.user == user_id).execute()
+            if totals:
+                DailyTaskStats.insert_many(
+                    [(user_id, day, *total) for day, total in totals.items()],
+                    fields=[
+                        DailyTaskStats.user,
+                        DailyTaskStats.day,
+                        DailyTaskStats.completed_count,
+                        DailyTaskStats.timed_count,
+                        DailyTaskStats.completion_seconds,
+                    ],
+                ).execute()
+
+    return len(user_ids)
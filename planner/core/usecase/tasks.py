@@ -1,9 +1,74 @@
 import datetime
+import re
+from array import array
+from dataclasses import dataclass
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
 from typing import Optional
 
+import peewee as pw
+
+from planner.core import events
+from planner.core.models import ArchivedTask
+from planner.core.models import DailyTaskStats
+from planner.core.models import DirtyTask
 from planner.core.models import Task
+from planner.core.models import TaskSearch
 from planner.core.models import User
 from planner.core.models import db
+from planner.core.read_model import TASK_NODE_FIELDS
+from planner.core.read_model import TaskNode
+from planner.core.read_model import TaskTree
+
+
+_IMPORT_BATCH_SIZE = 500
+# Columns copied between "tasks" and "archived_tasks", in this order.
+_ARCHIVED_TASK_COLUMNS = (
+    '"id", "user_id", "parent_task_id", "root_task_id", "name", "note",'
+    ' "progress", "created_at", "child_count", "child_progress_sum",'
+    ' "completed_at", "path", "depth"'
+)
+_SEARCH_WORD_RE = re.compile(r"\w+")
+
+
+class ImportedTask(NamedTuple):
+    # `key` identifies the task within its import, `parent_key` is the key
+    # of a task imported before it or None for a top-level task.
+    key: Any
+    parent_key: Any
+    name: str
+    note: Optional[str]
+    # Kept for tasks without subtasks only, the others get it computed.
+    progress: float
+
+
+@dataclass(frozen=True)
+class TaskOperation:
+    # "create", "complete" or "remove".
+    kind: str
+    # The task to complete or remove.
+    task_id: Optional[int] = None
+    # Where to create: under an existing task, under the task created by an
+    # earlier operation of the same batch (by its index) or at the top.
+    parent_task_id: Optional[int] = None
+    parent_ref: Optional[int] = None
+    name: Optional[str] = None
+    note: Optional[str] = None
+
+
+class InvalidTaskOperation(Exception):
+    def __init__(self, index: int, message: str):
+        super().__init__(f"operation {index}: {message}")
+        self.index = index
+
+
+@dataclass(frozen=True)
+class TaskAggregatesDrift:
+    task_id: int
+    stored: tuple[int, float, float]
+    expected: tuple[int, float, float]
 
 
 def create_task(
@@ -11,63 +76,1468 @@ def create_task(
     name: str,
     note: Optional[str] = None,
     parent_task: Optional[Task] = None,
+    defer_progress: bool = False,
 ) -> Task:
-    with db.atomic():
+    # With `defer_progress` the ancestors are queued for the progress worker
+    # instead of being updated here; the same goes for the other use cases.
+    with db.atomic("IMMEDIATE"):
+        # A removed parent used to fail the foreign key; its row now stays
+        # until purged, so the check is made here.
+        if parent_task is not None and not _refresh_task_progress(parent_task):
+            raise pw.IntegrityError("the parent task is removed")
+
         task = Task.create(
             user=user,
             parent_task=parent_task,
+            root_task=None if parent_task is None else parent_task.root_task_id,
+            path="/" if parent_task is None else parent_task.subtree_path(),
+            depth=0 if parent_task is None else parent_task.depth + 1,
             name=name,
             note=note,
             progress=0,
             created_at=datetime.datetime.utcnow(),
         )
 
-        if parent_task is not None:
-            _recalculate_task_chain_progress(parent_task)
+        _bump_tasks_version(task.user_id)
+
+        progress_changed_task_ids: set[int] = set()
+        if parent_task is None:
+            task.root_task_id = task.id
+            task.save(only=[Task.root_task])
+        elif defer_progress:
+            _mark_tasks_dirty(task.user_id, task.ancestor_ids())
+        else:
+            progress_changed_task_ids = _propagate_child_change(
+                parent_task, count_delta=1, progress_delta=0
+            )
+
+    _emit_tasks_changed(task, progress_changed_task_ids)
 
     return task
 
 
-def remove_task(task: Task) -> None:
-    with db.atomic():
-        parent_task = task.parent_task
-        task.delete_instance(recursive=True, delete_nullable=True)
+def import_tasks(
+    user: User, items: Iterable[ImportedTask], parent_task: Optional[Task] = None
+) -> int:
+    # Inserts the imported tree in multi-row batches within one transaction,
+    # consuming `items` as they come, then computes the aggregates of every
+    # imported task in one bottom-up pass instead of once per created task.
+    created_at = Task.created_at.db_value(datetime.datetime.utcnow())
+    with db.atomic("IMMEDIATE"):
+        if parent_task is not None and not _refresh_task_progress(parent_task):
+            return 0
+
+        # Ids are assigned up front, under the write lock, so that subtasks
+        # reference their parents without reading them back. Everything else
+        # is kept per imported task by its index, which is `id - first_id`.
+        first_id = (Task.select(pw.fn.MAX(Task.id)).scalar() or 0) + 1
+        # The search index gets the imported tasks in one statement at the
+        # end rather than row by row from the insert trigger. Dropping the
+        # trigger is part of the transaction: a rollback brings it back.
+        search_trigger_sql = _drop_trigger("task_search_insert")
+        indexes: dict[Any, int] = {}
+        parent_indexes = array("q")
+        root_ids = array("q")
+        paths: list[str] = []
+        depths = array("q")
+        child_counts = array("q")
+        progresses = array("d")
+
+        rows = []
+        for item in items:
+            index = len(parent_indexes)
+            task_id = first_id + index
+            indexes[item.key] = index
+            parent_index = -1 if item.parent_key is None else indexes[item.parent_key]
+            if parent_index >= 0:
+                child_counts[parent_index] += 1
+                root_id = root_ids[parent_index]
+                path = f"{paths[parent_index]}{first_id + parent_index}/"
+                depth = depths[parent_index] + 1
+            elif parent_task is not None:
+                root_id = parent_task.root_task_id
+                path = parent_task.subtree_path()
+                depth = parent_task.depth + 1
+            else:
+                root_id, path, depth = task_id, "/", 0
+
+            parent_indexes.append(parent_index)
+            root_ids.append(root_id)
+            paths.append(path)
+            depths.append(depth)
+            child_counts.append(0)
+            progresses.append(item.progress)
+            rows.append(
+                (
+                    task_id,
+                    user.id,
+                    (
+                        first_id + parent_index
+                        if parent_index >= 0
+                        else (None if parent_task is None else parent_task.id)
+                    ),
+                    root_id,
+                    item.name,
+                    item.note,
+                    item.progress,
+                    created_at,
+                    path,
+                    depth,
+                )
+            )
+            if len(rows) >= _IMPORT_BATCH_SIZE:
+                _insert_imported_rows(rows)
+                rows = []
+        if rows:
+            _insert_imported_rows(rows)
+        if search_trigger_sql is not None:
+            db.execute_sql(
+                'INSERT INTO "task_search" ("rowid", "name", "note")'
+                ' SELECT "id", "name", "note" FROM "tasks" WHERE "id" >= ?',
+                (first_id,),
+            )
+            db.execute_sql(search_trigger_sql)
 
+        imported_count = len(parent_indexes)
+        if imported_count == 0:
+            return 0
+
+        # Subtasks come after their parents, so walking backwards sees every
+        # task complete before its parent.
+        child_progress_sums = array("d", bytes(8 * imported_count))
+        top_level_count, top_level_progress_sum = 0, 0.0
+        updates = []
+        for index in reversed(range(imported_count)):
+            if child_counts[index] > 0:
+                child_progress_sum = round(child_progress_sums[index], 2)
+                progresses[index] = _progress_from_aggregates(
+                    child_counts[index], child_progress_sum
+                )
+                updates.append(
+                    (
+                        child_counts[index],
+                        child_progress_sum,
+                        progresses[index],
+                        first_id + index,
+                    )
+                )
+            if parent_indexes[index] >= 0:
+                child_progress_sums[parent_indexes[index]] += progresses[index]
+            else:
+                top_level_count += 1
+                top_level_progress_sum += progresses[index]
+
+        for batch in pw.chunked(updates, _IMPORT_BATCH_SIZE):
+            db.cursor().executemany(
+                'UPDATE "tasks" SET "child_count" = ?, "child_progress_sum" = ?,'
+                ' "progress" = ? WHERE "id" = ?',
+                batch,
+            )
+        # Imported completed tasks have no completion time of their own: they
+        # count as completed when imported, without a duration.
+        # fmt: off
+        completed_query = (
+            Task
+            .update(completed_at=Task.created_at)
+            .where(
+                (Task.id >= first_id)
+                & (Task.progress == 100)
+                & (Task.child_count == 0)
+            )
+        )
+        # fmt: on
+        completed_count = completed_query.execute()
+        if completed_count:
+            _add_task_stats(user.id, [(created_at.date(), completed_count, 0, 0.0)])
+
+        progress_changed_task_ids: set[int] = set()
         if parent_task is not None:
-            _recalculate_task_chain_progress(parent_task)
+            progress_changed_task_ids = _propagate_child_change(
+                parent_task,
+                count_delta=top_level_count,
+                progress_delta=top_level_progress_sum,
+            )
+        _bump_tasks_version(user.id)
+
+    if parent_task is not None:
+        _emit_tasks_changed(parent_task, progress_changed_task_ids)
+    else:
+        events.emit(
+            events.TasksChanged(
+                user_id=user.id, task_ids=frozenset(), root_tasks_changed=True
+            )
+        )
+
+    return imported_count
+
+
+def apply_task_operations(
+    user: User, operations: list[TaskOperation], defer_progress: bool = False
+) -> list[Optional[int]]:
+    # Applies the operations in order within one transaction, all or none,
+    # and returns the ids of the created tasks (None for other operations).
+    # Aggregates are recomputed once at the end for every task whose
+    # children changed, instead of up the chain after each operation.
+    referenced_ids = {
+        i for op in operations for i in (op.task_id, op.parent_task_id) if i is not None
+    }
+    with db.atomic("IMMEDIATE"):
+        # fmt: off
+        tasks = {
+            t.id: t for t in (
+                Task
+                .select(
+                    Task.id,
+                    Task.user,
+                    Task.parent_task,
+                    Task.root_task,
+                    Task.path,
+                    Task.depth,
+                    Task.created_at,
+                )
+                .where(
+                    Task.id.in_(list(referenced_ids))
+                    & (Task.user == user.id)
+                    & _visible_condition()
+                )
+            )
+        } if referenced_ids else {}
+        # fmt: on
+        next_id = (Task.select(pw.fn.MAX(Task.id)).scalar() or 0) + 1
+        created_at = datetime.datetime.utcnow()
+
+        results: list[Optional[int]] = []
+        created: dict[int, Task] = {}
+        removed_ids: set[int] = set()
+        changed_ids: set[int] = set()
+        # Tasks whose children changed, with their ancestors.
+        affected_ids: set[int] = set()
+        # Tasks completed after their children last changed, which keep their
+        # progress of 100 as with complete_task.
+        completed_ids: set[int] = set()
+        for index, op in enumerate(operations):
+            if op.kind == "create":
+                if op.parent_ref is not None:
+                    parent_task = created.get(op.parent_ref)
+                    if parent_task is None:
+                        raise InvalidTaskOperation(
+                            index, "parent_ref must be an earlier create operation"
+                        )
+                elif op.parent_task_id is not None:
+                    parent_task = tasks.get(op.parent_task_id)
+                    if parent_task is None:
+                        raise InvalidTaskOperation(
+                            index, f"no task {op.parent_task_id}"
+                        )
+                else:
+                    parent_task = None
+                if parent_task is not None and parent_task.id in removed_ids:
+                    raise InvalidTaskOperation(index, "the parent task is removed")
+                if not op.name:
+                    raise InvalidTaskOperation(index, "a task needs a name")
+
+                task = Task(
+                    id=next_id,
+                    user=user.id,
+                    parent_task=None if parent_task is None else parent_task.id,
+                    root_task=next_id
+                    if parent_task is None
+                    else parent_task.root_task_id,
+                    path="/" if parent_task is None else parent_task.subtree_path(),
+                    depth=0 if parent_task is None else parent_task.depth + 1,
+                    name=op.name,
+                    note=op.note,
+                    progress=0,
+                    created_at=created_at,
+                )
+                task.save(force_insert=True)
+                next_id += 1
+                created[index] = task
+                changed_ids.add(task.id)
+                affected_ids.update(task.ancestor_ids())
+                completed_ids.difference_update(task.ancestor_ids())
+                results.append(task.id)
+                continue
+
+            task = tasks.get(op.task_id)
+            if task is None or task.id in removed_ids:
+                raise InvalidTaskOperation(index, f"no task {op.task_id}")
+
+            if op.kind == "complete":
+                # fmt: off
+                completed_count = (
+                    Task
+                    .update(progress=100, completed_at=created_at)
+                    .where((Task.id == task.id) & Task.completed_at.is_null())
+                    .execute()
+                )
+                # fmt: on
+                if completed_count:
+                    _add_task_stats(user.id, [_completion_stats(task, created_at)])
+                else:
+                    Task.update(progress=100).where(Task.id == task.id).execute()
+                changed_ids.add(task.id)
+                completed_ids.add(task.id)
+            elif op.kind == "remove":
+                # fmt: off
+                removed_ids.update(
+                    i for (i,) in (
+                        Task
+                        .select(Task.id)
+                        .where(_descendants_condition(task))
+                        .tuples()
+                    )
+                )
+                # fmt: on
+                removed_ids.add(task.id)
+                _subtract_removed_task_stats(task)
+                Task.update(removed_at=created_at).where(Task.id == task.id).execute()
+            else:
+                raise InvalidTaskOperation(index, f"unknown operation {op.kind!r}")
+            affected_ids.update(task.ancestor_ids())
+            completed_ids.difference_update(task.ancestor_ids())
+            results.append(None)
+
+        affected_ids -= removed_ids
+        completed_ids -= removed_ids
+        if defer_progress:
+            _mark_tasks_dirty(user.id, affected_ids)
+            _keep_dirty_tasks_progress(completed_ids)
+        else:
+            _recompute_task_aggregates(affected_ids, keep_progress_ids=completed_ids)
+        if operations:
+            _bump_tasks_version(user.id)
+
+    events.emit(
+        events.TasksChanged(
+            user_id=user.id,
+            task_ids=frozenset(affected_ids | changed_ids | removed_ids),
+            root_tasks_changed=True,
+        )
+    )
+
+    return results
 
 
-def complete_task(task: Task) -> None:
-    with db.atomic():
+def remove_task(task: Task, defer_progress: bool = False) -> None:
+    # Marks the task removed, which hides its whole subtree, and takes it out
+    # of its parent's aggregates; the rows are left to `purge_removed_tasks`,
+    # so removing a large subtree costs as little as removing a single task.
+    with db.atomic("IMMEDIATE"):
+        if not _refresh_task_progress(task):
+            return
+
+        parent_task = task.parent_task
+        _subtract_removed_task_stats(task)
+        task.removed_at = datetime.datetime.utcnow()
+        task.save(only=[Task.removed_at])
+        # Only to drop their cached pages: the ids come off the path index.
+        # fmt: off
+        removed_task_ids = [
+            i for (i,) in (
+                Task
+                .select(Task.id)
+                .where(_descendants_condition(task))
+                .tuples()
+            )
+        ]
+        # fmt: on
+        _bump_tasks_version(task.user_id)
+
+        progress_changed_task_ids: set[int] = set()
+        if parent_task is not None and defer_progress:
+            _mark_tasks_dirty(task.user_id, task.ancestor_ids())
+        elif parent_task is not None:
+            progress_changed_task_ids = _propagate_child_change(
+                parent_task, count_delta=-1, progress_delta=-task.progress
+            )
+
+    _emit_tasks_changed(task, progress_changed_task_ids, removed_task_ids)
+
+
+def complete_task(task: Task, defer_progress: bool = False) -> None:
+    with db.atomic("IMMEDIATE"):
+        if not _refresh_task_progress(task):
+            return
+
+        progress_delta = 100.0 - task.progress
+
         task.progress = 100.0
-        task.save(only=[Task.progress])
+        # Completed once: completing it again is not another completion.
+        if task.completed_at is None:
+            task.completed_at = datetime.datetime.utcnow()
+            task.save(only=[Task.progress, Task.completed_at])
+            _add_task_stats(task.user_id, [_completion_stats(task, task.completed_at)])
+        else:
+            task.save(only=[Task.progress])
+        _bump_tasks_version(task.user_id)
 
+        progress_changed_task_ids: set[int] = set()
         parent_task = task.parent_task
-        if parent_task is not None:
-            _recalculate_task_chain_progress(parent_task)
+        if defer_progress:
+            # Changes of its subtasks queued before must not take the
+            # completion back when the worker gets to them.
+            _keep_dirty_tasks_progress([task.id])
+            if parent_task is not None and progress_delta != 0:
+                _mark_tasks_dirty(task.user_id, task.ancestor_ids())
+        elif parent_task is not None and progress_delta != 0:
+            progress_changed_task_ids = _propagate_child_change(
+                parent_task, count_delta=0, progress_delta=progress_delta
+            )
+
+    _emit_tasks_changed(task, progress_changed_task_ids)
+
+
+def purge_removed_tasks(batch_size: int) -> int:
+    # Deletes up to `batch_size` rows of removed subtrees in one transaction,
+    # the longest removed first, and returns how many. Subtasks go before
+    # their parents and a removed task goes last, once its subtree is gone,
+    # so every batch leaves a consistent tree behind and an interrupted purge
+    # picks up where it stopped.
+    purged_count = 0
+    with db.atomic("IMMEDIATE"):
+        while purged_count < batch_size:
+            # fmt: off
+            task = (
+                Task
+                .select(Task.id, Task.path)
+                .where(_is_removed(Task))
+                .order_by(Task.removed_at, Task.id)
+                .first()
+            )
+            # fmt: on
+            if task is None:
+                break
+
+            # Descending paths put every subtask before its parent, and the
+            # path index yields them in that order without sorting.
+            limit = batch_size - purged_count
+            # fmt: off
+            batch = (
+                Task
+                .select(Task.id)
+                .where(_descendants_condition(task))
+                .order_by(Task.path.desc(), Task.id.desc())
+                .limit(limit)
+            )
+            # fmt: on
+            purged_count += Task.delete().where(Task.id.in_(batch)).execute()
+            if purged_count < batch_size:
+                purged_count += Task.delete().where(Task.id == task.id).execute()
+
+    return purged_count
+
+
+def count_removed_tasks() -> int:
+    # Removed subtrees waiting for the purger.
+    return Task.select().where(_is_removed(Task)).count()
+
+
+def recompute_dirty_tasks(
+    batch_size: int,
+    marked_before: Optional[datetime.datetime] = None,
+    user_id: Optional[int] = None,
+) -> int:
+    # Recomputes the aggregates of the tasks queued by deferred changes,
+    # only those queued before `marked_before` and of `user_id` when given,
+    # `batch_size` tasks per transaction. Returns how many were queued.
+    recomputed_count = 0
+    while True:
+        with db.atomic("IMMEDIATE"):
+            dirty_count, task_ids_by_user = _recompute_dirty_tasks_batch(
+                batch_size, marked_before, user_id
+            )
+            for task_user_id in task_ids_by_user:
+                _bump_tasks_version(task_user_id)
+
+        for task_user_id, task_ids in task_ids_by_user.items():
+            events.emit(
+                events.TasksChanged(
+                    user_id=task_user_id,
+                    task_ids=frozenset(task_ids),
+                    root_tasks_changed=True,
+                )
+            )
 
+        recomputed_count += dirty_count
+        if dirty_count < batch_size:
+            return recomputed_count
 
-def _recalculate_task_chain_progress(task: Task) -> None:
+
+def has_dirty_tasks(user_id: int) -> bool:
+    return DirtyTask.select().where(DirtyTask.user == user_id).exists()
+
+
+def archive_completed_trees(older_than: datetime.datetime, batch_size: int) -> int:
+    # Moves completed top-level tasks created, or restored, before
+    # `older_than` to the archive along with their subtrees, `batch_size`
+    # trees per transaction so that other writers get the lock in between.
+    # Returns the number of archived trees.
+    archived_count = 0
+    while True:
+        with db.atomic("IMMEDIATE"):
+            tree_count, task_ids_by_user = _archive_completed_trees_batch(
+                older_than, batch_size
+            )
+            for user_id in task_ids_by_user:
+                _bump_tasks_version(user_id)
+
+        for user_id, task_ids in task_ids_by_user.items():
+            events.emit(
+                events.TasksChanged(
+                    user_id=user_id,
+                    task_ids=frozenset(task_ids),
+                    root_tasks_changed=True,
+                )
+            )
+
+        archived_count += tree_count
+        if tree_count < batch_size:
+            return archived_count
+
+
+def restore_archived_tree(user_id: int, tree_id: int) -> Optional[int]:
+    # Moves an archived tree back to the tasks and returns the id of its
+    # top-level task, None if the user has no such archived tree. The tasks
+    # get their old ids back unless a new task has taken one of them.
+    restored_at = Task.restored_at.db_value(datetime.datetime.utcnow())
+    with db.atomic("IMMEDIATE"):
+        # fmt: off
+        rows = list(
+            ArchivedTask
+            .select(pw.SQL(_ARCHIVED_TASK_COLUMNS))
+            .where(
+                (ArchivedTask.tree_id == tree_id)
+                & (ArchivedTask.user_id == user_id)
+            )
+            .order_by(ArchivedTask.depth, ArchivedTask.id)
+            .tuples()
+        )
+        # fmt: on
+        if not rows:
+            return None
+
+        old_ids = [row[0] for row in rows]
+        is_any_id_taken = any(
+            Task.select().where(Task.id.in_(batch)).exists()
+            for batch in pw.chunked(old_ids, _IMPORT_BATCH_SIZE)
+        )
+        if is_any_id_taken:
+            first_id = (Task.select(pw.fn.MAX(Task.id)).scalar() or 0) + 1
+            new_ids = {old_id: first_id + i for i, old_id in enumerate(old_ids)}
+        else:
+            new_ids = {old_id: old_id for old_id in old_ids}
+
+        restored_rows = []
+        for task_id, _, parent_task_id, root_task_id, *values, path, depth in rows:
+            ancestor_ids = [new_ids[int(i)] for i in path.split("/") if i]
+            restored_rows.append(
+                (
+                    new_ids[task_id],
+                    user_id,
+                    None if parent_task_id is None else new_ids[parent_task_id],
+                    new_ids[root_task_id],
+                    *values,
+                    "".join(f"/{i}" for i in ancestor_ids) + "/",
+                    depth,
+                    restored_at if parent_task_id is None else None,
+                )
+            )
+        for batch in pw.chunked(restored_rows, _IMPORT_BATCH_SIZE):
+            db.cursor().executemany(
+                f'INSERT INTO "tasks" ({_ARCHIVED_TASK_COLUMNS}, "restored_at")'
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+        ArchivedTask.delete().where(ArchivedTask.tree_id == tree_id).execute()
+        _bump_tasks_version(user_id)
+
+    events.emit(
+        events.TasksChanged(
+            user_id=user_id,
+            task_ids=frozenset(new_ids.values()),
+            root_tasks_changed=True,
+        )
+    )
+    return new_ids[old_ids[0]]
+
+
+def select_active_root_tasks(user_id: int) -> pw.SelectQuery:
     # fmt: off
-    child_tasks = (
+    return (
+        Task
+        .select(*TASK_NODE_FIELDS)
+        .where(
+            (Task.progress != 100)
+            & (Task.parent_task.is_null())
+            & (Task.user_id == user_id)
+            & (Task.removed_at.is_null())
+        )
+        .order_by(Task.created_at.desc())
+        .objects(TaskNode)
+    )
+    # fmt: on
+
+
+def select_completed_root_tasks(user_id: int) -> pw.SelectQuery:
+    # fmt: off
+    return (
+        Task
+        .select(*TASK_NODE_FIELDS)
+        .where(
+            (Task.progress == 100)
+            & (Task.parent_task.is_null())
+            & (Task.user_id == user_id)
+            & (Task.removed_at.is_null())
+        )
+        .objects(TaskNode)
+    )
+    # fmt: on
+
+
+def select_archived_root_tasks(user_id: int) -> pw.SelectQuery:
+    # fmt: off
+    return (
+        ArchivedTask
+        .select()
+        .where(
+            (ArchivedTask.parent_task_id.is_null())
+            & (ArchivedTask.user_id == user_id)
+        )
+    )
+    # fmt: on
+
+
+def select_subtasks(task: Task) -> pw.SelectQuery:
+    # fmt: off
+    return (
+        Task
+        .select(*TASK_NODE_FIELDS)
+        .where((Task.parent_task == task.id) & (Task.removed_at.is_null()))
+        .order_by(Task.created_at, Task.id)
+        .objects(TaskNode)
+    )
+    # fmt: on
+
+
+def get_task(user_id: int, task_id: Any) -> Optional[Task]:
+    # None when the user has no such task or it is in a removed subtree.
+    # fmt: off
+    return (
+        Task
+        .select()
+        .where((Task.id == task_id) & (Task.user == user_id) & _visible_condition())
+        .first()
+    )
+    # fmt: on
+
+
+def select_tasks(user_id: int, *fields: Any) -> pw.SelectQuery:
+    # Every task of the user but the removed ones.
+    # fmt: off
+    return (
+        Task
+        .select(*fields)
+        .where((Task.user == user_id) & _visible_condition())
+    )
+    # fmt: on
+
+
+def get_task_ancestors(task: Task) -> list[Task]:
+    ancestor_ids = task.ancestor_ids()
+    if not ancestor_ids:
+        return []
+
+    # fmt: off
+    return list(
+        Task
+        .select()
+        .where(Task.id.in_(ancestor_ids))
+        .order_by(Task.depth)
+    )
+    # fmt: on
+
+
+def get_task_chain(user_id: int, task_id: int) -> list[Task]:
+    # The task with its ancestors from the root down, empty when the user has
+    # no such task or one of them is removed. One query: the recursive CTE
+    # walks up by primary key.
+    # fmt: off
+    base = (
+        Task
+        .select(Task.id, Task.parent_task)
+        .where((Task.id == task_id) & (Task.user == user_id))
+        .cte("chain", recursive=True)
+    )
+    parent = Task.alias()
+    chain = base.union_all(
+        parent
+        .select(parent.id, parent.parent_task)
+        .join(base, on=(parent.id == base.c.parent_task_id))
+    )
+    tasks = list(
+        Task
+        .select()
+        .join(chain, on=(Task.id == chain.c.id))
+        .with_cte(chain)
+        .order_by(Task.depth)
+    )
+    # fmt: on
+    if any(t.removed_at is not None for t in tasks):
+        return []
+    return tasks
+
+
+def get_task_subtree(task: Task) -> list[Task]:
+    # fmt: off
+    return list(
+        Task
+        .select()
+        .where(_descendants_condition(task) & _visible_condition())
+        .order_by(Task.path, Task.id)
+    )
+    # fmt: on
+
+
+def get_task_tree(task: Task, max_depth: int, max_nodes: int) -> TaskTree:
+    # The subtree down to `max_depth` levels below `task` in one query. Past
+    # `max_nodes` descendants the deepest levels are cut first, so the tree
+    # stays readable from the top.
+    # fmt: off
+    rows = (
+        Task
+        .select(*TASK_NODE_FIELDS)
+        .where(
+            _descendants_condition(task)
+            & (Task.depth <= task.depth + max_depth)
+            & _visible_condition()
+        )
+        .order_by(Task.depth, Task.created_at, Task.id)
+        .limit(max_nodes)
+        .tuples()
+    )
+    # fmt: on
+
+    return TaskTree(TaskNode.from_task(task), rows)
+
+
+def count_task_descendants(task: Task) -> int:
+    # fmt: off
+    return (
+        Task
+        .select()
+        .where(_descendants_condition(task) & _visible_condition())
+        .count()
+    )
+    # fmt: on
+
+
+def search_tasks(user_id: int, query: str, limit: int, offset: int = 0) -> list[Task]:
+    # Best matches first: terms in the name weigh more than in the note.
+    expression = _search_expression(query)
+    if expression is None:
+        return []
+
+    # fmt: off
+    return list(
+        Task
+        .select()
+        .join(TaskSearch, on=(TaskSearch.rowid == Task.id))
+        .where(
+            TaskSearch.match(expression)
+            & (Task.user_id == user_id)
+            & _visible_condition()
+        )
+        .order_by(TaskSearch.bm25(10.0, 1.0), Task.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    # fmt: on
+
+
+def get_tasks_breadcrumbs(tasks: Iterable[Task]) -> dict[int, list[Task]]:
+    # Ancestors of every task from its root down, all loaded in one query.
+    tasks = list(tasks)
+    ancestor_ids = {i for task in tasks for i in task.ancestor_ids()}
+    if not ancestor_ids:
+        return {task.id: [] for task in tasks}
+
+    # fmt: off
+    ancestors = {
+        t.id: t for t in (
+            Task
+            .select(Task.id, Task.name, Task.path, Task.depth)
+            .where(Task.id.in_(list(ancestor_ids)))
+        )
+    }
+    # fmt: on
+    return {task.id: [ancestors[i] for i in task.ancestor_ids()] for task in tasks}
+
+
+def check_task_aggregates(user: Optional[User] = None) -> list[TaskAggregatesDrift]:
+    return list(_iter_task_aggregates_drift(user))
+
+
+def rebuild_task_aggregates(user: Optional[User] = None) -> list[TaskAggregatesDrift]:
+    with db.atomic("IMMEDIATE"):
+        drift = check_task_aggregates(user)
+        for item in drift:
+            child_count, child_progress_sum, progress = item.expected
+            # fmt: off
+            (
+                Task
+                .update(
+                    child_count=child_count,
+                    child_progress_sum=child_progress_sum,
+                    progress=progress,
+                )
+                .where(Task.id == item.task_id)
+                .execute()
+            )
+            # fmt: on
+        if drift:
+            _bump_tasks_version(None if user is None else user.id)
+
+    return drift
+
+
+def get_tasks_version(user_id: int) -> int:
+    # Changes whenever anything shown about the user's tasks may have changed.
+    # fmt: off
+    return (
+        User
+        .select(User.tasks_version)
+        .where(User.id == user_id)
+        .scalar()
+    ) or 0
+    # fmt: on
+
+
+def completion_stats_columns(model: Any) -> tuple:
+    # The day, completed count, timed count and completion seconds of the
+    # selected completed tasks or archived tasks, to group by day.
+    timed = model.completed_at > model.created_at
+    seconds = (
+        pw.fn.julianday(model.completed_at) - pw.fn.julianday(model.created_at)
+    ) * 86400
+    return (
+        pw.fn.DATE(model.completed_at),
+        pw.fn.COUNT(model.id),
+        pw.fn.SUM(pw.Case(None, [(timed, 1)], 0)),
+        pw.fn.SUM(pw.Case(None, [(timed, seconds)], 0)),
+    )
+
+
+def rebuild_task_search() -> None:
+    with db.atomic("IMMEDIATE"):
+        db.execute_sql("INSERT INTO task_search (task_search) VALUES ('rebuild')")
+
+
+def rebuild_task_hierarchy() -> int:
+    with db.atomic("IMMEDIATE"):
+        db.execute_sql("DROP TABLE IF EXISTS temp.task_hierarchy")
+        db.execute_sql(
+            "CREATE TEMP TABLE task_hierarchy ("
+            " id INTEGER NOT NULL PRIMARY KEY,"
+            " root_task_id INTEGER NOT NULL,"
+            " path TEXT NOT NULL,"
+            " depth INTEGER NOT NULL)"
+        )
+        db.execute_sql(
+            "INSERT INTO temp.task_hierarchy"
+            " WITH RECURSIVE h(id, root_task_id, path, depth) AS ("
+            "  SELECT id, id, '/', 0 FROM tasks WHERE parent_task_id IS NULL"
+            "  UNION ALL"
+            "  SELECT t.id, h.root_task_id, h.path || h.id || '/', h.depth + 1"
+            "  FROM tasks AS t JOIN h ON t.parent_task_id = h.id"
+            " )"
+            " SELECT id, root_task_id, path, depth FROM h"
+        )
+        cursor = db.execute_sql(
+            "UPDATE tasks SET"
+            " root_task_id = (SELECT root_task_id FROM temp.task_hierarchy AS h"
+            "  WHERE h.id = tasks.id),"
+            " path = (SELECT path FROM temp.task_hierarchy AS h"
+            "  WHERE h.id = tasks.id),"
+            " depth = (SELECT depth FROM temp.task_hierarchy AS h"
+            "  WHERE h.id = tasks.id)"
+            " WHERE EXISTS (SELECT 1 FROM temp.task_hierarchy AS h"
+            "  WHERE h.id = tasks.id AND (h.root_task_id IS NOT tasks.root_task_id"
+            "  OR h.path IS NOT tasks.path OR h.depth IS NOT tasks.depth))"
+        )
+        db.execute_sql("DROP TABLE temp.task_hierarchy")
+        if cursor.rowcount:
+            _bump_tasks_version(None)
+
+    return cursor.rowcount
+
+
+def _search_expression(query: str) -> Optional[str]:
+    # Every word of the query must match the start of a word, so results
+    # narrow down while typing. Words are quoted, the FTS5 query syntax is
+    # not exposed to users.
+    words = _SEARCH_WORD_RE.findall(query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _descendants_condition(task: Task) -> pw.Expression:
+    # Every path starting with `prefix` sorts in [prefix, prefix[:-1] + "0")
+    # because "0" follows "/", so the path index answers it as a range scan.
+    prefix = task.subtree_path()
+    return (Task.path >= prefix) & (Task.path < prefix[:-1] + "0")
+
+
+def _is_removed(model: Any) -> pw.Node:
+    # Spelled out rather than bound as a parameter ("IS NOT ?"), which the
+    # query planner would not match with the partial index on removed tasks.
+    return pw.NodeList((model.removed_at, pw.SQL("IS NOT NULL")))
+
+
+def _visible_condition() -> pw.Expression:
+    # Neither the task nor any of its ancestors is removed. Removed tasks are
+    # few and only they are in the partial index the subquery probes.
+    removed = Task.alias()
+    removed_prefix = removed.path.concat(removed.id)
+    # fmt: off
+    return Task.removed_at.is_null() & ~pw.fn.EXISTS(
+        removed
+        .select(pw.SQL("1"))
+        .where(
+            (removed.root_task == Task.root_task)
+            & _is_removed(removed)
+            & (Task.path >= removed_prefix.concat("/"))
+            & (Task.path < removed_prefix.concat("0"))
+        )
+    )
+    # fmt: on
+
+
+def _progress_from_aggregates(child_count: int, child_progress_sum: float) -> float:
+    total_child_tasks_progress = child_count * 100
+    return round((child_progress_sum / total_child_tasks_progress) * 100, 2)
+
+
+def _refresh_task_progress(task: Task) -> bool:
+    # `task` may have been loaded before another request changed or removed
+    # it; deltas must be computed from the row as it is under the write lock.
+    # Ids of purged tasks can be reused, hence the creation time check. A
+    # task in a removed subtree is gone as well: changing it would reach the
+    # aggregates of the live tasks above.
+    # fmt: off
+    row = (
+        Task
+        .select(Task.progress, Task.completed_at)
+        .where(
+            (Task.id == task.id)
+            & (Task.created_at == task.created_at)
+            & _visible_condition()
+        )
+        .tuples()
+        .first()
+    )
+    # fmt: on
+    if row is None:
+        return False
+
+    task.progress, task.completed_at = row
+    return True
+
+
+def _propagate_child_change(
+    task: Task, count_delta: int, progress_delta: float
+) -> set[int]:
+    # Applies a change of one child of `task` to the stored aggregates of
+    # `task` and its ancestors: one indexed read of the chain found by the
+    # path, one UPDATE for it.
+    updates = {}
+    progress_changed_task_ids = set()
+    for task_id, progress, child_count, child_progress_sum in _select_task_chain(task):
+        child_count += count_delta
+        child_progress_sum = round(child_progress_sum + progress_delta, 2)
+        new_progress = (
+            _progress_from_aggregates(child_count, child_progress_sum)
+            if child_count > 0
+            else progress
+        )
+        updates[task_id] = (child_count, child_progress_sum, new_progress)
+
+        count_delta, progress_delta = 0, new_progress - progress
+        if progress_delta == 0:
+            break
+        progress_changed_task_ids.add(task_id)
+
+    # fmt: off
+    (
+        Task
+        .update(
+            child_count=pw.Case(Task.id, [(k, v[0]) for k, v in updates.items()]),
+            child_progress_sum=pw.Case(Task.id, [(k, v[1]) for k, v in updates.items()]),  # noqa: E501
+            progress=pw.Case(Task.id, [(k, v[2]) for k, v in updates.items()]),
+        )
+        .where(Task.id.in_(list(updates)))
+        .execute()
+    )
+    # fmt: on
+
+    for loaded_task in _iter_loaded_task_chain(task):
+        if loaded_task.id in updates:
+            (
+                loaded_task.child_count,
+                loaded_task.child_progress_sum,
+                loaded_task.progress,
+            ) = updates[loaded_task.id]
+
+    return progress_changed_task_ids
+
+
+def _recompute_task_aggregates(
+    task_ids: set[int], keep_progress_ids: Optional[set[int]] = None
+) -> None:
+    # Recomputes the stored aggregates of `task_ids` from their children in
+    # two reads and one write. Deepest first, so that a task sees the new
+    # progress of its subtasks: `task_ids` must hold every ancestor of its
+    # tasks. Tasks of `keep_progress_ids` only get their child counts and
+    # sums recomputed.
+    if not task_ids:
+        return
+
+    # fmt: off
+    tasks = (
         Task
         .select(Task.id, Task.progress)
-        .where(Task.parent_task == task)
-        .dicts()
+        .where(Task.id.in_(list(task_ids)))
+        .order_by(Task.depth.desc())
+        .tuples()
+    )
+    children: dict[int, list[tuple[int, float]]] = {}
+    for task_id, parent_task_id, progress in (
+        Task
+        .select(Task.id, Task.parent_task, Task.progress)
+        .where(Task.parent_task.in_(list(task_ids)) & Task.removed_at.is_null())
+        .tuples()
+    ):
+        children.setdefault(parent_task_id, []).append((task_id, progress))
+    # fmt: on
+
+    updates: dict[int, tuple[int, float, float]] = {}
+    for task_id, progress in list(tasks):
+        child_progress = [
+            updates[i][2] if i in updates else p for i, p in children.get(task_id, [])
+        ]
+        child_count = len(child_progress)
+        child_progress_sum = round(sum(child_progress), 2)
+        if child_count > 0 and task_id not in (keep_progress_ids or ()):
+            progress = _progress_from_aggregates(child_count, child_progress_sum)
+        updates[task_id] = (child_count, child_progress_sum, progress)
+    if not updates:
+        return
+
+    # fmt: off
+    (
+        Task
+        .update(
+            child_count=pw.Case(Task.id, [(k, v[0]) for k, v in updates.items()]),
+            child_progress_sum=pw.Case(Task.id, [(k, v[1]) for k, v in updates.items()]),  # noqa: E501
+            progress=pw.Case(Task.id, [(k, v[2]) for k, v in updates.items()]),
+        )
+        .where(Task.id.in_(list(updates)))
+        .execute()
+    )
+    # fmt: on
+
+
+def _archive_completed_trees_batch(
+    older_than: datetime.datetime, batch_size: int
+) -> tuple[int, dict[int, list[int]]]:
+    # Archives up to `batch_size` trees; returns how many, and their task
+    # ids by user.
+    removed = Task.alias()
+    # fmt: off
+    root_ids = [
+        i for (i,) in (
+            Task
+            .select(Task.id)
+            .where(
+                (Task.parent_task.is_null())
+                & (Task.progress == 100)
+                & (pw.fn.COALESCE(Task.restored_at, Task.created_at) < older_than)
+                # Trees with queued aggregates wait for the progress worker.
+                & Task.id.not_in(DirtyTask.select(DirtyTask.task_id))
+                # Trees with removed subtasks wait for the purger.
+                & ~pw.fn.EXISTS(
+                    removed
+                    .select(pw.SQL("1"))
+                    .where(
+                        (removed.root_task == Task.id)
+                        & _is_removed(removed)
+                    )
+                )
+            )
+            .order_by(Task.id)
+            .limit(batch_size)
+            .tuples()
+        )
+    ]
+    # fmt: on
+    if not root_ids:
+        return 0, {}
+
+    task_ids_by_user: dict[int, list[int]] = {}
+    # fmt: off
+    for task_id, user_id in (
+        Task
+        .select(Task.id, Task.user)
+        .where(Task.root_task.in_(root_ids))
+        .tuples()
+    ):
+        task_ids_by_user.setdefault(user_id, []).append(task_id)
+    # fmt: on
+
+    # Each tree gets the next free tree id, joined in from a VALUES table.
+    first_tree_id = (
+        ArchivedTask.select(pw.fn.MAX(ArchivedTask.tree_id)).scalar() or 0
+    ) + 1
+    trees = ", ".join("(?, ?)" for _ in root_ids)
+    db.execute_sql(
+        f"WITH batch (root_id, tree_id) AS (VALUES {trees})"
+        f' INSERT INTO "archived_tasks" ({_ARCHIVED_TASK_COLUMNS},'
+        ' "tree_id", "archived_at")'
+        f" SELECT {_ARCHIVED_TASK_COLUMNS}, batch.tree_id, ?"
+        ' FROM "tasks" JOIN batch ON "tasks"."root_task_id" = batch.root_id',
+        (
+            *(
+                v
+                for i, root_id in enumerate(root_ids)
+                for v in (root_id, first_tree_id + i)
+            ),
+            ArchivedTask.archived_at.db_value(datetime.datetime.utcnow()),
+        ),
+    )
+    Task.delete().where(Task.root_task.in_(root_ids)).execute()
+    return len(root_ids), task_ids_by_user
+
+
+def _mark_tasks_dirty(user_id: int, task_ids: Iterable[int]) -> None:
+    # A task queued already keeps its place: however often it changes, it is
+    # recomputed once per round of the worker. A subtask changed, so its
+    # progress is recomputed even if it was completed meanwhile.
+    marked_at = datetime.datetime.utcnow()
+    rows = [(task_id, user_id, marked_at) for task_id in task_ids]
+    for batch in pw.chunked(rows, _IMPORT_BATCH_SIZE):
+        # fmt: off
+        (
+            DirtyTask
+            .insert_many(
+                batch,
+                fields=[DirtyTask.task_id, DirtyTask.user, DirtyTask.marked_at],
+            )
+            .on_conflict(
+                conflict_target=[DirtyTask.task_id],
+                update={DirtyTask.keep_progress: False},
+            )
+            .execute()
+        )
+        # fmt: on
+
+
+def _keep_dirty_tasks_progress(task_ids: Iterable[int]) -> None:
+    # The tasks were completed: changes of their subtasks queued before must
+    # not take the completion back, so the worker recomputes only their
+    # aggregates. Queued whether or not they were already, since a subtask
+    # may be queued without them once the worker has taken their row along
+    # with another subtask's; tasks without subtasks have nothing to keep.
+    subtask = Task.alias()
+    marked_at = datetime.datetime.utcnow()
+    for batch in pw.chunked(list(task_ids), _IMPORT_BATCH_SIZE):
+        # fmt: off
+        (
+            DirtyTask
+            .insert_from(
+                Task
+                .select(Task.id, Task.user, pw.Value(marked_at), pw.Value(True))
+                .where(
+                    Task.id.in_(batch)
+                    & pw.fn.EXISTS(
+                        subtask.select().where(subtask.parent_task == Task.id)
+                    )
+                ),
+                fields=[
+                    DirtyTask.task_id,
+                    DirtyTask.user,
+                    DirtyTask.marked_at,
+                    DirtyTask.keep_progress,
+                ],
+            )
+            .on_conflict(
+                conflict_target=[DirtyTask.task_id],
+                update={DirtyTask.keep_progress: True},
+            )
+            .execute()
+        )
+        # fmt: on
+
+
+def _recompute_dirty_tasks_batch(
+    batch_size: int, marked_before: Optional[datetime.datetime], user_id: Optional[int]
+) -> tuple[int, dict[int, set[int]]]:
+    # Returns how many queued tasks were taken, and the recomputed task ids
+    # by user.
+    query = DirtyTask.select(DirtyTask.task_id, DirtyTask.user)
+    if marked_before is not None:
+        query = query.where(DirtyTask.marked_at < marked_before)
+    if user_id is not None:
+        query = query.where(DirtyTask.user == user_id)
+    dirty_rows = list(query.order_by(DirtyTask.marked_at).limit(batch_size).tuples())
+    if not dirty_rows:
+        return 0, {}
+
+    # The ancestors of a queued task are recomputed along with it, queued or
+    # not, since their aggregates depend on it. Queued tasks purged since
+    # are just dropped.
+    user_ids = dict(dirty_rows)
+    task_ids_by_user: dict[int, set[int]] = {}
+    # fmt: off
+    for task_id, path in (
+        Task
+        .select(Task.id, Task.path)
+        .where(Task.id.in_(list(user_ids)))
+        .tuples()
+    ):
+        task_ids_by_user.setdefault(user_ids[task_id], set()).update(
+            [task_id, *(int(i) for i in path.strip("/").split("/") if i)]
+        )
+    # fmt: on
+    task_ids = set(user_ids).union(*task_ids_by_user.values())
+    # Completed tasks keep their progress even when recomputed for a subtask
+    # queued before them.
+    # fmt: off
+    keep_progress_ids = {
+        i for (i,) in (
+            DirtyTask
+            .select(DirtyTask.task_id)
+            .where(DirtyTask.task_id.in_(list(task_ids)) & DirtyTask.keep_progress)
+            .tuples()
+        )
+    }
+    # fmt: on
+    _recompute_task_aggregates(task_ids, keep_progress_ids=keep_progress_ids)
+    for batch in pw.chunked(list(task_ids), _IMPORT_BATCH_SIZE):
+        DirtyTask.delete().where(DirtyTask.task_id.in_(batch)).execute()
+    return len(dirty_rows), task_ids_by_user
+
+
+def _insert_imported_rows(rows: list[tuple]) -> None:
+    # One prepared statement for the batch: building a multi-row INSERT with
+    # the query builder costs several times more than SQLite running it.
+    db.cursor().executemany(
+        'INSERT INTO "tasks" ("id", "user_id", "parent_task_id", "root_task_id",'
+        ' "name", "note", "progress", "created_at", "child_count",'
+        ' "child_progress_sum", "path", "depth")'
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, 0, ?, ?)",
+        rows,
+    )
+
+
+def _completion_stats(
+    task: Task, completed_at: datetime.datetime
+) -> tuple[datetime.date, int, int, float]:
+    # A DailyTaskStats row for one completion, as `_add_task_stats` takes it.
+    seconds = (completed_at - task.created_at).total_seconds()
+    return completed_at.date(), 1, int(seconds > 0), max(seconds, 0.0)
+
+
+def _subtract_removed_task_stats(task: Task) -> None:
+    # Takes the completions of the task and its visible subtasks out of the
+    # statistics; to run before the task is marked removed. A subtree removed
+    # earlier had its own taken out then.
+    # fmt: off
+    rows = (
+        Task
+        .select(*completion_stats_columns(Task))
+        .where(
+            ((Task.id == task.id) | _descendants_condition(task))
+            & (Task.root_task == task.root_task_id)
+            & Task.completed_at.is_null(False)
+            & _visible_condition()
+        )
+        .group_by(pw.fn.DATE(Task.completed_at))
+        .tuples()
     )
     # fmt: on
+    _add_task_stats(
+        task.user_id,
+        [(day, -count, -timed, -seconds) for day, count, timed, seconds in rows],
+    )
+
 
-    quantity = len(child_tasks)
-    if quantity == 0:
+def _add_task_stats(user_id: int, rows: Iterable[tuple[Any, int, int, float]]) -> None:
+    # Adds (day, completed count, timed count, completion seconds) to the
+    # user's statistics of each day; days left without completions go.
+    rows = list(rows)
+    if not rows:
         return
 
-    total_child_tasks_progress = quantity * 100
-    child_tasks_progress_sum = round(sum(i["progress"] for i in child_tasks), 2)
-    progress = round((child_tasks_progress_sum / total_child_tasks_progress) * 100, 2)
+    # fmt: off
+    (
+        DailyTaskStats
+        .insert_many(
+            [(user_id, *row) for row in rows],
+            fields=[
+                DailyTaskStats.user,
+                DailyTaskStats.day,
+                DailyTaskStats.completed_count,
+                DailyTaskStats.timed_count,
+                DailyTaskStats.completion_seconds,
+            ],
+        )
+        .on_conflict(
+            conflict_target=[DailyTaskStats.user, DailyTaskStats.day],
+            update={
+                DailyTaskStats.completed_count: (
+                    DailyTaskStats.completed_count + pw.EXCLUDED.completed_count
+                ),
+                DailyTaskStats.timed_count: (
+                    DailyTaskStats.timed_count + pw.EXCLUDED.timed_count
+                ),
+                DailyTaskStats.completion_seconds: (
+                    DailyTaskStats.completion_seconds
+                    + pw.EXCLUDED.completion_seconds
+                ),
+            },
+        )
+        .execute()
+    )
+    if any(row[1] < 0 for row in rows):
+        (
+            DailyTaskStats
+            .delete()
+            .where(
+                (DailyTaskStats.user == user_id)
+                & DailyTaskStats.day.in_([row[0] for row in rows])
+                & (DailyTaskStats.completed_count <= 0)
+            )
+            .execute()
+        )
+    # fmt: on
 
-    task.progress = progress
-    task.save(only=[Task.progress])
 
-    parent_task = task.parent_task
-    if parent_task is not None:
-        _recalculate_task_chain_progress(parent_task)
+def _drop_trigger(name: str) -> Optional[str]:
+    # Returns the statement that creates the trigger again, None if there is
+    # no such trigger.
+    row = db.execute_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    db.execute_sql(f'DROP TRIGGER "{name}"')
+    return row[0]
+
+
+def _bump_tasks_version(user_id: Optional[int]) -> None:
+    # Every user's version when `user_id` is None.
+    query = User.update(tasks_version=User.tasks_version + 1)
+    if user_id is not None:
+        query = query.where(User.id == user_id)
+    query.execute()
+
+
+def _emit_tasks_changed(
+    task: Task,
+    progress_changed_task_ids: set[int],
+    removed_task_ids: Iterable[int] = (),
+) -> None:
+    events.emit(
+        events.TasksChanged(
+            user_id=task.user_id,
+            task_ids=frozenset([*task.ancestor_ids(), task.id, *removed_task_ids]),
+            root_tasks_changed=(
+                task.parent_task_id is None
+                or task.root_task_id in progress_changed_task_ids
+            ),
+        )
+    )
+
+
+def _select_task_chain(task: Task) -> pw.SelectQuery:
+    # fmt: off
+    return (
+        Task
+        .select(
+            Task.id,
+            Task.progress,
+            Task.child_count,
+            Task.child_progress_sum,
+        )
+        .where(Task.id.in_([*task.ancestor_ids(), task.id]))
+        .order_by(Task.depth.desc())
+        .tuples()
+    )
+    # fmt: on
+
+
+def _iter_loaded_task_chain(task: Optional[Task]) -> Iterator[Task]:
+    # Walks only the parents that are already loaded, so callers holding
+    # instances of the chain see the new values without extra queries.
+    while task is not None:
+        yield task
+        task = task.__rel__.get("parent_task")
+
+
+def _iter_task_aggregates_drift(user: Optional[User]) -> Iterator[TaskAggregatesDrift]:
+    if user is None:
+        user_ids = [i for (i,) in User.select(User.id).tuples()]
+    else:
+        user_ids = [user.id]
+
+    for user_id in user_ids:
+        # fmt: off
+        rows = list(
+            Task
+            .select(
+                Task.id,
+                Task.parent_task,
+                Task.progress,
+                Task.child_count,
+                Task.child_progress_sum,
+                Task.removed_at,
+            )
+            .where(Task.user == user_id)
+            .tuples()
+        )
+        # fmt: on
+        stored = {row[0]: (row[3], row[4], row[2]) for row in rows}
+        # Removed subtrees are left out: they no longer count for anything.
+        children: dict[Optional[int], list[int]] = {}
+        for task_id, parent_task_id, *_, removed_at in rows:
+            if removed_at is None:
+                children.setdefault(parent_task_id, []).append(task_id)
+
+        expected: dict[int, tuple[int, float, float]] = {}
+        stack = [(i, False) for i in children.get(None, [])]
+        while stack:
+            task_id, is_visited = stack.pop()
+            child_ids = children.get(task_id, [])
+            if not is_visited and child_ids:
+                stack.append((task_id, True))
+                stack.extend((i, False) for i in child_ids)
+                continue
+
+            child_count = len(child_ids)
+            child_progress_sum = round(sum(expected[i][2] for i in child_ids), 2)
+            # A task at 100% may have been completed whatever its subtasks:
+            # only a lower progress is derived from them.
+            progress = stored[task_id][2]
+            if child_count > 0 and progress != 100:
+                progress = _progress_from_aggregates(child_count, child_progress_sum)
+            expected[task_id] = (child_count, child_progress_sum, progress)
+
+        for task_id in sorted(expected):
+            if stored[task_id] != expected[task_id]:
+                yield TaskAggregatesDrift(
+                    task_id=task_id,
+                    stored=stored[task_id],
+                    expected=expected[task_id],
+                )
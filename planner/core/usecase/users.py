@@ -7,3 +7,10 @@ def create_user(username: str, password_hasher: PasswordHasher, password: str) -
         username=username,
         password_hash=password_hasher.make_hash(password),
     )
+
+
+def update_password_hash(
+    user: User, password_hasher: PasswordHasher, password: str
+) -> None:
+    user.password_hash = password_hasher.make_hash(password)
+    user.save(only=[User.password_hash])
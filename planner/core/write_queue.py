@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import peewee as pw
+
+from planner.core import events
+from planner.core.models import db
+
+
+@dataclass(frozen=True)
+class WriteQueueStats:
+    batches: int
+    operations: int
+    failed_operations: int
+    commit_seconds: float
+
+
+_Operation = tuple[Future, Callable, tuple, dict]
+
+
+class WriteQueue:
+    # Runs write operations of many threads on a single writer thread, which
+    # commits them in groups: up to `max_batch_size` operations, waiting at
+    # most `max_delay` seconds for more once the first one has arrived. Each
+    # operation runs in its own savepoint, so a failing one is rolled back
+    # alone and only its caller gets the exception. Events are held back
+    # until the group is committed.
+
+    def __init__(self, database: pw.Database, max_batch_size: int, max_delay: float):
+        self._database = database
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._queue: queue.SimpleQueue[Optional[_Operation]] = queue.SimpleQueue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._operations = 0
+        self._failed_operations = 0
+        self._commit_seconds = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name="write-queue", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, func: Callable, *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def call(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        return self.submit(func, *args, **kwargs).result()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self) -> WriteQueueStats:
+        with self._stats_lock:
+            return WriteQueueStats(
+                batches=self._batches,
+                operations=self._operations,
+                failed_operations=self._failed_operations,
+                commit_seconds=self._commit_seconds,
+            )
+
+    def _run(self) -> None:
+        db.bind_thread(self._database)
+        try:
+            is_closed = False
+            while not is_closed:
+                operation = self._queue.get()
+                if operation is None:
+                    break
+
+                batch = [operation]
+                deadline = time.monotonic() + self._max_delay
+                while len(batch) < self._max_batch_size:
+                    try:
+                        operation = self._queue.get(
+                            timeout=max(deadline - time.monotonic(), 0)
+                        )
+                    except queue.Empty:
+                        break
+                    if operation is None:
+                        is_closed = True
+                        break
+                    batch.append(operation)
+
+                self._commit(batch)
+        finally:
+            db.unbind_thread()
+            self._database.close()
+
+    def _commit(self, batch: list[_Operation]) -> None:
+        outcomes: list[tuple[Future, Any, Optional[BaseException]]] = []
+        committed_events: list[object] = []
+        started_at = time.monotonic()
+        try:
+            with self._database.atomic("IMMEDIATE"):
+                for future, func, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with events.collect() as operation_events:
+                            with self._database.atomic():
+                                result = func(*args, **kwargs)
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+                    else:
+                        outcomes.append((future, result, None))
+                        committed_events.extend(operation_events)
+        except Exception as exc:
+            # The group itself failed: nothing of it was stored.
+            outcomes = [
+                (future, None, exc) for future, *_ in batch if not future.cancelled()
+            ]
+            committed_events = []
+
+        with self._stats_lock:
+            self._batches += 1
+            self._operations += len(outcomes)
+            self._failed_operations += sum(1 for *_, exc in outcomes if exc)
+            self._commit_seconds += time.monotonic() - started_at
+
+        try:
+            for event in committed_events:
+                events.emit(event)
+        finally:
+            for future, result, exc in outcomes:
+                if exc is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(exc)
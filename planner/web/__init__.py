@@ -1,7 +1,13 @@
 import flask
 
 from planner.web import api
+from planner.web import app_runtime_helpers
+from planner.web import cache
 from planner.web import database
+from planner.web import http_cache
+from planner.web import json_api
+from planner.web import metrics
+from planner.web import throttle
 from planner.web.config import Config
 
 
@@ -10,6 +16,12 @@ def create_app(config: Config) -> flask.Flask:
     app.config.from_object(config)
 
     database.init_app(app)
+    cache.init_app(app)
+    app_runtime_helpers.init_app(app)
+    throttle.init_app(app)
+    metrics.init_app(app)
+    http_cache.init_app(app)
     api.init_app(app)
+    json_api.init_app(app)
 
     return app
@@ -1,4 +1,7 @@
+import datetime
+import io
 import logging
+import math
 
 from flask import Blueprint
 from flask import Flask
@@ -9,16 +12,27 @@ from flask import g
 from flask import redirect
 from flask import render_template
 from flask import request
+from flask import stream_with_context
 from flask import url_for
 from werkzeug.exceptions import HTTPException
 
+from planner.core import sharding
 from planner.core.models import Task
 from planner.core.models import User
+from planner.core.security import PasswordHasherBusy
+from planner.core.usecase import bulk_import
+from planner.core.usecase import export as export_usecase
+from planner.core.usecase import stats as stats_usecase
 from planner.core.usecase import tasks as task_usecase
 from planner.core.usecase import users as user_usecase
 from planner.web import app_runtime_helpers
 from planner.web import auth
+from planner.web import cache
+from planner.web import database
+from planner.web import http_cache
 from planner.web import notify
+from planner.web import pagination
+from planner.web import throttle
 
 
 def init_app(app: Flask) -> None:
@@ -47,80 +61,175 @@ def init_app(app: Flask) -> None:
 
     @page("/active-tasks", "active_tasks")
     @auth.has_access
+    @app_runtime_helpers.reads_own_writes
+    @http_cache.conditional_page
     def _():
-        # fmt: off
-        active_tasks = (
-            Task
-            .select()
-            .where(
-                (Task.progress != 100)
-                & (Task.parent_task.is_null())
-                & (Task.user_id == g.user_id)
-            )
-            .order_by(Task.created_at.desc())
+        active_tasks = cache.get_cache().get_or_set(
+            f"active-tasks:{g.user_id}",
+            lambda: list(task_usecase.select_active_root_tasks(g.user_id)),
+            tags=[cache.root_tasks_tag(g.user_id)],
         )
-        # fmt: on
         return render_template("pages/active-tasks.html", tasks=active_tasks)
 
     @page("/completed-tasks", "completed_tasks")
     @auth.has_access
+    @app_runtime_helpers.reads_own_writes
+    @http_cache.conditional_page
     def _():
         args = request.args
-        offset = int(args.get("offset", "0"))
         limit = int(args.get("limit", current_app.config["COMPLETED_TASKS_LIMIT"]))
 
-        # fmt: off
-        completed_tasks_plus_one = list(
-            Task
-            .select()
-            .where(
-                (Task.progress == 100)
-                & (Task.parent_task.is_null())
-                & (Task.user_id == g.user_id)
-            )
-            .order_by(Task.created_at.desc())
-            .offset(offset)
-            .limit(limit + 1)
-        )
-        # fmt: on
-        completed_tasks = completed_tasks_plus_one[:limit]
+        after = args.get("after")
+        before = args.get("before")
+        offset = int(args.get("offset", "0"))
 
-        has_next = len(completed_tasks_plus_one) > limit
-        has_previous = offset > 0
+        try:
+            completed_tasks_page = cache.get_cache().get_or_set(
+                f"completed-tasks:{g.user_id}:{after}:{before}:{offset}:{limit}",
+                # Archived trees are listed along with the live ones.
+                lambda: pagination.paginate_merged(
+                    [
+                        task_usecase.select_completed_root_tasks(g.user_id),
+                        task_usecase.select_archived_root_tasks(g.user_id),
+                    ],
+                    limit,
+                    after=after,
+                    before=before,
+                    offset=offset,
+                ),
+                tags=[cache.root_tasks_tag(g.user_id)],
+            )
+        except pagination.InvalidCursor:
+            abort(400)
 
         return render_template(
             "pages/completed-tasks.html",
-            tasks=completed_tasks,
-            has_next=has_next,
-            has_previous=has_previous,
-            offset=offset,
+            tasks=completed_tasks_page.items,
+            next_cursor=completed_tasks_page.next_cursor,
+            previous_cursor=completed_tasks_page.previous_cursor,
             limit=limit,
         )
 
+    @page("/search", "search")
+    @auth.has_access
+    def _():
+        args = request.args
+        query = args.get("q", "").strip()
+        limit = current_app.config["SEARCH_RESULTS_LIMIT"]
+        page_number = max(int(args.get("page", "1")), 1)
+
+        tasks = task_usecase.search_tasks(
+            g.user_id, query, limit + 1, offset=(page_number - 1) * limit
+        )
+        has_next_page = len(tasks) > limit
+        tasks = tasks[:limit]
+
+        return render_template(
+            "pages/search.html",
+            query=query,
+            tasks=tasks,
+            breadcrumbs=task_usecase.get_tasks_breadcrumbs(tasks),
+            page_number=page_number,
+            has_next_page=has_next_page,
+        )
+
+    @page("/stats", "stats")
+    @auth.has_access
+    def _():
+        # Not a conditional page: the days shown move on with the date, not
+        # with the tasks version.
+        today = datetime.datetime.utcnow().date()
+        first_week_day = today - datetime.timedelta(
+            days=today.weekday() + 7 * (current_app.config["STATS_WEEKS"] - 1)
+        )
+        weeks = stats_usecase.get_weekly_stats(g.user_id, first_week_day, today)
+        days = stats_usecase.get_daily_stats(
+            g.user_id,
+            today - datetime.timedelta(days=current_app.config["STATS_DAYS"] - 1),
+            today,
+        )
+        return render_template(
+            "pages/stats.html",
+            days=days,
+            weeks=weeks,
+            total=stats_usecase.sum_task_stats(first_week_day, weeks),
+        )
+
     @page("/tasks/<int:task_id>", "task")
     @auth.has_access
+    @app_runtime_helpers.reads_own_writes
+    @http_cache.conditional_page
     def _(task_id: int):
-        task = Task.get_or_none(id=task_id, user_id=g.user_id)
-        if task is None:
-            abort(404)
-
-        # fmt: off
-        subtasks = (
-            Task
-            .select()
-            .where(
-                Task.parent_task == task
-            )
+        def load_task_page() -> tuple[Task, list[Task], list[Task]]:
+            chain = task_usecase.get_task_chain(g.user_id, task_id)
+            if not chain:
+                abort(404)
+
+            task = chain[-1]
+            subtasks = list(task_usecase.select_subtasks(task))
+            return task, chain[:-1], subtasks
+
+        task, ancestors, subtasks = cache.get_cache().get_or_set(
+            f"task:{g.user_id}:{task_id}",
+            load_task_page,
+            tags=[cache.task_tag(task_id)],
         )
-        # fmt: on
 
         return render_template(
             "pages/task.html",
             task=task,
-            parent_task=task.parent_task,
+            ancestors=ancestors,
             subtasks=subtasks,
         )
 
+    @page("/tasks/<int:task_id>/tree", "task_tree")
+    @auth.has_access
+    @app_runtime_helpers.reads_own_writes
+    @http_cache.conditional_page
+    def _(task_id: int):
+        max_depth = current_app.config["TREE_MAX_DEPTH"]
+        depth = min(max(int(request.args.get("depth", max_depth)), 1), max_depth)
+
+        def load_task_tree() -> task_usecase.TaskTree:
+            task = task_usecase.get_task(g.user_id, task_id)
+            if task is None:
+                abort(404)
+
+            return task_usecase.get_task_tree(
+                task, depth, current_app.config["TREE_MAX_NODES"]
+            )
+
+        tree = cache.get_cache().get_or_set(
+            f"task-tree:{g.user_id}:{task_id}:{depth}",
+            load_task_tree,
+            tags=[cache.task_tag(task_id)],
+        )
+
+        return render_template("pages/task-tree.html", tree=tree, depth=depth)
+
+    @page("/export", "export_tasks")
+    @auth.has_access
+    def _():
+        args = request.args
+        export_format = args.get("format", "ndjson")
+        if export_format not in export_usecase.FORMATS:
+            abort(400)
+
+        chunks = export_usecase.export_tasks(g.user_id, export_format)
+        filename = f"tasks.{export_format}"
+        mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        if args.get("gzip") == "1":
+            chunks = export_usecase.gzip_chunks(chunks)
+            filename += ".gz"
+            mimetype = "application/gzip"
+
+        # The database stays bound to the thread until the stream ends.
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
     @form("/sign-up", "sign_up")
     def _():
         form = request.form
@@ -132,12 +241,14 @@ def init_app(app: Flask) -> None:
             notify.error("Passwords missmatch!")
             return redirect(url_for("pages.sign_up"))
 
-        if User.select(User.username).where(User.username == username).exists():
-            notify.error(f"User '{username}' exists already.")
-            return redirect(url_for("pages.sign_up"))
+        # Users are kept in the directory database, even with shards.
+        with sharding.bound(database.get_shards().directory):
+            if User.select(User.username).where(User.username == username).exists():
+                notify.error(f"User '{username}' exists already.")
+                return redirect(url_for("pages.sign_up"))
 
-        password_hasher = app_runtime_helpers.init_password_hasher()
-        user_usecase.create_user(username, password_hasher, password)
+            password_hasher = app_runtime_helpers.get_password_hasher()
+            user_usecase.create_user(username, password_hasher, password)
 
         return redirect(url_for("pages.login"))
 
@@ -147,16 +258,33 @@ def init_app(app: Flask) -> None:
         username = form["username"]
         password = form["password"]
 
-        user = User.get_or_none(username=username)
-        if user is None:
-            notify.error("Username/password is invalid.")
-            return redirect(url_for("pages.login"))
+        # Before the user lookup and the hash: a throttled attempt costs a
+        # bucket update and a short plain answer.
+        retry_after = throttle.check_login(request.remote_addr or "", username)
+        if retry_after:
+            return Response(
+                "Too many sign-in attempts, try again later.",
+                status=429,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+                mimetype="text/plain",
+            )
 
-        password_hasher = app_runtime_helpers.init_password_hasher()
-        if not password_hasher.is_hash_correct(user.password_hash, password):
-            notify.error("Username/password is invalid.")
-            return redirect(url_for("pages.login"))
+        shards = database.get_shards()
+        with sharding.bound(shards.directory):
+            user = User.get_or_none(username=username)
+            if user is None:
+                notify.error("Username/password is invalid.")
+                return redirect(url_for("pages.login"))
+
+            password_hasher = app_runtime_helpers.get_password_hasher()
+            if not password_hasher.is_hash_correct(user.password_hash, password):
+                notify.error("Username/password is invalid.")
+                return redirect(url_for("pages.login"))
 
+            if password_hasher.needs_rehash(user.password_hash):
+                user_usecase.update_password_hash(user, password_hasher, password)
+
+        shards.ensure_user(user.id)
         auth.authorize_user(user)
 
         return redirect(url_for("pages.index"))
@@ -178,10 +306,15 @@ def init_app(app: Flask) -> None:
         user = User.get_by_id(g.user_id)
         parent_task = None
         if parent_task_id is not None:
-            parent_task = Task.get_or_none(id=parent_task_id, user=user)
-
-        task_usecase.create_task(
-            user, name, note=note, parent_task=parent_task
+            parent_task = task_usecase.get_task(user.id, parent_task_id)
+
+        app_runtime_helpers.run_write(
+            task_usecase.create_task,
+            user,
+            name,
+            note=note,
+            parent_task=parent_task,
+            defer_progress=app_runtime_helpers.is_progress_deferred(),
         )
 
         url = (
@@ -191,23 +324,66 @@ def init_app(app: Flask) -> None:
         )
         return redirect(url)
 
+    @form("/tasks/import", "import_tasks")
+    @auth.has_access
+    def _():
+        form = request.form
+        upload = request.files.get("file")
+        import_format = form.get("format", "outline")
+        parent_task_id = form.get("parent_task_id")
+        if upload is None or import_format not in bulk_import.FORMATS:
+            abort(400)
+
+        user = User.get_by_id(g.user_id)
+        parent_task = None
+        if parent_task_id is not None:
+            parent_task = task_usecase.get_task(user.id, parent_task_id)
+            if parent_task is None:
+                abort(400)
+
+        # Runs in the request thread even with the write queue: the upload is
+        # read while importing, and the import is a single transaction anyway.
+        items = bulk_import.parse(
+            import_format,
+            io.TextIOWrapper(upload.stream, encoding="utf-8"),
+            max_tasks=current_app.config["IMPORT_MAX_TASKS"],
+        )
+        try:
+            imported_count = task_usecase.import_tasks(
+                user, items, parent_task=parent_task
+            )
+        except bulk_import.InvalidImport as exc:
+            notify.error(f"Nothing imported: {exc}.")
+        else:
+            notify.success(f"{imported_count} task(s) imported.")
+
+        return redirect(
+            url_for("pages.task", task_id=parent_task_id)
+            if parent_task_id is not None
+            else url_for("pages.active_tasks")
+        )
+
     @form("/tasks/remove", "remove_task")
     @auth.has_access
     def _():
         form = request.form
         task_id = form["task_id"]
 
-        task = Task.get_or_none(id=task_id, user_id=g.user_id)
+        task = task_usecase.get_task(g.user_id, task_id)
         if task is None:
             abort(400)
 
-        parent_task = task.parent_task
+        parent_task_id = task.parent_task_id
 
-        task_usecase.remove_task(task)
+        app_runtime_helpers.run_write(
+            task_usecase.remove_task,
+            task,
+            defer_progress=app_runtime_helpers.is_progress_deferred(),
+        )
 
         return redirect(
-            url_for("pages.task", task_id=parent_task.id)
-            if parent_task is not None
+            url_for("pages.task", task_id=parent_task_id)
+            if parent_task_id is not None
             else url_for("pages.active_tasks")
         )
 
@@ -217,25 +393,51 @@ def init_app(app: Flask) -> None:
         form = request.form
         task_id = form["task_id"]
 
-        task = Task.get_or_none(id=task_id, user_id=g.user_id)
+        task = task_usecase.get_task(g.user_id, task_id)
         if task is None:
             abort(400)
 
-        parent_task = task.parent_task
+        parent_task_id = task.parent_task_id
 
-        task_usecase.complete_task(task)
+        app_runtime_helpers.run_write(
+            task_usecase.complete_task,
+            task,
+            defer_progress=app_runtime_helpers.is_progress_deferred(),
+        )
 
         return redirect(
-            url_for("pages.task", task_id=parent_task.id)
-            if parent_task is not None
+            url_for("pages.task", task_id=parent_task_id)
+            if parent_task_id is not None
             else url_for("pages.active_tasks")
         )
 
+    @form("/tasks/restore", "restore_task")
+    @auth.has_access
+    def _():
+        tree_id = request.form["tree_id"]
+
+        task_id = app_runtime_helpers.run_write(
+            task_usecase.restore_archived_tree, g.user_id, tree_id
+        )
+        if task_id is None:
+            abort(400)
+
+        return redirect(url_for("pages.task", task_id=task_id))
+
     @app.errorhandler(Exception)
     def errorhandler(exc: Exception) -> Response:
         if isinstance(exc, auth.NotAuthorized):
             return redirect(url_for("pages.login"))
 
+        if isinstance(exc, PasswordHasherBusy):
+            retry_after = current_app.config["PWD_HASHER_RETRY_AFTER"]
+            return Response(
+                "Too many sign-in attempts right now, try again shortly.",
+                status=503,
+                headers={"Retry-After": str(retry_after)},
+                mimetype="text/plain",
+            )
+
         status_code = 500
         description = (
             "Sorry, something goes wrong."
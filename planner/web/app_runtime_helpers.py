@@ -1,11 +1,158 @@
+import atexit
+import datetime
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import peewee as pw
+from flask import Flask
 from flask import current_app
+from flask import g
 
+from planner.core.jobs import PeriodicJob
+from planner.core.models import db as models_db
+from planner.core.purger import TaskPurger
 from planner.core.security import PBKDF2_PasswordHasher
+from planner.core.security import PooledPasswordHasher
+from planner.core.usecase import tasks as task_usecase
+from planner.core.write_queue import WriteQueue
+
 
+def init_app(app: Flask) -> None:
+    workers = app.config["PWD_HASHER_WORKERS"]
+    executor: Executor
+    if app.config["PWD_HASHER_EXECUTOR"] == "process":
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
 
-def init_password_hasher() -> PBKDF2_PasswordHasher:
-    return PBKDF2_PasswordHasher(
-        hash_func=current_app.config["PBKDF2_PWD_HASHER_HASH_FUNC"],
-        iterations=current_app.config["PBKDF2_PWD_HASHER_ITERATIONS"],
-        salt_length=current_app.config["PBKDF2_PWD_HASHER_SALT_LENGTH"],
+    app.extensions["password_hasher"] = PooledPasswordHasher(
+        PBKDF2_PasswordHasher(
+            hash_func=app.config["PBKDF2_PWD_HASHER_HASH_FUNC"],
+            iterations=app.config["PBKDF2_PWD_HASHER_ITERATIONS"],
+            salt_length=app.config["PBKDF2_PWD_HASHER_SALT_LENGTH"],
+        ),
+        executor,
+        max_pending=workers + app.config["PWD_HASHER_QUEUE_SIZE"],
     )
+
+    # A write queue, an archive job and a purge job per database that holds
+    # tasks: the directory database, or each shard.
+    shards = app.extensions["shards"]
+    task_databases = shards.shards or [shards.directory]
+
+    write_queues: dict[pw.Database, WriteQueue] = {}
+    if app.config["WRITE_QUEUE_ENABLED"]:
+        for database in task_databases:
+            write_queues[database] = WriteQueue(
+                database,
+                max_batch_size=app.config["WRITE_QUEUE_MAX_BATCH_SIZE"],
+                max_delay=app.config["WRITE_QUEUE_MAX_DELAY_MS"] / 1000,
+            )
+            atexit.register(write_queues[database].close)
+    app.extensions["write_queues"] = write_queues
+
+    archive_jobs: list[PeriodicJob] = []
+    if app.config["ARCHIVE_ENABLED"]:
+        after_days = app.config["ARCHIVE_AFTER_DAYS"]
+        batch_size = app.config["ARCHIVE_BATCH_SIZE"]
+        for database in task_databases:
+            archive_jobs.append(
+                PeriodicJob(
+                    database,
+                    "archive-completed-trees",
+                    app.config["ARCHIVE_INTERVAL"],
+                    lambda: task_usecase.archive_completed_trees(
+                        datetime.datetime.utcnow()
+                        - datetime.timedelta(days=after_days),
+                        batch_size,
+                    ),
+                )
+            )
+            atexit.register(archive_jobs[-1].close)
+    app.extensions["archive_jobs"] = archive_jobs
+
+    purgers: dict[pw.Database, TaskPurger] = {}
+    purge_jobs: list[PeriodicJob] = []
+    if app.config["PURGE_ENABLED"]:
+        for database in task_databases:
+            purgers[database] = TaskPurger(app.config["PURGE_BATCH_SIZE"])
+            purge_jobs.append(
+                PeriodicJob(
+                    database,
+                    "purge-removed-tasks",
+                    app.config["PURGE_INTERVAL"],
+                    purgers[database].run,
+                )
+            )
+            atexit.register(purge_jobs[-1].close)
+    app.extensions["purgers"] = purgers
+    app.extensions["purge_jobs"] = purge_jobs
+
+    # Recomputes what deferred changes queued once it is `debounce` old, so a
+    # task changed many times meanwhile is recomputed once.
+    progress_jobs: list[PeriodicJob] = []
+    if app.config["PROGRESS_DEFERRED"]:
+        debounce = app.config["PROGRESS_DEBOUNCE_MS"] / 1000
+        batch_size = app.config["PROGRESS_BATCH_SIZE"]
+        for database in task_databases:
+            progress_jobs.append(
+                PeriodicJob(
+                    database,
+                    "recompute-progress",
+                    debounce,
+                    lambda: task_usecase.recompute_dirty_tasks(
+                        batch_size,
+                        marked_before=datetime.datetime.utcnow()
+                        - datetime.timedelta(seconds=debounce),
+                    ),
+                )
+            )
+            atexit.register(progress_jobs[-1].close)
+    app.extensions["progress_jobs"] = progress_jobs
+
+
+def get_password_hasher() -> PooledPasswordHasher:
+    return current_app.extensions["password_hasher"]
+
+
+def get_write_queue() -> Optional[WriteQueue]:
+    # The queue of the database bound to the calling thread, if any.
+    return current_app.extensions["write_queues"].get(models_db.obj)
+
+
+def is_progress_deferred() -> bool:
+    return current_app.config["PROGRESS_DEFERRED"]
+
+
+def reads_own_writes(f):
+    # Pages showing progress recompute what the user's deferred changes have
+    # queued before rendering, rather than show it stale until the worker
+    # gets to it. Goes below `has_access` and above `conditional_page`, so
+    # the ETag covers the recomputed progress.
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if is_progress_deferred() and task_usecase.has_dirty_tasks(g.user_id):
+            run_write(
+                task_usecase.recompute_dirty_tasks,
+                current_app.config["PROGRESS_BATCH_SIZE"],
+                user_id=g.user_id,
+            )
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def run_write(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    # Runs a task mutation through the write queue when it is enabled, in
+    # the calling thread otherwise.
+    write_queue = get_write_queue()
+    if write_queue is None:
+        return func(*args, **kwargs)
+    return write_queue.call(func, *args, **kwargs)
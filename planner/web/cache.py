@@ -0,0 +1,363 @@
+import pickle
+import sqlite3
+import threading
+import time
+import weakref
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+import peewee as pw
+from flask import Flask
+from flask import current_app
+
+from planner.core import events
+from planner.core.models import db as models_db
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+class Cache(ABC):
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        invalidation_seq: Optional[int] = None,
+    ) -> None:
+        # With `invalidation_seq` the value is dropped if any invalidation
+        # happened since that sequence number was read, so a value computed
+        # from data that changed meanwhile is never stored.
+        ...
+
+    @abstractmethod
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    def invalidation_seq(self) -> int:
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+    def get_or_set(
+        self, key: str, factory: Callable[[], Any], tags: Iterable[str] = ()
+    ) -> Any:
+        value = self.get(key)
+        if value is None:
+            invalidation_seq = self.invalidation_seq()
+            value = factory()
+            self.set(key, value, tags, invalidation_seq)
+        return value
+
+    def stats(self) -> CacheStats:
+        with self._stats_lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=self.size(),
+            )
+
+    def _count(self, hits: int = 0, misses: int = 0, evictions: int = 0) -> None:
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += misses
+            self._evictions += evictions
+
+
+class NullCache(Cache):
+    def get(self, key: str) -> Optional[Any]:
+        self._count(misses=1)
+        return None
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        invalidation_seq: Optional[int] = None,
+    ) -> None:
+        ...
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        ...
+
+    def invalidation_seq(self) -> int:
+        return 0
+
+    def size(self) -> int:
+        return 0
+
+
+class LRUCache(Cache):
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Any, frozenset[str]]]
+        self._entries = OrderedDict()
+        self._tag_keys: dict[str, set[str]] = {}
+        self._invalidation_seq = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self._count(evictions=1)
+                entry = None
+
+            if entry is None:
+                self._count(misses=1)
+                return None
+
+            self._entries.move_to_end(key)
+            self._count(hits=1)
+            return entry[1]
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        invalidation_seq: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            if invalidation_seq not in (None, self._invalidation_seq):
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + self._ttl, value, tags)
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self._max_size:
+                self._remove(next(iter(self._entries)))
+                self._count(evictions=1)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            self._invalidation_seq += 1
+            for tag in tags:
+                for key in list(self._tag_keys.get(tag, ())):
+                    self._remove(key)
+
+    def invalidation_seq(self) -> int:
+        return self._invalidation_seq
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tag_keys[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tag_keys[tag]
+
+
+class SqliteCache(Cache):
+    # Shared by every worker process that points at the same file. Entries
+    # are evicted by expiry time, the oldest first, once max_size is reached.
+
+    def __init__(self, path: str, max_size: int, ttl: float):
+        super().__init__()
+        self._path = path
+        self._max_size = max_size
+        self._ttl = ttl
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT NOT NULL PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " expires_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS cache_entries_expires_at"
+                " ON cache_entries (expires_at);"
+                "CREATE TABLE IF NOT EXISTS cache_tags ("
+                " tag TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " PRIMARY KEY (tag, key));"
+                "CREATE INDEX IF NOT EXISTS cache_tags_key ON cache_tags (key);"
+                "CREATE TABLE IF NOT EXISTS cache_invalidation_seq ("
+                " id INTEGER NOT NULL PRIMARY KEY CHECK (id = 1),"
+                " seq INTEGER NOT NULL);"
+                "INSERT OR IGNORE INTO cache_invalidation_seq (id, seq)"
+                " VALUES (1, 0);"
+            )
+
+    def get(self, key: str) -> Optional[Any]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            self._count(misses=1)
+            return None
+
+        self._count(hits=1)
+        return pickle.loads(row[0])
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        invalidation_seq: Optional[int] = None,
+    ) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            inserted = conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at)"
+                " SELECT ?, ?, ? FROM cache_invalidation_seq"
+                " WHERE coalesce(?, seq) = seq",
+                (key, pickle.dumps(value), now + self._ttl, invalidation_seq),
+            ).rowcount
+            if not inserted:
+                return
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)",
+                [(tag, key) for tag in tags],
+            )
+
+            evicted = conn.execute(
+                "DELETE FROM cache_entries WHERE expires_at <= ? OR key IN ("
+                " SELECT key FROM cache_entries ORDER BY expires_at"
+                " LIMIT max(0, (SELECT count(*) FROM cache_entries) - ?))",
+                (now, self._max_size),
+            ).rowcount
+            if evicted:
+                conn.execute(
+                    "DELETE FROM cache_tags"
+                    " WHERE key NOT IN (SELECT key FROM cache_entries)"
+                )
+                self._count(evictions=evicted)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tags = list(tags)
+        placeholders = ", ".join("?" for _ in tags)
+        with self._connection() as conn:
+            conn.execute("UPDATE cache_invalidation_seq SET seq = seq + 1")
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                f" SELECT key FROM cache_tags WHERE tag IN ({placeholders}))",
+                tags,
+            )
+            conn.execute(
+                f"DELETE FROM cache_tags WHERE tag IN ({placeholders})",
+                tags,
+            )
+
+    def invalidation_seq(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT seq FROM cache_invalidation_seq")
+            .fetchone()[0]
+        )
+
+    def size(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT count(*) FROM cache_entries")
+            .fetchone()[0]
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5)
+            conn.execute("PRAGMA journal_mode = wal")
+            conn.execute("PRAGMA synchronous = off")
+            self._local.conn = conn
+        return conn
+
+
+def task_tag(task_id: int) -> str:
+    return f"task:{task_id}"
+
+
+def root_tasks_tag(user_id: int) -> str:
+    return f"root-tasks:{user_id}"
+
+
+# The app of each database, for the events of the threads bound to it. Apps
+# are held weakly, so a dropped app stops receiving them.
+_apps_by_database: weakref.WeakValueDictionary[
+    pw.Database, Flask
+] = weakref.WeakValueDictionary()
+
+
+def _invalidate(event: events.TasksChanged) -> None:
+    # Changes are made on the database bound to the thread, by a request or
+    # by a worker of the app that owns it, and only go to that app's cache.
+    app = _apps_by_database.get(models_db.obj)
+    if app is None:
+        return
+
+    tags = [task_tag(i) for i in event.task_ids]
+    if event.root_tasks_changed:
+        tags.append(root_tasks_tag(event.user_id))
+    app.extensions["cache"].invalidate_tags(tags)
+
+
+events.subscribe(events.TasksChanged, _invalidate)
+
+
+def init_app(app: Flask) -> None:
+    backend = app.config["CACHE_BACKEND"]
+    if backend == "memory":
+        cache: Cache = LRUCache(app.config["CACHE_MAX_SIZE"], app.config["CACHE_TTL"])
+    elif backend == "sqlite":
+        cache = SqliteCache(
+            app.config["CACHE_PATH"],
+            app.config["CACHE_MAX_SIZE"],
+            app.config["CACHE_TTL"],
+        )
+    elif backend == "none":
+        cache = NullCache()
+    else:
+        raise ValueError(f"unknown cache backend: {backend!r}")
+
+    app.extensions["cache"] = cache
+    for database in app.extensions["shards"].all():
+        _apps_by_database[database] = app
+
+
+def get_cache() -> Cache:
+    return current_app.extensions["cache"]
@@ -8,10 +8,53 @@ from environs import Env
 class Config:
     SECRET_KEY: str
     DB_PATH: str
+    DB_AUTO_MIGRATE: bool
+    DB_SHARDS: int
+    DB_SHARD_PATH: str
     PBKDF2_PWD_HASHER_HASH_FUNC: str
     PBKDF2_PWD_HASHER_ITERATIONS: int
     PBKDF2_PWD_HASHER_SALT_LENGTH: int
+    PWD_HASHER_EXECUTOR: str
+    PWD_HASHER_WORKERS: int
+    PWD_HASHER_QUEUE_SIZE: int
+    PWD_HASHER_RETRY_AFTER: int
+    LOGIN_THROTTLE_ENABLED: bool
+    LOGIN_THROTTLE_BACKEND: str
+    LOGIN_THROTTLE_PATH: str
+    LOGIN_THROTTLE_ADDRESS_BURST: int
+    LOGIN_THROTTLE_ADDRESS_PER_MINUTE: float
+    LOGIN_THROTTLE_USERNAME_BURST: int
+    LOGIN_THROTTLE_USERNAME_PER_MINUTE: float
+    WRITE_QUEUE_ENABLED: bool
+    WRITE_QUEUE_MAX_BATCH_SIZE: int
+    WRITE_QUEUE_MAX_DELAY_MS: int
+    METRICS_ENABLED: bool
+    SLOW_QUERY_THRESHOLD_MS: int
     COMPLETED_TASKS_LIMIT: int
+    SEARCH_RESULTS_LIMIT: int
+    TREE_MAX_DEPTH: int
+    TREE_MAX_NODES: int
+    STATS_DAYS: int
+    STATS_WEEKS: int
+    IMPORT_MAX_TASKS: int
+    API_PAGE_SIZE: int
+    API_BATCH_MAX_OPERATIONS: int
+    ARCHIVE_ENABLED: bool
+    ARCHIVE_AFTER_DAYS: int
+    ARCHIVE_BATCH_SIZE: int
+    ARCHIVE_INTERVAL: int
+    PURGE_ENABLED: bool
+    PURGE_BATCH_SIZE: int
+    PURGE_INTERVAL: int
+    PROGRESS_DEFERRED: bool
+    PROGRESS_DEBOUNCE_MS: int
+    PROGRESS_BATCH_SIZE: int
+    HTTP_ETAGS_ENABLED: bool
+    HTTP_CACHE_CONTROL: str
+    CACHE_BACKEND: str
+    CACHE_MAX_SIZE: int
+    CACHE_TTL: int
+    CACHE_PATH: str
     LOCAL_RUN_HOST: str
     LOCAL_RUN_PORT: int
 
@@ -24,10 +67,63 @@ class Config:
             return cls(
                 SECRET_KEY=env.str("SECRET_KEY"),
                 DB_PATH=env.str("DB_PATH"),
+                DB_AUTO_MIGRATE=env.bool("DB_AUTO_MIGRATE", True),
+                DB_SHARDS=env.int("DB_SHARDS", 0),
+                DB_SHARD_PATH=env.str("DB_SHARD_PATH", "planner-shard-{shard}.db"),
                 PBKDF2_PWD_HASHER_HASH_FUNC=env.str("PBKDF2_PWD_HASHER_HASH_FUNC"),
                 PBKDF2_PWD_HASHER_ITERATIONS=env.int("PBKDF2_PWD_HASHER_ITERATIONS"),
                 PBKDF2_PWD_HASHER_SALT_LENGTH=env.int("PBKDF2_PWD_HASHER_SALT_LENGTH"),
+                PWD_HASHER_EXECUTOR=env.str("PWD_HASHER_EXECUTOR", "thread"),
+                PWD_HASHER_WORKERS=env.int("PWD_HASHER_WORKERS", 2),
+                PWD_HASHER_QUEUE_SIZE=env.int("PWD_HASHER_QUEUE_SIZE", 8),
+                PWD_HASHER_RETRY_AFTER=env.int("PWD_HASHER_RETRY_AFTER", 1),
+                LOGIN_THROTTLE_ENABLED=env.bool("LOGIN_THROTTLE_ENABLED", True),
+                LOGIN_THROTTLE_BACKEND=env.str("LOGIN_THROTTLE_BACKEND", "memory"),
+                LOGIN_THROTTLE_PATH=env.str(
+                    "LOGIN_THROTTLE_PATH", "planner-throttle.db"
+                ),
+                LOGIN_THROTTLE_ADDRESS_BURST=env.int(
+                    "LOGIN_THROTTLE_ADDRESS_BURST", 20
+                ),
+                LOGIN_THROTTLE_ADDRESS_PER_MINUTE=env.float(
+                    "LOGIN_THROTTLE_ADDRESS_PER_MINUTE", 10
+                ),
+                LOGIN_THROTTLE_USERNAME_BURST=env.int(
+                    "LOGIN_THROTTLE_USERNAME_BURST", 10
+                ),
+                LOGIN_THROTTLE_USERNAME_PER_MINUTE=env.float(
+                    "LOGIN_THROTTLE_USERNAME_PER_MINUTE", 3
+                ),
+                WRITE_QUEUE_ENABLED=env.bool("WRITE_QUEUE_ENABLED", False),
+                WRITE_QUEUE_MAX_BATCH_SIZE=env.int("WRITE_QUEUE_MAX_BATCH_SIZE", 64),
+                WRITE_QUEUE_MAX_DELAY_MS=env.int("WRITE_QUEUE_MAX_DELAY_MS", 2),
+                METRICS_ENABLED=env.bool("METRICS_ENABLED", False),
+                SLOW_QUERY_THRESHOLD_MS=env.int("SLOW_QUERY_THRESHOLD_MS", 100),
                 COMPLETED_TASKS_LIMIT=env.int("COMPLETED_TASKS_LIMIT", 10),
+                SEARCH_RESULTS_LIMIT=env.int("SEARCH_RESULTS_LIMIT", 20),
+                TREE_MAX_DEPTH=env.int("TREE_MAX_DEPTH", 4),
+                TREE_MAX_NODES=env.int("TREE_MAX_NODES", 500),
+                STATS_DAYS=env.int("STATS_DAYS", 30),
+                STATS_WEEKS=env.int("STATS_WEEKS", 12),
+                IMPORT_MAX_TASKS=env.int("IMPORT_MAX_TASKS", 100000),
+                API_PAGE_SIZE=env.int("API_PAGE_SIZE", 50),
+                API_BATCH_MAX_OPERATIONS=env.int("API_BATCH_MAX_OPERATIONS", 500),
+                ARCHIVE_ENABLED=env.bool("ARCHIVE_ENABLED", False),
+                ARCHIVE_AFTER_DAYS=env.int("ARCHIVE_AFTER_DAYS", 30),
+                ARCHIVE_BATCH_SIZE=env.int("ARCHIVE_BATCH_SIZE", 100),
+                ARCHIVE_INTERVAL=env.int("ARCHIVE_INTERVAL", 3600),
+                PURGE_ENABLED=env.bool("PURGE_ENABLED", True),
+                PURGE_BATCH_SIZE=env.int("PURGE_BATCH_SIZE", 500),
+                PURGE_INTERVAL=env.int("PURGE_INTERVAL", 10),
+                PROGRESS_DEFERRED=env.bool("PROGRESS_DEFERRED", False),
+                PROGRESS_DEBOUNCE_MS=env.int("PROGRESS_DEBOUNCE_MS", 250),
+                PROGRESS_BATCH_SIZE=env.int("PROGRESS_BATCH_SIZE", 500),
+                HTTP_ETAGS_ENABLED=env.bool("HTTP_ETAGS_ENABLED", True),
+                HTTP_CACHE_CONTROL=env.str("HTTP_CACHE_CONTROL", "private, no-cache"),
+                CACHE_BACKEND=env.str("CACHE_BACKEND", "none"),
+                CACHE_MAX_SIZE=env.int("CACHE_MAX_SIZE", 1024),
+                CACHE_TTL=env.int("CACHE_TTL", 300),
+                CACHE_PATH=env.str("CACHE_PATH", "planner-cache.db"),
                 LOCAL_RUN_HOST=env.str("LOCAL_RUN_HOST", "localhost"),
                 LOCAL_RUN_PORT=env.int("LOCAL_RUN_PORT", 5000),
             )
@@ -1,34 +1,191 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Callable
+from typing import Optional
+
 import peewee as pw
 from flask import Flask
 from flask import current_app
-from flask import g
+from flask import session
 
-from planner.core.models import Task
-from planner.core.models import User
+from planner.core import migrations
+from planner.core import sharding
 from planner.core.models import db as models_db
 
 
-def init_app(app: Flask) -> None:
-    db = pw.SqliteDatabase(
-        app.config["DB_PATH"],
+# Connections inherited over fork() are parked here, never used or closed
+# by the child: finalizing them would close SQLite handles the parent owns.
+_inherited_connections: list[sqlite3.Connection] = []
+
+
+class ConnectionManagedSqliteDatabase(pw.SqliteDatabase):
+    # One connection per thread (peewee keeps connection state in a
+    # thread-local), opened on first use and kept across requests. Every
+    # connection is tracked with the thread that owns it, so the ones of
+    # exited threads can be closed, close_all() can shut them down at exit
+    # and a forked child starts without any.
+    #
+    # Threads of one process take turns on IMMEDIATE transactions through a
+    # lock instead of SQLite's busy polling, which starves waiters once the
+    # write lock is almost always held; other processes still rely on the
+    # busy timeout.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, check_same_thread=False, **kwargs)
+        self._connections_lock = threading.Lock()
+        self._connections: dict[sqlite3.Connection, threading.Thread] = {}
+        self._write_lock = threading.Lock()
+        self._write_lock_owner = threading.local()
+        self._query_listeners: list[Callable[[str, float], None]] = []
+
+        database_ref = weakref.ref(self)
+
+        def after_fork_in_child():
+            database = database_ref()
+            if database is not None:
+                database._forget_connections()
+
+        os.register_at_fork(after_in_child=after_fork_in_child)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A server may start a thread per request: connections of threads
+        # gone since are closed here rather than piling up until exit.
+        self._close_orphaned_connections()
+        conn = super()._connect()
+        with self._connections_lock:
+            self._connections[conn] = threading.current_thread()
+        return conn
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        with self._connections_lock:
+            self._connections.pop(conn, None)
+        super()._close(conn)
+
+    def add_query_listener(self, listener: Callable[[str, float], None]) -> None:
+        # `listener(sql, seconds)` is called after every statement, in the
+        # thread that ran it. The time covers execution up to the first row,
+        # not fetching the rest.
+        self._query_listeners.append(listener)
+
+    def execute_sql(self, sql, params=None, commit=pw.SENTINEL):
+        if not self._query_listeners:
+            return super().execute_sql(sql, params, commit)
+
+        started_at = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params, commit)
+        finally:
+            seconds = time.perf_counter() - started_at
+            for listener in self._query_listeners:
+                listener(sql, seconds)
+
+    def begin(self, lock_type: Optional[str] = None) -> None:
+        if lock_type not in ("IMMEDIATE", "EXCLUSIVE"):
+            super().begin(lock_type)
+            return
+
+        self._write_lock.acquire()
+        try:
+            super().begin(lock_type)
+        except BaseException:
+            self._write_lock.release()
+            raise
+        self._write_lock_owner.holds = True
+
+    def commit(self) -> None:
+        try:
+            super().commit()
+        finally:
+            self._release_write_lock()
+
+    def rollback(self) -> None:
+        try:
+            super().rollback()
+        finally:
+            self._release_write_lock()
+
+    def connections_count(self) -> int:
+        # Connections of live threads.
+        self._close_orphaned_connections()
+        with self._connections_lock:
+            return len(self._connections)
+
+    def close_all(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, {}
+        for conn in connections:
+            conn.close()
+        self._state = pw._ConnectionLocal()
+
+    def _close_orphaned_connections(self) -> None:
+        # Nothing else can be using them: peewee only hands a connection to
+        # the thread that opened it.
+        with self._connections_lock:
+            orphaned = [
+                conn
+                for conn, thread in self._connections.items()
+                if not thread.is_alive()
+            ]
+            for conn in orphaned:
+                del self._connections[conn]
+        for conn in orphaned:
+            conn.close()
+
+    def _release_write_lock(self) -> None:
+        if getattr(self._write_lock_owner, "holds", False):
+            self._write_lock_owner.holds = False
+            self._write_lock.release()
+
+    def _forget_connections(self) -> None:
+        _inherited_connections.extend(self._connections)
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._write_lock_owner = threading.local()
+        self._lock = threading.RLock()
+        self._state = pw._ConnectionLocal()
+
+
+def open_database(path: str) -> ConnectionManagedSqliteDatabase:
+    return ConnectionManagedSqliteDatabase(
+        path,
         pragmas=[
             ("cache_size", -1024 * 64),
             ("journal_mode", "wal"),
             ("foreign_keys", 1),
         ],
     )
-    models_list = [User, Task]
 
-    with db.bind_ctx(models_list):
-        db.create_tables(models_list)
+
+def init_app(app: Flask) -> None:
+    db = open_database(app.config["DB_PATH"])
+    shard_databases = [
+        open_database(sharding.shard_path(app.config["DB_SHARD_PATH"], i))
+        for i in range(app.config["DB_SHARDS"])
+    ]
+    shards = sharding.Shards(db, shard_databases)
+
+    for database in shards.all():
+        if app.config["DB_AUTO_MIGRATE"]:
+            migrations.migrate(database)
+        atexit.register(database.close_all)
 
     app.config["DATABASE"] = db
+    app.extensions["shards"] = shards
 
     @app.before_request
-    def enable_database():
-        g._origin_db = models_db.obj
-        models_db.initialize(current_app.config["DATABASE"])
+    def bind_database():
+        # The requests of a signed-in user run on the user's shard.
+        models_db.bind_thread(get_shards().for_user(session.get("uid")))
 
     @app.teardown_request
-    def disable_database(*_):
-        models_db.initialize(g._origin_db)
+    def unbind_database(*_):
+        models_db.unbind_thread()
+
+
+def get_shards() -> sharding.Shards:
+    return current_app.extensions["shards"]
@@ -0,0 +1,64 @@
+import hashlib
+import os
+from functools import wraps
+
+from flask import Flask
+from flask import current_app
+from flask import g
+from flask import make_response
+from flask import request
+from flask import session
+
+from planner.core.usecase import tasks as task_usecase
+
+
+def init_app(app: Flask) -> None:
+    # Part of every ETag, so responses cached by clients before a deploy that
+    # changed the templates are not reused.
+    app.extensions["http_cache_build"] = _templates_digest(
+        os.path.join(app.root_path, app.template_folder)
+    )
+
+
+def conditional_page(f):
+    # Answers with 304 while nothing about the user's tasks has changed since
+    # the client's copy, without running the view. Goes below `has_access`.
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        # Flashed messages are shown once and are not covered by the version.
+        if not current_app.config["HTTP_ETAGS_ENABLED"] or "_flashes" in session:
+            return _with_cache_control(make_response(f(*args, **kwargs)))
+
+        # The version is read before the view: a change made meanwhile is
+        # rendered under the older ETag and only costs the client a refresh.
+        etag = "{}-{}-{}".format(
+            current_app.extensions["http_cache_build"],
+            g.user_id,
+            task_usecase.get_tasks_version(g.user_id),
+        )
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+        response.set_etag(etag)
+        return _with_cache_control(response)
+
+    return wrapper
+
+
+def _with_cache_control(response):
+    response.headers["Cache-Control"] = current_app.config["HTTP_CACHE_CONTROL"]
+    response.vary.add("Cookie")
+    return response
+
+
+def _templates_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    for dir_path, dir_names, file_names in os.walk(path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
@@ -0,0 +1,205 @@
+import logging
+from typing import Any
+
+from flask import Blueprint
+from flask import Flask
+from flask import Response
+from flask import abort
+from flask import current_app
+from flask import g
+from flask import jsonify
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.usecase import tasks as task_usecase
+from planner.web import app_runtime_helpers
+from planner.web import auth
+from planner.web import http_cache
+from planner.web import pagination
+
+
+# Fields a client may ask for with `fields=`, by their name in responses.
+TASK_FIELDS = {
+    "id": Task.id,
+    "parent_id": Task.parent_task,
+    "name": Task.name,
+    "note": Task.note,
+    "progress": Task.progress,
+    "created_at": Task.created_at,
+    "child_count": Task.child_count,
+    "depth": Task.depth,
+}
+DEFAULT_TASK_FIELDS = ("id", "parent_id", "name", "progress")
+
+_TASK_OPERATION_KINDS = ("create", "complete", "remove")
+
+
+def init_app(app: Flask) -> None:
+    api_bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+    # fmt: off
+    route = lambda url, ep, methods: api_bp.route(url, endpoint=ep, methods=methods)  # noqa: E731, E501
+    # fmt: on
+
+    @route("/tasks", "tasks", ["GET"])
+    @auth.has_access
+    @app_runtime_helpers.reads_own_writes
+    @http_cache.conditional_page
+    def _():
+        # Top-level tasks, or the subtasks of `parent_id`, newest first.
+        args = request.args
+        fields = _parse_fields(args.get("fields"))
+        limit = _parse_int(args.get("limit"), current_app.config["API_PAGE_SIZE"])
+        limit = min(max(limit, 1), current_app.config["API_PAGE_SIZE"])
+        status = args.get("status", "all")
+        if status not in ("active", "completed", "all"):
+            abort(400, "status must be active, completed or all")
+
+        query = task_usecase.select_tasks(g.user_id)
+        if "parent_id" in args:
+            parent_task_id = _parse_int(args["parent_id"], None)
+            query = query.where(Task.parent_task == parent_task_id)
+        else:
+            query = query.where(Task.parent_task.is_null())
+        if status == "active":
+            query = query.where(Task.progress != 100)
+        elif status == "completed":
+            query = query.where(Task.progress == 100)
+
+        # The cursors need the creation time and id of every task.
+        columns = {*fields, "id", "created_at"}
+        query = query.select(*(TASK_FIELDS[f] for f in columns))
+        try:
+            page = pagination.paginate(
+                query, limit, after=args.get("after"), before=args.get("before")
+            )
+        except pagination.InvalidCursor:
+            abort(400, "invalid cursor")
+
+        return jsonify(
+            tasks=[_serialize_task(t, fields) for t in page.items],
+            next_cursor=page.next_cursor,
+            previous_cursor=page.previous_cursor,
+        )
+
+    @route("/tasks/<int:task_id>", "task", ["GET"])
+    @auth.has_access
+    @app_runtime_helpers.reads_own_writes
+    @http_cache.conditional_page
+    def _(task_id: int):
+        fields = _parse_fields(request.args.get("fields"))
+        # fmt: off
+        task = (
+            task_usecase
+            .select_tasks(g.user_id, *(TASK_FIELDS[f] for f in fields))
+            .where(Task.id == task_id)
+            .first()
+        )
+        # fmt: on
+        if task is None:
+            abort(404, f"no task {task_id}")
+
+        return jsonify(task=_serialize_task(task, fields))
+
+    @route("/tasks/batch", "tasks_batch", ["POST"])
+    @auth.has_access
+    def _():
+        # {"operations": [{"op": "create", "name": ..., "note": ...,
+        # "parent_id": ... or "parent_ref": <index of an earlier create>},
+        # {"op": "complete", "id": ...}, {"op": "remove", "id": ...}]}
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get("operations"), list):
+            abort(400, "the body must be a JSON object with a list of operations")
+
+        items = body["operations"]
+        max_operations = current_app.config["API_BATCH_MAX_OPERATIONS"]
+        if len(items) > max_operations:
+            abort(400, f"at most {max_operations} operations per batch")
+        operations = [_parse_operation(i, item) for i, item in enumerate(items)]
+
+        user = User.get_by_id(g.user_id)
+        try:
+            results = app_runtime_helpers.run_write(
+                task_usecase.apply_task_operations,
+                user,
+                operations,
+                defer_progress=app_runtime_helpers.is_progress_deferred(),
+            )
+        except task_usecase.InvalidTaskOperation as exc:
+            return _error(409, str(exc), index=exc.index)
+
+        return jsonify(results=[{"id": task_id} for task_id in results])
+
+    @api_bp.errorhandler(Exception)
+    def errorhandler(exc: Exception) -> Response:
+        if isinstance(exc, auth.NotAuthorized):
+            return _error(401, "not authorized")
+        if isinstance(exc, HTTPException):
+            return _error(exc.code, exc.description)
+
+        logger = logging.getLogger(__name__)
+        logger.exception("unexpected error:")
+        return _error(500, "internal error")
+
+    app.register_blueprint(api_bp)
+
+
+def _parse_fields(value: Any) -> tuple[str, ...]:
+    if value is None:
+        return DEFAULT_TASK_FIELDS
+
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in TASK_FIELDS]
+    if unknown or not fields:
+        abort(400, f"fields must be some of {', '.join(TASK_FIELDS)}")
+    return fields
+
+
+def _parse_int(value: Any, default: Any) -> Any:
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        abort(400, f"{value!r} is not an integer")
+
+
+def _parse_operation(index: int, item: Any) -> task_usecase.TaskOperation:
+    if not isinstance(item, dict) or item.get("op") not in _TASK_OPERATION_KINDS:
+        abort(400, f"operation {index}: op must be one of create, complete, remove")
+
+    for key in ("id", "parent_id", "parent_ref"):
+        if item.get(key) is not None and type(item[key]) is not int:
+            abort(400, f"operation {index}: {key} must be an integer")
+    for key in ("name", "note"):
+        if item.get(key) is not None and not isinstance(item[key], str):
+            abort(400, f"operation {index}: {key} must be a string")
+
+    return task_usecase.TaskOperation(
+        kind=item["op"],
+        task_id=item.get("id"),
+        parent_task_id=item.get("parent_id"),
+        parent_ref=item.get("parent_ref"),
+        name=item.get("name"),
+        note=item.get("note"),
+    )
+
+
+def _serialize_task(task: Task, fields: tuple[str, ...]) -> dict:
+    data = {}
+    for field in fields:
+        if field == "parent_id":
+            data[field] = task.parent_task_id
+        elif field == "created_at":
+            data[field] = task.created_at.isoformat()
+        else:
+            data[field] = getattr(task, field)
+    return data
+
+
+def _error(status_code: int, message: str, **extra: Any) -> Response:
+    response = jsonify(error=message, **extra)
+    response.status_code = status_code
+    return response
@@ -0,0 +1,397 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+from flask import Blueprint
+from flask import Flask
+from flask import Response
+from flask import current_app
+from flask import g
+from flask import has_request_context
+from flask import request
+
+from planner.core import sharding
+from planner.core.usecase import tasks as task_usecase
+from planner.core.write_queue import WriteQueueStats
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger("planner.slow_query")
+
+
+@dataclass(frozen=True)
+class MetricFamily:
+    name: str
+    kind: str
+    help: str
+    # (name suffix, labels, value)
+    samples: list[tuple[str, dict[str, str], float]]
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            samples = [("_total", dict(k), v) for k, v in self._values.items()]
+        return MetricFamily(self.name, "counter", self.help, samples)
+
+
+class MaxGauge:
+    # Keeps the largest value seen per label set.
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = max(self._values.get(key, value), value)
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            samples = [("", dict(k), v) for k, v in self._values.items()]
+        return MetricFamily(self.name, "gauge", self.help, samples)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float]):
+        self.name = name
+        self.help = help
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> (counts per bucket, sum, count)
+        self._values: dict[tuple, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self._buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def collect(self) -> MetricFamily:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = dict(key)
+                for bound, bucket_count in zip(self._buckets, counts):
+                    samples.append(
+                        (
+                            "_bucket",
+                            {**labels, "le": _format_value(bound)},
+                            bucket_count,
+                        )
+                    )
+                samples.append(("_bucket", {**labels, "le": "+Inf"}, count))
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, count))
+        return MetricFamily(self.name, "histogram", self.help, samples)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def max_gauge(self, name: str, help: str) -> MaxGauge:
+        return self._register(MaxGauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float]) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        # `collector` is called on every scrape, for values owned elsewhere.
+        self._collectors.append(collector)
+
+    def collect(self) -> list[MetricFamily]:
+        families = [m.collect() for m in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+        return families
+
+    def render(self) -> str:
+        lines = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for suffix, labels, value in family.samples:
+                lines.append(
+                    f"{family.name}{suffix}{_format_labels(labels)}"
+                    f" {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+@dataclass
+class RequestQueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_sql: Optional[str] = None
+
+    def add(self, sql: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_sql = sql
+
+
+def init_app(app: Flask) -> None:
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    registry = MetricsRegistry()
+    request_seconds = registry.histogram(
+        "planner_request_duration_seconds",
+        "Request latency by endpoint, method and status.",
+        LATENCY_BUCKETS,
+    )
+    request_queries = registry.histogram(
+        "planner_request_queries",
+        "SQL statements issued per request by endpoint.",
+        QUERY_COUNT_BUCKETS,
+    )
+    request_query_seconds = registry.counter(
+        "planner_request_query_seconds",
+        "Time spent in SQL statements by endpoint.",
+    )
+    slowest_query_seconds = registry.max_gauge(
+        "planner_request_slowest_query_seconds",
+        "Slowest SQL statement seen by endpoint.",
+    )
+    queries = registry.counter("planner_sql_queries", "SQL statements executed.")
+    slow_queries = registry.counter(
+        "planner_sql_slow_queries", "SQL statements slower than the threshold."
+    )
+    registry.add_collector(lambda: _collect_runtime(app))
+
+    slow_query_seconds = app.config["SLOW_QUERY_THRESHOLD_MS"] / 1000
+
+    def on_query(sql: str, seconds: float) -> None:
+        queries.inc()
+        in_request = has_request_context()
+        if seconds >= slow_query_seconds:
+            slow_queries.inc()
+            slow_query_logger.warning(
+                "slow query (%.1f ms) at %s: %s",
+                seconds * 1000,
+                request.endpoint if in_request else "-",
+                sql,
+            )
+
+        stats = g.get("query_stats") if in_request else None
+        if stats is not None:
+            stats.add(sql, seconds)
+
+    for database in app.extensions["shards"].all():
+        database.add_query_listener(on_query)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started_at = time.perf_counter()
+        g.query_stats = RequestQueryStats()
+
+    @app.after_request
+    def observe_request_metrics(response: Response) -> Response:
+        started_at = g.get("request_started_at")
+        if started_at is None:
+            return response
+
+        seconds = time.perf_counter() - started_at
+        endpoint = request.endpoint or "unmatched"
+        stats: RequestQueryStats = g.query_stats
+        request_seconds.observe(
+            seconds,
+            endpoint=endpoint,
+            method=request.method,
+            status=str(response.status_code),
+        )
+        request_queries.observe(stats.count, endpoint=endpoint)
+        request_query_seconds.inc(stats.seconds, endpoint=endpoint)
+        if stats.count:
+            slowest_query_seconds.observe(stats.slowest_seconds, endpoint=endpoint)
+        current_app.logger.debug(
+            "%s %s: %d queries, %.1f ms in SQL, slowest %.1f ms: %s",
+            request.method,
+            endpoint,
+            stats.count,
+            stats.seconds * 1000,
+            stats.slowest_seconds * 1000,
+            stats.slowest_sql,
+        )
+        return response
+
+    metrics_bp = Blueprint("metrics", __name__)
+
+    @metrics_bp.route("/metrics", endpoint="metrics", methods=["GET"])
+    def _():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    app.register_blueprint(metrics_bp)
+    app.extensions["metrics"] = registry
+
+
+def _collect_runtime(app: Flask) -> list[MetricFamily]:
+    families = []
+
+    cache = app.extensions.get("cache")
+    if cache is not None:
+        stats = cache.stats()
+        families += [
+            _counter("planner_cache_hits", "Cache hits.", stats.hits),
+            _counter("planner_cache_misses", "Cache misses.", stats.misses),
+            _counter("planner_cache_evictions", "Cache evictions.", stats.evictions),
+            _gauge("planner_cache_size", "Cached entries.", stats.size),
+        ]
+
+    login_throttle = app.extensions.get("login_throttle")
+    if login_throttle is not None:
+        families.append(
+            _counter(
+                "planner_logins_throttled",
+                "Login attempts turned down by the throttle.",
+                login_throttle.stats().throttled,
+            )
+        )
+
+    password_hasher = app.extensions.get("password_hasher")
+    if password_hasher is not None:
+        stats = password_hasher.stats()
+        families += [
+            _counter(
+                "planner_password_hashes", "Password hashes computed.", stats.completed
+            ),
+            _counter(
+                "planner_password_hashes_rejected",
+                "Password hashes rejected because the pool was full.",
+                stats.rejected,
+            ),
+            _counter(
+                "planner_password_hash_queue_wait_seconds",
+                "Time password hashes waited for a worker.",
+                stats.queue_wait_seconds,
+            ),
+            _counter(
+                "planner_password_hash_seconds",
+                "Time spent hashing passwords.",
+                stats.hash_seconds,
+            ),
+        ]
+
+    # Summed over the write queues of all shards.
+    all_stats = [q.stats() for q in app.extensions["write_queues"].values()]
+    if all_stats:
+        stats = WriteQueueStats(
+            batches=sum(s.batches for s in all_stats),
+            operations=sum(s.operations for s in all_stats),
+            failed_operations=sum(s.failed_operations for s in all_stats),
+            commit_seconds=sum(s.commit_seconds for s in all_stats),
+        )
+        families += [
+            _counter(
+                "planner_write_queue_batches", "Write groups committed.", stats.batches
+            ),
+            _counter(
+                "planner_write_queue_operations",
+                "Operations run by the write queue.",
+                stats.operations,
+            ),
+            _counter(
+                "planner_write_queue_failed_operations",
+                "Operations of the write queue that failed.",
+                stats.failed_operations,
+            ),
+            _counter(
+                "planner_write_queue_commit_seconds",
+                "Time spent running and committing write groups.",
+                stats.commit_seconds,
+            ),
+        ]
+
+    # Also summed over the shards.
+    purgers = app.extensions["purgers"]
+    if purgers:
+        all_stats = [p.stats() for p in purgers.values()]
+        pending_count = 0
+        for database in purgers:
+            with sharding.bound(database):
+                pending_count += task_usecase.count_removed_tasks()
+        families += [
+            _counter(
+                "planner_purge_batches",
+                "Batches of removed tasks purged.",
+                sum(s.batches for s in all_stats),
+            ),
+            _counter(
+                "planner_purged_tasks",
+                "Removed tasks deleted by the purger.",
+                sum(s.purged_tasks for s in all_stats),
+            ),
+            _counter(
+                "planner_purge_seconds",
+                "Time spent purging removed tasks.",
+                sum(s.seconds for s in all_stats),
+            ),
+            _gauge(
+                "planner_purge_pending_tasks",
+                "Removed tasks whose subtrees wait for the purger.",
+                pending_count,
+            ),
+        ]
+
+    return families
+
+
+def _gauge(name: str, help: str, value: float) -> MetricFamily:
+    return MetricFamily(name, "gauge", help, [("", {}, value)])
+
+
+def _counter(name: str, help: str, value: float) -> MetricFamily:
+    return MetricFamily(name, "counter", help, [("_total", {}, value)])
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,123 @@
+import base64
+import datetime
+import heapq
+from dataclasses import dataclass
+from typing import Any
+from typing import Optional
+
+import peewee as pw
+
+from planner.core.models import Task
+
+
+@dataclass
+class KeysetPage:
+    items: list[Task]
+    next_cursor: Optional[str]
+    previous_cursor: Optional[str]
+
+
+class InvalidCursor(ValueError):
+    ...
+
+
+def encode_cursor(task: Task) -> str:
+    raw = f"{task.created_at.isoformat()}|{task.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, task_id = raw.decode("utf-8").split("|")
+        return datetime.datetime.fromisoformat(created_at), int(task_id)
+    except ValueError as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def paginate(
+    query: pw.SelectQuery,
+    limit: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    offset: Optional[int] = None,
+) -> KeysetPage:
+    # Pages over `query` newest first by (created_at, id). `after`/`before`
+    # are cursors of the last/first item of the neighbour page, `offset` is
+    # kept for links created before cursors existed.
+    return paginate_merged([query], limit, after=after, before=before, offset=offset)
+
+
+def paginate_merged(
+    queries: list[pw.SelectQuery],
+    limit: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    offset: Optional[int] = None,
+) -> KeysetPage:
+    # As `paginate`, over the rows of several queries, possibly of different
+    # models with `created_at` and `id` fields, as if they were one. Each
+    # query reads at most one page (plus the offset) and the pages are merged.
+    if before is not None:
+        cursor_key = decode_cursor(before)
+        # fmt: off
+        items_plus_one = _merge([
+            _order_by_key(q, newest_first=False)
+            .where(_key(q) > pw.Tuple(*cursor_key))
+            .limit(limit + 1)
+            for q in queries
+        ], newest_first=False)[:limit + 1]
+        # fmt: on
+        items = items_plus_one[:limit][::-1]
+        has_next = True
+        has_previous = len(items_plus_one) > limit
+    elif after is not None:
+        cursor_key = decode_cursor(after)
+        # fmt: off
+        items_plus_one = _merge([
+            _order_by_key(q, newest_first=True)
+            .where(_key(q) < pw.Tuple(*cursor_key))
+            .limit(limit + 1)
+            for q in queries
+        ], newest_first=True)[:limit + 1]
+        # fmt: on
+        items = items_plus_one[:limit]
+        has_next = len(items_plus_one) > limit
+        has_previous = True
+    else:
+        offset = offset or 0
+        # fmt: off
+        items_plus_one = _merge([
+            _order_by_key(q, newest_first=True)
+            .limit(offset + limit + 1)
+            for q in queries
+        ], newest_first=True)[offset:offset + limit + 1]
+        # fmt: on
+        items = items_plus_one[:limit]
+        has_next = len(items_plus_one) > limit
+        has_previous = offset > 0
+
+    return KeysetPage(
+        items=items,
+        next_cursor=encode_cursor(items[-1]) if has_next and items else None,
+        previous_cursor=encode_cursor(items[0]) if has_previous and items else None,
+    )
+
+
+def _key(query: pw.SelectQuery) -> pw.Tuple:
+    return pw.Tuple(query.model.created_at, query.model.id)
+
+
+def _order_by_key(query: pw.SelectQuery, newest_first: bool) -> pw.SelectQuery:
+    model = query.model
+    if newest_first:
+        return query.order_by(model.created_at.desc(), model.id.desc())
+    return query.order_by(model.created_at, model.id)
+
+
+def _merge(queries: list[pw.SelectQuery], newest_first: bool) -> list[Any]:
+    if len(queries) == 1:
+        return list(queries[0])
+    return list(
+        heapq.merge(*queries, key=lambda i: (i.created_at, i.id), reverse=newest_first)
+    )
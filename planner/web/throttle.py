@@ -0,0 +1,214 @@
+import sqlite3
+import threading
+import time
+from abc import ABC
+from abc import abstractmethod
+from dataclasses import dataclass
+
+from flask import Flask
+from flask import current_app
+
+
+# Buckets left untouched long enough to be full again are dropped every so
+# many attempts; a dropped bucket is the same as a full one.
+_PRUNE_EVERY = 1000
+
+
+@dataclass(frozen=True)
+class TokenBucketLimit:
+    # Up to `burst` attempts at once, refilled at `per_minute` a minute.
+    burst: int
+    per_minute: float
+
+    def refill_seconds(self) -> float:
+        # How long an emptied bucket takes to be full again.
+        return self.burst * 60 / self.per_minute
+
+
+@dataclass(frozen=True)
+class LoginThrottleStats:
+    throttled: int
+
+
+class TokenBuckets(ABC):
+    @abstractmethod
+    def take(self, key: str, limit: TokenBucketLimit) -> float:
+        # Takes a token from the bucket of `key` and returns 0, or returns the
+        # seconds until there is one if the bucket is empty.
+        ...
+
+    @abstractmethod
+    def prune(self, idle_seconds: float) -> None:
+        # Drops the buckets untouched for `idle_seconds`.
+        ...
+
+
+class MemoryTokenBuckets(TokenBuckets):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, key: str, limit: TokenBucketLimit) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (limit.burst, now))
+            tokens = min(
+                limit.burst, tokens + (now - updated_at) * limit.per_minute / 60
+            )
+            if tokens < 1:
+                return (1 - tokens) * 60 / limit.per_minute
+
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def prune(self, idle_seconds: float) -> None:
+        cutoff = time.monotonic() - idle_seconds
+        with self._lock:
+            self._buckets = {
+                key: bucket
+                for key, bucket in self._buckets.items()
+                if bucket[1] > cutoff
+            }
+
+
+class SqliteTokenBuckets(TokenBuckets):
+    # Shared by every worker process that points at the same file. A token
+    # is taken by one upsert, which leaves the row alone when it has none.
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            " key TEXT NOT NULL PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def take(self, key: str, limit: TokenBucketLimit) -> float:
+        now = time.time()
+        per_second = limit.per_minute / 60
+        conn = self._connection()
+        taken = conn.execute(
+            "INSERT INTO token_buckets (key, tokens, updated_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " tokens = min(?, tokens + (excluded.updated_at - updated_at) * ?) - 1,"
+            " updated_at = excluded.updated_at"
+            " WHERE min(?, tokens + (excluded.updated_at - updated_at) * ?) >= 1",
+            (
+                key,
+                limit.burst - 1,
+                now,
+                limit.burst,
+                per_second,
+                limit.burst,
+                per_second,
+            ),
+        ).rowcount
+        if taken:
+            return 0
+
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 0
+        tokens = row[0] + (now - row[1]) * per_second
+        return max((1 - tokens) / per_second, 0)
+
+    def prune(self, idle_seconds: float) -> None:
+        self._connection().execute(
+            "DELETE FROM token_buckets WHERE updated_at < ?",
+            (time.time() - idle_seconds,),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every statement is a transaction of its own.
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = wal")
+            conn.execute("PRAGMA synchronous = off")
+            self._local.conn = conn
+        return conn
+
+
+class LoginThrottle:
+    # Login attempts take a token from the bucket of the client address and
+    # then from the bucket of the username, so neither spraying passwords
+    # from one address nor guessing one user's password from many gets more
+    # than its share of the password hasher.
+
+    def __init__(
+        self,
+        buckets: TokenBuckets,
+        address_limit: TokenBucketLimit,
+        username_limit: TokenBucketLimit,
+    ):
+        self._buckets = buckets
+        self._address_limit = address_limit
+        self._username_limit = username_limit
+        self._lock = threading.Lock()
+        self._attempts = 0
+        self._throttled = 0
+
+    def check(self, address: str, username: str) -> float:
+        # 0 if the attempt may go on, otherwise the seconds to wait.
+        with self._lock:
+            self._attempts += 1
+            prune = self._attempts % _PRUNE_EVERY == 0
+        if prune:
+            self._buckets.prune(
+                max(
+                    self._address_limit.refill_seconds(),
+                    self._username_limit.refill_seconds(),
+                )
+            )
+
+        retry_after = self._buckets.take(f"address:{address}", self._address_limit)
+        if not retry_after:
+            retry_after = self._buckets.take(
+                f"username:{username}", self._username_limit
+            )
+        if retry_after:
+            with self._lock:
+                self._throttled += 1
+        return retry_after
+
+    def stats(self) -> LoginThrottleStats:
+        with self._lock:
+            return LoginThrottleStats(throttled=self._throttled)
+
+
+def init_app(app: Flask) -> None:
+    if not app.config["LOGIN_THROTTLE_ENABLED"]:
+        app.extensions["login_throttle"] = None
+        return
+
+    backend = app.config["LOGIN_THROTTLE_BACKEND"]
+    if backend == "memory":
+        buckets: TokenBuckets = MemoryTokenBuckets()
+    elif backend == "sqlite":
+        buckets = SqliteTokenBuckets(app.config["LOGIN_THROTTLE_PATH"])
+    else:
+        raise ValueError(f"unknown login throttle backend: {backend!r}")
+
+    app.extensions["login_throttle"] = LoginThrottle(
+        buckets,
+        TokenBucketLimit(
+            app.config["LOGIN_THROTTLE_ADDRESS_BURST"],
+            app.config["LOGIN_THROTTLE_ADDRESS_PER_MINUTE"],
+        ),
+        TokenBucketLimit(
+            app.config["LOGIN_THROTTLE_USERNAME_BURST"],
+            app.config["LOGIN_THROTTLE_USERNAME_PER_MINUTE"],
+        ),
+    )
+
+
+def check_login(address: str, username: str) -> float:
+    throttle = current_app.extensions["login_throttle"]
+    if throttle is None:
+        return 0
+    return throttle.check(address, username)
@@ -4,14 +4,18 @@ import secrets
 from contextlib import contextmanager
 from typing import Optional
 
+import flask
 import peewee as pw
 import pytest
 
-from planner.core.models import BaseModel
+from planner import web
+from planner.core import migrations
 from planner.core.models import Task
 from planner.core.models import User
 from planner.core.models import db as models_db
 from planner.core.security import PasswordHasher
+from planner.web import database
+from planner.web.config import Config
 
 
 class SHA1_PasswordHasher(PasswordHasher):
@@ -54,21 +58,29 @@ def make_task(make_user):
         progress: float = 0.0,
         created_at: Optional[datetime.datetime] = None,
     ) -> Task:
-        return Task.create(
+        task = Task.create(
             user=make_user() if user is None else user,
             parent_task=parent_task,
+            root_task=None if parent_task is None else parent_task.root_task_id,
+            path="/" if parent_task is None else parent_task.subtree_path(),
+            depth=0 if parent_task is None else parent_task.depth + 1,
             name=name,
             note=note,
             progress=progress,
             created_at=datetime.datetime.utcnow() if created_at is None else created_at,
         )
 
-    return _make_task
+        if parent_task is None:
+            task.root_task_id = task.id
+            task.save(only=[Task.root_task])
+        else:
+            parent_task.child_count += 1
+            parent_task.child_progress_sum += progress
+            parent_task.save(only=[Task.child_count, Task.child_progress_sum])
 
+        return task
 
-@pytest.fixture
-def models() -> list[BaseModel]:
-    return [User, Task]
+    return _make_task
 
 
 @pytest.fixture
@@ -86,8 +98,54 @@ def models_db_init_context():
 
 
 @pytest.fixture
-def with_memory_database(models, models_db_init_context):
+def with_memory_database(models_db_init_context):
     db = pw.SqliteDatabase(":memory:")
     with models_db_init_context(db):
-        db.create_tables(models)
+        migrations.migrate(db)
         yield
+
+
+@pytest.fixture
+def file_database(tmp_path, models_db_init_context):
+    db = database.open_database(str(tmp_path / "planner.db"))
+    with models_db_init_context(db):
+        migrations.migrate(db)
+        yield db
+    db.close_all()
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    def _make_app(**env: str) -> flask.Flask:
+        monkeypatch.setenv("PLANNER_SECRET_KEY", "secret")
+        monkeypatch.setenv("PLANNER_DB_PATH", str(tmp_path / "planner.db"))
+        monkeypatch.setenv("PLANNER_PBKDF2_PWD_HASHER_HASH_FUNC", "sha256")
+        monkeypatch.setenv("PLANNER_PBKDF2_PWD_HASHER_ITERATIONS", "1000")
+        monkeypatch.setenv("PLANNER_PBKDF2_PWD_HASHER_SALT_LENGTH", "16")
+        for name, value in env.items():
+            monkeypatch.setenv(f"PLANNER_{name}", value)
+        return web.create_app(Config.from_env())
+
+    return _make_app
+
+
+@pytest.fixture
+def count_queries():
+    # Counts the statements run on the models database inside the block.
+    @contextmanager
+    def _count_queries():
+        counter = {"count": 0}
+        database = models_db.obj
+        execute_sql = database.execute_sql
+
+        def counting_execute_sql(*args, **kwargs):
+            counter["count"] += 1
+            return execute_sql(*args, **kwargs)
+
+        database.execute_sql = counting_execute_sql
+        try:
+            yield counter
+        finally:
+            del database.execute_sql
+
+    return _count_queries
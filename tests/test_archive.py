@@ -0,0 +1,120 @@
+import datetime
+
+import pytest
+
+from planner.core.models import ArchivedTask
+from planner.core.models import Task
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+
+
+OLD = datetime.datetime(2021, 1, 1)
+CUTOFF = datetime.datetime(2021, 2, 1)
+
+
+@pytest.fixture
+def completed_tree(make_user, make_task):
+    user = make_user()
+    root = make_task(user=user, name="House", progress=100, created_at=OLD)
+    walls = make_task(user=user, parent_task=root, progress=100, created_at=OLD)
+    make_task(user=user, parent_task=walls, name="Bricks", progress=100, created_at=OLD)
+    return root
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_archive_completed_trees(make_task, completed_tree):
+    user = completed_tree.user
+    make_task(user=user, progress=100, created_at=CUTOFF)
+    make_task(user=user, progress=50, created_at=OLD)
+    for _ in range(2):
+        make_task(user=user, progress=100, created_at=OLD)
+
+    archived_count = task_usecase.archive_completed_trees(CUTOFF, batch_size=2)
+
+    assert archived_count == 3
+    assert Task.select().count() == 2
+    assert ArchivedTask.select().count() == 5
+    assert len({t.tree_id for t in ArchivedTask.select()}) == 3
+    assert task_usecase.search_tasks(user.id, "Bricks", 10) == []
+    assert task_usecase.get_tasks_version(user.id) == 2
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_restore_archived_tree(completed_tree):
+    user_id = completed_tree.user_id
+    task_usecase.archive_completed_trees(CUTOFF, batch_size=10)
+    tree_id = ArchivedTask.get(ArchivedTask.id == completed_tree.id).tree_id
+
+    assert task_usecase.restore_archived_tree(user_id + 1, tree_id) is None
+    restored_id = task_usecase.restore_archived_tree(user_id, tree_id)
+
+    assert restored_id == completed_tree.id
+    assert ArchivedTask.select().count() == 0
+    assert Task.get_by_id(restored_id).restored_at is not None
+    assert [t.name for t in task_usecase.search_tasks(user_id, "Bricks", 10)] == [
+        "Bricks"
+    ]
+    assert task_usecase.check_task_aggregates() == []
+    # Kept out of the archive for another full period.
+    a_day_ago = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    task_usecase.archive_completed_trees(a_day_ago, batch_size=10)
+    assert ArchivedTask.select().count() == 0
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_restore_archived_tree__remaps_taken_ids(make_task, completed_tree):
+    user = completed_tree.user
+    task_usecase.archive_completed_trees(CUTOFF, batch_size=10)
+    # Ids are not AUTOINCREMENT: the archived ones are handed out again.
+    new_task = make_task(user=user)
+    assert new_task.id == completed_tree.id
+    tree_id = ArchivedTask.get(ArchivedTask.id == completed_tree.id).tree_id
+
+    restored_id = task_usecase.restore_archived_tree(user.id, tree_id)
+
+    assert restored_id != completed_tree.id
+    chain = task_usecase.get_task_chain(user.id, restored_id + 2)
+    assert [t.id for t in chain] == [restored_id, restored_id + 1, restored_id + 2]
+    assert chain[-1].path == f"/{restored_id}/{restored_id + 1}/"
+    assert {t.root_task_id for t in chain} == {restored_id}
+    assert Task.get_by_id(new_task.id).name == new_task.name
+
+
+def test_completed_tasks_page__archived_trees(make_app):
+    app = make_app()
+    client = app.test_client()
+    client.post(
+        "/forms/sign-up", data={"username": "u", "password": "p", "password_copy": "p"}
+    )
+    client.post("/forms/login", data={"username": "u", "password": "p"})
+    for op, key, values in (
+        ("create", "name", [f"Done {i}" for i in range(4)]),
+        ("complete", "id", range(1, 5)),
+    ):
+        operations = [{"op": op, key: value} for value in values]
+        client.post("/api/v1/tasks/batch", json={"operations": operations})
+
+    models_db.bind_thread(app.config["DATABASE"])
+    try:
+        # Archives the first two, as if they were created long ago.
+        Task.update(created_at=OLD).where(Task.id <= 2).execute()
+        task_usecase.archive_completed_trees(CUTOFF, batch_size=10)
+        tree_id = ArchivedTask.get(ArchivedTask.name == "Done 1").tree_id
+    finally:
+        models_db.unbind_thread()
+
+    html = client.get("/completed-tasks?limit=3").get_data(as_text=True)
+    assert [n in html for n in ("Done 3", "Done 2", "Done 1", "Done 0")] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    assert html.count("Restore") == 1
+
+    response = client.post("/forms/tasks/restore", data={"tree_id": tree_id})
+    assert response.headers["Location"].endswith("/tasks/2")
+
+    html = client.get("/completed-tasks?limit=3").get_data(as_text=True)
+    assert html.count("Restore") == 0
+    assert "Done 0" not in html
@@ -0,0 +1,157 @@
+import io
+import json
+
+import pytest
+
+from planner.core.models import Task
+from planner.core.usecase import bulk_import
+from planner.core.usecase import export as export_usecase
+from planner.core.usecase import tasks as task_usecase
+
+
+def parsed(format, text, **kwargs):
+    return [
+        (item.key, item.parent_key, item.name, item.progress)
+        for item in bulk_import.parse(format, io.StringIO(text), **kwargs)
+    ]
+
+
+def test_parse__outline():
+    text = "Build a house\n  - Pool\n\t- [x] Buy tiles\n  Garden\nTravel\n"
+    assert parsed("outline", text) == [
+        (1, None, "Build a house", 0.0),
+        (2, 1, "Pool", 0.0),
+        (3, 2, "Buy tiles", 100.0),
+        (4, 1, "Garden", 0.0),
+        (5, None, "Travel", 0.0),
+    ]
+
+
+def test_parse__json():
+    document = {
+        "name": "Build a house",
+        "subtasks": [
+            {"name": "Pool", "subtasks": [{"name": "Buy tiles", "progress": 100}]},
+            {"name": "Garden"},
+        ],
+    }
+    assert parsed("json", json.dumps(document)) == [
+        (1, None, "Build a house", 0.0),
+        (2, 1, "Pool", 0.0),
+        (3, 2, "Buy tiles", 100.0),
+        (4, 1, "Garden", 0.0),
+    ]
+
+
+def test_parse__invalid():
+    with pytest.raises(bulk_import.InvalidImport, match="line 2: a task needs"):
+        parsed("ndjson", '{"id": 1, "name": "a"}\n{"id": 2, "parent_id": 1}\n')
+    with pytest.raises(bulk_import.InvalidImport, match="before its parent 3"):
+        parsed("ndjson", '{"id": 1, "name": "a", "parent_id": 3}\n')
+    with pytest.raises(bulk_import.InvalidImport, match="progress must be"):
+        parsed("json", '[{"name": "a", "progress": 101}]')
+    with pytest.raises(bulk_import.InvalidImport, match="more than 2 tasks"):
+        parsed("outline", "a\nb\nc\n", max_tasks=2)
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_import_tasks(make_user, make_task):
+    user = make_user()
+    parent_task = make_task(user=user)
+    make_task(user=user, parent_task=parent_task, progress=100)
+
+    text = (
+        "Build a house\n  Pool\n    [x] Buy tiles\n    Fill\n  [x] Garden\n[x] Call\n"
+    )
+    imported_count = task_usecase.import_tasks(
+        user, bulk_import.parse("outline", io.StringIO(text)), parent_task=parent_task
+    )
+
+    assert imported_count == 6
+    assert task_usecase.check_task_aggregates() == []
+    house = Task.get(name="Build a house")
+    assert (house.child_count, house.progress) == (2, 75)
+    assert house.path == parent_task.subtree_path()
+    assert Task.get(name="Buy tiles").path == f"{house.subtree_path()}{house.id + 1}/"
+    assert Task.get_by_id(parent_task.id).progress == 91.67
+    assert task_usecase.get_tasks_version(user.id) == 1
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_import_tasks__export_round_trip(make_user):
+    user = make_user()
+    task = task_usecase.create_task(user, "Build a house", note="4 bedrooms")
+    subtask = task_usecase.create_task(user, "Pool", parent_task=task)
+    task_usecase.create_task(user, "Garden", parent_task=task)
+    task_usecase.complete_task(subtask)
+
+    exported = b"".join(export_usecase.export_tasks(user.id, "ndjson")).decode()
+    other_user = make_user()
+    task_usecase.import_tasks(
+        other_user, bulk_import.parse("ndjson", io.StringIO(exported))
+    )
+
+    imported = list(
+        Task.select(Task.name, Task.note, Task.progress, Task.depth)
+        .where(Task.user == other_user)
+        .order_by(Task.id)
+        .tuples()
+    )
+    assert imported == [
+        ("Build a house", "4 bedrooms", 50, 0),
+        ("Pool", None, 100, 1),
+        ("Garden", None, 0, 1),
+    ]
+    assert task_usecase.check_task_aggregates() == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_import_tasks__invalid_input_imports_nothing(make_user):
+    user = make_user()
+
+    with pytest.raises(bulk_import.InvalidImport):
+        task_usecase.import_tasks(
+            user, bulk_import.parse("ndjson", io.StringIO('{"name": "a"}\n{]\n'))
+        )
+
+    assert Task.select().count() == 0
+    assert task_usecase.get_tasks_version(user.id) == 0
+    task_usecase.create_task(user, "House")
+    assert len(task_usecase.search_tasks(user.id, "house", 10)) == 1
+
+
+def test_import_tasks__endpoint(make_app):
+    client = make_app().test_client()
+    client.post(
+        "/forms/sign-up", data={"username": "u", "password": "p", "password_copy": "p"}
+    )
+    client.post("/forms/login", data={"username": "u", "password": "p"})
+
+    response = client.post(
+        "/forms/tasks/import",
+        data={"format": "outline", "file": (io.BytesIO(b"House\n  Pool\n"), "plan")},
+        follow_redirects=True,
+    )
+    assert b"2 task(s) imported." in response.data
+    assert b"House" in response.data
+
+    response = client.post(
+        "/forms/tasks/import",
+        data={"format": "json", "file": (io.BytesIO(b"\xff"), "plan.json")},
+        follow_redirects=True,
+    )
+    assert b"Nothing imported: the input is not UTF-8 text." in response.data
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_import_tasks__search_index(make_user):
+    user = make_user()
+    task_usecase.import_tasks(
+        user, bulk_import.parse("outline", io.StringIO("House\n  Pool tiles\n"))
+    )
+    task = task_usecase.create_task(user, "Garden tiles")
+
+    assert [t.name for t in task_usecase.search_tasks(user.id, "tiles", 10)] == [
+        "Pool tiles",
+        task.name,
+    ]
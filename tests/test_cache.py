@@ -0,0 +1,106 @@
+import pytest
+
+from planner.core import events
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.web import cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def _make_cache(max_size: int = 16, ttl: float = 60) -> cache.Cache:
+        if request.param == "memory":
+            return cache.LRUCache(max_size, ttl)
+        return cache.SqliteCache(str(tmp_path / "cache.db"), max_size, ttl)
+
+    return _make_cache
+
+
+def test_cache__get_or_set(make_cache):
+    c = make_cache()
+    calls = []
+
+    assert c.get_or_set("a", lambda: calls.append(1) or [1]) == [1]
+    assert c.get_or_set("a", lambda: calls.append(1) or [1]) == [1]
+    assert calls == [1]
+    assert c.stats() == cache.CacheStats(hits=1, misses=1, evictions=0, size=1)
+
+
+def test_cache__invalidate_tags(make_cache):
+    c = make_cache()
+    c.set("a", 1, tags=["x"])
+    c.set("b", 2, tags=["x", "y"])
+    c.set("c", 3, tags=["z"])
+
+    c.invalidate_tags(["x"])
+    assert (c.get("a"), c.get("b"), c.get("c")) == (None, None, 3)
+
+
+def test_cache__stale_value_is_not_stored(make_cache):
+    c = make_cache()
+
+    def factory():
+        c.invalidate_tags(["x"])
+        return 1
+
+    assert c.get_or_set("a", factory, tags=["x"]) == 1
+    assert c.get("a") is None
+
+
+def test_cache__size_eviction(make_cache):
+    c = make_cache(max_size=2)
+    for key in ["a", "b", "c"]:
+        c.set(key, key)
+
+    assert c.get("a") is None
+    assert (c.get("b"), c.get("c")) == ("b", "c")
+    assert c.stats().evictions == 1
+
+
+def test_cache__ttl_eviction(make_cache):
+    c = make_cache(ttl=0)
+    c.set("a", 1)
+
+    assert c.get("a") is None
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_task_usecases_emit_tasks_changed(make_user):
+    received = []
+    events.subscribe(events.TasksChanged, received.append)
+    try:
+        user = make_user()
+        task1 = task_usecase.create_task(user=user, name="Build a house")
+        task2 = task_usecase.create_task(user=user, name="Walls", parent_task=task1)
+        task3 = task_usecase.create_task(user=user, name="Bricks", parent_task=task2)
+        task_usecase.complete_task(task3)
+        task_usecase.remove_task(task2)
+    finally:
+        events.unsubscribe(events.TasksChanged, received.append)
+
+    assert received == [
+        events.TasksChanged(user.id, frozenset([task1.id]), True),
+        events.TasksChanged(user.id, frozenset([task1.id, task2.id]), False),
+        events.TasksChanged(user.id, frozenset([task1.id, task2.id, task3.id]), False),
+        events.TasksChanged(user.id, frozenset([task1.id, task2.id, task3.id]), True),
+        events.TasksChanged(user.id, frozenset([task1.id, task2.id, task3.id]), False),
+    ]
+
+
+def test_app_caches_get_their_own_invalidations(make_app):
+    handlers = list(events._handlers[events.TasksChanged])
+    app1 = make_app(CACHE_BACKEND="memory")
+    app2 = make_app(CACHE_BACKEND="memory")
+    assert events._handlers[events.TasksChanged] == handlers
+
+    for app in (app1, app2):
+        app.extensions["cache"].set("a", 1, tags=[cache.root_tasks_tag(1)])
+
+    models_db.bind_thread(app1.config["DATABASE"])
+    try:
+        events.emit(events.TasksChanged(1, frozenset(), True))
+    finally:
+        models_db.unbind_thread()
+
+    assert app1.extensions["cache"].get("a") is None
+    assert app2.extensions["cache"].get("a") == 1
@@ -0,0 +1,115 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import peewee as pw
+
+from planner.core import migrations
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.models import db as models_db
+from planner.core.usecase import tasks as task_usecase
+from planner.web import database
+
+
+def test_open_database__connection_per_thread_is_reused(file_database):
+    barrier = threading.Barrier(4)
+    connections_count = file_database.connections_count()
+
+    def run_queries():
+        barrier.wait()
+        for _ in range(10):
+            file_database.execute_sql("SELECT 1")
+        return id(file_database.connection())
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        connection_ids = list(executor.map(lambda _: run_queries(), range(4)))
+        assert file_database.connections_count() >= 4
+
+    assert len(set(connection_ids)) == 4
+    # The pool's threads have exited, their connections go with them.
+    assert file_database.connections_count() == connections_count
+
+    file_database.close_all()
+    assert file_database.connections_count() == 0
+
+
+def test_thread_bound_database_proxy(tmp_path, file_database):
+    other_db = database.open_database(str(tmp_path / "other.db"))
+    migrations.migrate(other_db)
+    User.create(username="default", password_hash="x")
+
+    def create_user_in_other_db():
+        models_db.bind_thread(other_db)
+        try:
+            User.create(username="other", password_hash="x")
+            return [u.username for u in User.select()]
+        finally:
+            models_db.unbind_thread()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(create_user_in_other_db).result() == ["other"]
+
+    assert [u.username for u in User.select()] == ["default"]
+    other_db.close_all()
+
+
+def test_task_usecases__concurrent_writes_keep_aggregates(file_database, make_user):
+    user = make_user()
+    roots = [task_usecase.create_task(user, f"root {i}") for i in range(4)]
+    threads_count, operations_count = 8, 40
+    barrier = threading.Barrier(threads_count)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(operations_count):
+            parent_task = Task.get_or_none(Task.id == rng.choice(roots).id)
+            tasks = list(Task.select().where(Task.root_task == parent_task.id))
+            task = rng.choice(tasks)
+            action = rng.random()
+            # Completion is checked on leaves only: a completed task with
+            # subtasks keeps 100% until its subtasks change, by design.
+            if task.depth < 2 and (task.depth == 0 or action < 0.7):
+                try:
+                    task_usecase.create_task(user, "subtask", parent_task=task)
+                except pw.IntegrityError:
+                    # The parent was removed by another thread meanwhile.
+                    pass
+            elif task.depth == 2 and action < 0.6:
+                task_usecase.complete_task(task)
+            else:
+                task_usecase.remove_task(task)
+
+    with ThreadPoolExecutor(max_workers=threads_count) as executor:
+        for future in [executor.submit(worker, i) for i in range(threads_count)]:
+            future.result()
+
+    assert task_usecase.check_task_aggregates() == []
+    assert Task.select().where(Task.parent_task.is_null()).count() == len(roots)
+
+
+def test_request_threads_connections(make_app):
+    app = make_app(PURGE_ENABLED="false", LOGIN_THROTTLE_ENABLED="false")
+    db = app.config["DATABASE"]
+    form = {"username": "u", "password": "p", "password_copy": "p"}
+    app.test_client().post("/forms/sign-up", data=form)
+
+    def browse():
+        client = app.test_client()
+        client.post("/forms/login", data=form)
+        assert client.get("/active-tasks").status_code == 200
+        return db.connection()
+
+    # A thread per request, as a threaded development server runs them: the
+    # connections of exited threads are closed.
+    for _ in range(50):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(browse).result()
+    assert db.connections_count() <= 1
+
+    # A thread pool keeps its threads' connections between requests.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        connections = {executor.submit(browse).result() for _ in range(20)}
+        assert len(connections) == 1
+        assert db.connections_count() == 2
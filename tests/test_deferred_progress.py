@@ -0,0 +1,75 @@
+import datetime
+
+import pytest
+
+from planner.core.models import DirtyTask
+from planner.core.models import Task
+from planner.core.usecase import tasks as task_usecase
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_deferred_progress(make_user, make_task):
+    user = make_user()
+    project = make_task(user=user)
+    stage = make_task(user=user, parent_task=project)
+    leaves = [make_task(user=user, parent_task=stage) for _ in range(4)]
+
+    for leaf in leaves[:3]:
+        task_usecase.complete_task(leaf, defer_progress=True)
+    task_usecase.remove_task(leaves[3], defer_progress=True)
+
+    # Queued once per task however many changes, the aggregates unchanged.
+    assert sorted(t.task_id for t in DirtyTask.select()) == [project.id, stage.id]
+    assert Task.get_by_id(stage.id).progress == 0
+    assert task_usecase.has_dirty_tasks(user.id)
+
+    a_minute_ago = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    assert task_usecase.recompute_dirty_tasks(10, marked_before=a_minute_ago) == 0
+    assert task_usecase.recompute_dirty_tasks(10) == 2
+
+    assert Task.get_by_id(stage.id).progress == 100
+    assert Task.get_by_id(project.id).progress == 100
+    assert not task_usecase.has_dirty_tasks(user.id)
+    assert task_usecase.check_task_aggregates() == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_deferred_progress__completed_task_keeps_progress(make_user):
+    user = make_user()
+    task = task_usecase.create_task(user=user, name="House")
+    task_usecase.create_task(
+        user=user, name="Walls", parent_task=task, defer_progress=True
+    )
+
+    # Completed after the subtask was queued: the worker leaves it at 100%,
+    # as the synchronous use cases do.
+    task_usecase.complete_task(task, defer_progress=True)
+    task_usecase.recompute_dirty_tasks(10)
+    assert Task.get_by_id(task.id).progress == 100
+    assert Task.get_by_id(task.id).child_count == 1
+
+    # A subtask changed since takes the completion back.
+    task_usecase.complete_task(task, defer_progress=True)
+    task_usecase.create_task(
+        user=user, name="Roof", parent_task=task, defer_progress=True
+    )
+    task_usecase.recompute_dirty_tasks(10)
+    assert Task.get_by_id(task.id).progress == 0
+    assert Task.get_by_id(task.id).child_count == 2
+
+
+def test_deferred_progress__pages_read_own_writes(make_app):
+    # The worker waits a minute: only the page itself can recompute.
+    app = make_app(PROGRESS_DEFERRED="true", PROGRESS_DEBOUNCE_MS="60000")
+    client = app.test_client()
+    form = {"username": "u", "password": "p", "password_copy": "p"}
+    client.post("/forms/sign-up", data=form)
+    client.post("/forms/login", data=form)
+    client.post("/forms/tasks/create", data={"name": "House"})
+    for name in ("Walls", "Roof"):
+        client.post("/forms/tasks/create", data={"name": name, "parent_task_id": 1})
+
+    client.post("/forms/tasks/complete", data={"task_id": 2})
+
+    html = client.get("/active-tasks").get_data(as_text=True)
+    assert "50.0%" in html
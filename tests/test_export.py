@@ -0,0 +1,68 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from planner.core.usecase import export as export_usecase
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_export_tasks(make_user, make_task, monkeypatch):
+    monkeypatch.setattr(export_usecase, "CHUNK_SIZE", 1)
+    user = make_user()
+    task1 = make_task(user=user, name="Build a house", note='4 "bedrooms"\nand pool')
+    task2 = make_task(user=user, parent_task=task1, name="Pool", progress=100)
+    make_task(name="Someone else's")
+
+    chunks = list(export_usecase.export_tasks(user.id, "ndjson"))
+    assert len(chunks) == 2
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert rows == [
+        {
+            "id": task1.id,
+            "parent_id": None,
+            "name": "Build a house",
+            "note": '4 "bedrooms"\nand pool',
+            "progress": 0.0,
+            "created_at": task1.created_at.isoformat(),
+        },
+        {
+            "id": task2.id,
+            "parent_id": task1.id,
+            "name": "Pool",
+            "note": None,
+            "progress": 100.0,
+            "created_at": task2.created_at.isoformat(),
+        },
+    ]
+
+    data = b"".join(export_usecase.export_tasks(user.id, "csv")).decode()
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[0] == list(export_usecase.FIELDS)
+    assert rows[1][:4] == [str(task1.id), "", "Build a house", '4 "bedrooms"\nand pool']
+    assert rows[2][:3] == [str(task2.id), str(task1.id), "Pool"]
+
+    with pytest.raises(ValueError):
+        list(export_usecase.export_tasks(user.id, "xml"))
+
+
+def test_export_tasks__endpoint(make_app):
+    client = make_app().test_client()
+    client.post(
+        "/forms/sign-up", data={"username": "u", "password": "p", "password_copy": "p"}
+    )
+    client.post("/forms/login", data={"username": "u", "password": "p"})
+    client.post("/forms/tasks/create", data={"name": "Task"})
+
+    response = client.get("/export?format=csv&gzip=1")
+    assert response.mimetype == "application/gzip"
+    assert 'filename="tasks.csv.gz"' in response.headers["Content-Disposition"]
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert lines[0] == ",".join(export_usecase.FIELDS)
+    assert lines[1].startswith("1,,Task,,0.0,")
+
+    response = client.get("/export")
+    assert response.mimetype == "application/x-ndjson"
+    assert json.loads(response.data)["name"] == "Task"
@@ -0,0 +1,61 @@
+import pytest
+
+from planner.core.models import User
+from planner.core.usecase import tasks as task_usecase
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_tasks_version__bumped_by_changes(make_user):
+    user = make_user()
+    other_user = make_user()
+
+    task = task_usecase.create_task(user, "Task")
+    subtask = task_usecase.create_task(user, "Subtask", parent_task=task)
+    assert task_usecase.get_tasks_version(user.id) == 2
+
+    task_usecase.complete_task(subtask)
+    task_usecase.remove_task(task)
+    assert task_usecase.get_tasks_version(user.id) == 4
+    assert task_usecase.get_tasks_version(other_user.id) == 0
+
+    task_usecase.remove_task(task)
+    assert User.get_by_id(user.id).tasks_version == 4
+
+
+def test_conditional_page(make_app):
+    client = make_app().test_client()
+    client.post(
+        "/forms/sign-up", data={"username": "u", "password": "p", "password_copy": "p"}
+    )
+    client.post("/forms/login", data={"username": "u", "password": "p"})
+    client.get("/active-tasks")
+
+    response = client.get("/active-tasks")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get("/active-tasks", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+    client.post("/forms/tasks/create", data={"name": "Task"})
+    response = client.get("/active-tasks", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Task" in response.data
+    assert response.headers["ETag"] != etag
+
+
+def test_conditional_page__disabled(make_app):
+    client = make_app(
+        HTTP_ETAGS_ENABLED="false", HTTP_CACHE_CONTROL="no-store"
+    ).test_client()
+    client.post(
+        "/forms/sign-up", data={"username": "u", "password": "p", "password_copy": "p"}
+    )
+    client.post("/forms/login", data={"username": "u", "password": "p"})
+
+    response = client.get("/active-tasks")
+    assert "ETag" not in response.headers
+    assert response.headers["Cache-Control"] == "no-store"
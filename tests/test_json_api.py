@@ -0,0 +1,79 @@
+import pytest
+
+
+@pytest.fixture
+def client(make_app):
+    client = make_app(API_PAGE_SIZE="2").test_client()
+    client.post(
+        "/forms/sign-up", data={"username": "u", "password": "p", "password_copy": "p"}
+    )
+    client.post("/forms/login", data={"username": "u", "password": "p"})
+    return client
+
+
+def test_tasks_batch_and_list(client):
+    response = client.post(
+        "/api/v1/tasks/batch",
+        json={
+            "operations": [
+                {"op": "create", "name": "House"},
+                {"op": "create", "name": "Pool", "parent_ref": 0},
+                {"op": "create", "name": "Garden", "parent_ref": 0},
+                {"op": "create", "name": "Travel"},
+                {"op": "create", "name": "Books"},
+            ]
+        },
+    )
+    assert response.json == {"results": [{"id": i} for i in range(1, 6)]}
+
+    response = client.post(
+        "/api/v1/tasks/batch",
+        json={"operations": [{"op": "complete", "id": 2}, {"op": "remove", "id": 3}]},
+    )
+    assert response.json == {"results": [{"id": None}, {"id": None}]}
+
+    response = client.get("/api/v1/tasks?fields=id,name,progress")
+    assert response.json["tasks"] == [
+        {"id": 5, "name": "Books", "progress": 0.0},
+        {"id": 4, "name": "Travel", "progress": 0.0},
+    ]
+    next_cursor = response.json["next_cursor"]
+    response = client.get(f"/api/v1/tasks?fields=name&after={next_cursor}")
+    assert response.json["tasks"] == [{"name": "House"}]
+    assert response.json["next_cursor"] is None
+
+    response = client.get("/api/v1/tasks?status=completed")
+    assert response.json["tasks"] == [
+        {"id": 1, "parent_id": None, "name": "House", "progress": 100.0}
+    ]
+    response = client.get("/api/v1/tasks?parent_id=1&fields=name,depth")
+    assert response.json["tasks"] == [{"name": "Pool", "depth": 1}]
+
+    response = client.get("/api/v1/tasks/2?fields=name,child_count")
+    assert response.json == {"task": {"name": "Pool", "child_count": 0}}
+
+
+def test_tasks_batch__invalid_operation(client):
+    response = client.post(
+        "/api/v1/tasks/batch",
+        json={
+            "operations": [{"op": "create", "name": "House"}, {"op": "remove", "id": 7}]
+        },
+    )
+    assert response.status_code == 409
+    assert response.json == {"error": "operation 1: no task 7", "index": 1}
+    assert client.get("/api/v1/tasks").json["tasks"] == []
+
+    response = client.post("/api/v1/tasks/batch", json={"operations": [{"op": "x"}]})
+    assert response.status_code == 400
+
+
+def test_tasks__errors(client):
+    assert client.get("/api/v1/tasks/1").status_code == 404
+    assert client.get("/api/v1/tasks?fields=password").status_code == 400
+    assert client.get("/api/v1/tasks?after=bad").status_code == 400
+
+    client.post("/forms/logout")
+    response = client.get("/api/v1/tasks")
+    assert response.status_code == 401
+    assert response.json == {"error": "not authorized"}
@@ -0,0 +1,64 @@
+import logging
+
+from planner.web import metrics
+
+
+def test_metrics_registry__render():
+    registry = metrics.MetricsRegistry()
+    requests = registry.counter("requests", "Requests.")
+    latency = registry.histogram("latency_seconds", "Latency.", [0.1, 1])
+    registry.add_collector(
+        lambda: [metrics.MetricFamily("size", "gauge", "Size.", [("", {}, 3)])]
+    )
+
+    requests.inc(endpoint="a")
+    requests.inc(2, endpoint="a")
+    latency.observe(0.5, endpoint="a")
+    latency.observe(2, endpoint="a")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests Requests.",
+        "# TYPE requests counter",
+        'requests_total{endpoint="a"} 3',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{endpoint="a",le="0.1"} 0',
+        'latency_seconds_bucket{endpoint="a",le="1"} 1',
+        'latency_seconds_bucket{endpoint="a",le="+Inf"} 2',
+        'latency_seconds_sum{endpoint="a"} 2.5',
+        'latency_seconds_count{endpoint="a"} 2',
+        "# HELP size Size.",
+        "# TYPE size gauge",
+        "size 3",
+    ]
+
+
+def test_metrics__requests_and_queries(make_app, caplog):
+    app = make_app(METRICS_ENABLED="true", SLOW_QUERY_THRESHOLD_MS="0")
+    client = app.test_client()
+
+    with caplog.at_level(logging.WARNING, logger="planner.slow_query"):
+        client.post(
+            "/forms/sign-up",
+            data={"username": "u", "password": "p", "password_copy": "p"},
+        )
+        client.post("/forms/login", data={"username": "u", "password": "p"})
+        client.get("/active-tasks")
+
+    assert any("slow query" in r.message for r in caplog.records)
+
+    text = client.get("/metrics").data.decode()
+    assert (
+        'planner_request_duration_seconds_count{endpoint="pages.active_tasks"'
+        ',method="GET",status="200"} 1'
+    ) in text
+    assert 'planner_request_queries_sum{endpoint="pages.active_tasks"} 2' in text
+    assert 'planner_request_queries_sum{endpoint="forms.login"} 1' in text
+    assert "planner_password_hashes_total 2" in text
+    assert "planner_cache_misses_total 1" in text
+
+
+def test_metrics__disabled(make_app):
+    app = make_app()
+    assert "metrics.metrics" not in app.view_functions
+    assert "metrics" not in app.extensions
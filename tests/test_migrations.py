@@ -0,0 +1,99 @@
+import peewee as pw
+import pytest
+
+from planner.core import migrations
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.usecase import tasks as task_usecase
+
+
+def explain_query_plan(query: pw.SelectQuery) -> str:
+    sql, params = query.sql()
+    rows = query.model._meta.database.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params)
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_migrate():
+    db = pw.SqliteDatabase(":memory:")
+    versions = [version for version, _ in migrations.list_migrations()]
+
+    assert migrations.current_version(db) == 0
+    assert migrations.migrate(db, target=versions[1]) == [
+        name for version, name in migrations.list_migrations()[:2]
+    ]
+    assert migrations.current_version(db) == versions[1]
+
+    migrations.migrate(db)
+    assert migrations.current_version(db) == versions[-1]
+    assert migrations.pending_migrations(db) == []
+    assert migrations.migrate(db) == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_active_root_tasks_query_plan():
+    plan = explain_query_plan(task_usecase.select_active_root_tasks(1))
+
+    assert "USING INDEX task_user_id_parent_task_id_created_at_progress" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_completed_root_tasks_query_plan():
+    query = task_usecase.select_completed_root_tasks(1).order_by(
+        Task.created_at.desc(), Task.id.desc()
+    )
+    plan = explain_query_plan(query)
+
+    assert "USING INDEX task_user_id_parent_task_id_progress_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_subtasks_query_plan(make_task):
+    plan = explain_query_plan(task_usecase.select_subtasks(make_task()))
+
+    assert "USING INDEX task_parent_task_id_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_migrate__indexes_existing_tasks_for_search(models_db_init_context, make_task):
+    db = pw.SqliteDatabase(":memory:")
+    with models_db_init_context(db):
+        migrations.migrate(db, target=5)
+        # The users table is older than the model here.
+        db.execute_sql(
+            "INSERT INTO users (id, username, password_hash) VALUES (1, 'u', '-')"
+        )
+        task = make_task(user=User(id=1), name="Build a house")
+
+        migrations.migrate(db)
+        assert task_usecase.search_tasks(task.user_id, "house", 10) == [task]
+
+
+def test_migrate__backfills_task_aggregates():
+    db = pw.SqliteDatabase(":memory:")
+    migrations.migrate(db, target=1)
+    db.execute_sql(
+        "INSERT INTO users (id, username, password_hash) VALUES (1, 'u', '-')"
+    )
+    # A task derived from its subtasks, and one completed before them.
+    for task_id, parent_task_id, progress in [
+        (1, None, 0),
+        (2, 1, 100),
+        (3, 1, 0),
+        (4, None, 100),
+        (5, 4, 0),
+    ]:
+        db.execute_sql(
+            "INSERT INTO tasks"
+            " (id, user_id, parent_task_id, name, progress, created_at)"
+            " VALUES (?, 1, ?, 't', ?, '2021-01-01 00:00:00')",
+            (task_id, parent_task_id, progress),
+        )
+
+    migrations.migrate(db, target=2)
+    rows = db.execute_sql(
+        "SELECT child_count, child_progress_sum, progress FROM tasks"
+        " WHERE id IN (1, 4) ORDER BY id"
+    ).fetchall()
+    assert rows == [(2, 100, 50), (1, 0, 100)]
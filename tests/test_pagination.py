@@ -0,0 +1,57 @@
+import datetime
+
+import pytest
+
+from planner.core.models import Task
+from planner.web import pagination
+
+
+@pytest.fixture
+def completed_tasks(make_user, make_task):
+    user = make_user()
+    created_at = datetime.datetime(2021, 1, 1)
+    for i in range(7):
+        make_task(
+            user=user,
+            name=f"Task {i}",
+            progress=100,
+            created_at=created_at + datetime.timedelta(days=i // 2),
+        )
+
+    return Task.select().where(Task.user == user)
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_paginate__keyset(completed_tasks):
+    page1 = pagination.paginate(completed_tasks, 3)
+    assert [t.name for t in page1.items] == ["Task 6", "Task 5", "Task 4"]
+    assert page1.previous_cursor is None
+
+    page2 = pagination.paginate(completed_tasks, 3, after=page1.next_cursor)
+    assert [t.name for t in page2.items] == ["Task 3", "Task 2", "Task 1"]
+
+    page3 = pagination.paginate(completed_tasks, 3, after=page2.next_cursor)
+    assert [t.name for t in page3.items] == ["Task 0"]
+    assert page3.next_cursor is None
+
+    page2 = pagination.paginate(completed_tasks, 3, before=page3.previous_cursor)
+    assert [t.name for t in page2.items] == ["Task 3", "Task 2", "Task 1"]
+
+    page1 = pagination.paginate(completed_tasks, 3, before=page2.previous_cursor)
+    assert [t.name for t in page1.items] == ["Task 6", "Task 5", "Task 4"]
+    assert page1.previous_cursor is None
+    assert page1.next_cursor is not None
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_paginate__offset(completed_tasks):
+    page = pagination.paginate(completed_tasks, 3, offset=3)
+    assert [t.name for t in page.items] == ["Task 3", "Task 2", "Task 1"]
+
+    previous_page = pagination.paginate(completed_tasks, 3, before=page.previous_cursor)
+    assert [t.name for t in previous_page.items] == ["Task 6", "Task 5", "Task 4"]
+
+
+def test_decode_cursor__invalid():
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor("not-a-cursor")
@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from planner.core.security import PasswordHasher
+from planner.core.security import PasswordHasherBusy
+from planner.core.security import PBKDF2_PasswordHasher
+from planner.core.security import PooledPasswordHasher
+
+
+class BlockingPasswordHasher(PasswordHasher):
+    def __init__(self):
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def make_hash(self, password: str) -> str:
+        self.started.release()
+        self.release.wait()
+        return password[::-1]
+
+    def is_hash_correct(self, password_hash: str, password: str) -> bool:
+        return password_hash == self.make_hash(password)
+
+
+def test_pbkdf2_password_hasher__needs_rehash():
+    old_hasher = PBKDF2_PasswordHasher(iterations=1000)
+    new_hasher = PBKDF2_PasswordHasher(iterations=2000)
+    password_hash = old_hasher.make_hash("password")
+
+    assert not old_hasher.needs_rehash(password_hash)
+    assert new_hasher.needs_rehash(password_hash)
+    assert new_hasher.is_hash_correct(password_hash, "password")
+
+
+def test_pooled_password_hasher():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        hasher = PooledPasswordHasher(
+            PBKDF2_PasswordHasher(iterations=1000), executor, max_pending=2
+        )
+        password_hash = hasher.make_hash("password")
+
+        assert hasher.is_hash_correct(password_hash, "password")
+        assert not hasher.needs_rehash(password_hash)
+
+        stats = hasher.stats()
+        assert (stats.completed, stats.rejected) == (2, 0)
+        assert stats.hash_seconds > 0
+
+
+def test_pooled_password_hasher__rejects_when_saturated():
+    blocking_hasher = BlockingPasswordHasher()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        hasher = PooledPasswordHasher(blocking_hasher, executor, max_pending=1)
+
+        with ThreadPoolExecutor(max_workers=1) as callers:
+            future = callers.submit(hasher.make_hash, "password")
+            blocking_hasher.started.acquire()
+
+            with pytest.raises(PasswordHasherBusy):
+                hasher.make_hash("password")
+
+            blocking_hasher.release.set()
+            assert future.result() == "drowssap"
+
+        assert hasher.make_hash("password") == "drowssap"
+        assert (hasher.stats().completed, hasher.stats().rejected) == (2, 1)
@@ -0,0 +1,83 @@
+import datetime
+import sqlite3
+
+from planner.core import migrations
+from planner.core import sharding
+from planner.core.models import ArchivedTask
+from planner.core.models import Task
+from planner.core.models import User
+from planner.core.usecase import tasks as task_usecase
+from planner.web import database
+
+
+def test_shard_index__is_stable():
+    # Changing the hash would strand every user's tasks in another shard.
+    assert [sharding.shard_index(i, 3) for i in range(1, 7)] == [2, 1, 1, 1, 1, 1]
+
+
+def test_requests_run_on_user_shard(make_app, tmp_path):
+    app = make_app(DB_SHARDS="2", DB_SHARD_PATH=str(tmp_path / "shard-{shard}.db"))
+    for username in ("alice", "bob", "carol", "dave"):
+        client = app.test_client()
+        form = {"username": username, "password": "p", "password_copy": "p"}
+        client.post("/forms/sign-up", data=form)
+        client.post("/forms/login", data=form)
+        client.post("/forms/tasks/create", data={"name": f"{username}'s task"})
+        assert f"{username}&#39;s task" in client.get("/active-tasks").get_data(
+            as_text=True
+        )
+
+    def tasks_by_user(path):
+        conn = sqlite3.connect(path)
+        try:
+            return sorted(conn.execute("SELECT user_id, name FROM tasks"))
+        finally:
+            conn.close()
+
+    assert tasks_by_user(tmp_path / "planner.db") == []
+    assert tasks_by_user(tmp_path / "shard-0.db") == [(4, "dave's task")]
+    assert tasks_by_user(tmp_path / "shard-1.db") == [
+        (1, "alice's task"),
+        (2, "bob's task"),
+        (3, "carol's task"),
+    ]
+
+
+def test_rebalance(tmp_path, models_db_init_context):
+    directory = database.open_database(str(tmp_path / "planner.db"))
+    shards = sharding.Shards(
+        directory,
+        [database.open_database(str(tmp_path / f"shard-{i}.db")) for i in range(2)],
+    )
+    for db in shards.all():
+        migrations.migrate(db)
+    # Users 1 and 2 both belong to shard 1.
+    with models_db_init_context(directory):
+        alice = User.create(username="alice", password_hash="-")
+        bob = User.create(username="bob", password_hash="-")
+        house = task_usecase.create_task(alice, "House")
+        task_usecase.create_task(alice, "Walls", parent_task=house)
+        task_usecase.complete_task(task_usecase.create_task(alice, "Old"))
+        task_usecase.archive_completed_trees(
+            datetime.datetime.utcnow() + datetime.timedelta(days=1), batch_size=10
+        )
+    shards.ensure_user(bob.id)
+    with models_db_init_context(shards.shards[1]):
+        task_usecase.create_task(bob, "Garden")
+
+    moved = sharding.rebalance(shards, shards.all())
+
+    assert moved == [(alice.id, 2)]
+    with models_db_init_context(directory):
+        assert Task.select().count() == 0
+        assert User.select().count() == 2
+    with models_db_init_context(shards.shards[1]):
+        # Task 1 is bob's there: alice's tasks are renumbered.
+        chain = task_usecase.get_task_chain(alice.id, 3)
+        assert [(t.id, t.name, t.path) for t in chain] == [
+            (2, "House", "/"),
+            (3, "Walls", "/2/"),
+        ]
+        assert ArchivedTask.get().name == "Old"
+        assert task_usecase.check_task_aggregates() == []
+        assert task_usecase.get_tasks_version(alice.id) > 0
@@ -0,0 +1,107 @@
+import datetime
+
+import pytest
+
+from planner.core.models import DailyTaskStats
+from planner.core.models import Task
+from planner.core.usecase import bulk_import
+from planner.core.usecase import stats as stats_usecase
+from planner.core.usecase import tasks as task_usecase
+
+
+def _stats_rows(user_id):
+    # fmt: off
+    return [
+        (s.day, s.completed_count, s.timed_count, round(s.completion_seconds))
+        for s in (
+            DailyTaskStats
+            .select()
+            .where(DailyTaskStats.user == user_id)
+            .order_by(DailyTaskStats.day)
+        )
+    ]
+    # fmt: on
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_task_stats__maintained_by_use_cases(make_user, make_task):
+    user = make_user()
+    today = datetime.datetime.utcnow().date()
+    an_hour_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    project = make_task(user=user)
+    stage = make_task(user=user, parent_task=project)
+    leaves = [
+        make_task(user=user, parent_task=stage, created_at=an_hour_ago)
+        for _ in range(3)
+    ]
+    other = make_task(user=user, created_at=an_hour_ago)
+
+    for task in [*leaves, other]:
+        task_usecase.complete_task(task)
+    # Completing a task again is not another completion.
+    task_usecase.complete_task(Task.get_by_id(other.id))
+    assert _stats_rows(user.id) == [(today, 4, 4, 4 * 3600)]
+
+    # The subtree's completions go along with it, and the day once empty.
+    task_usecase.remove_task(Task.get_by_id(stage.id))
+    assert _stats_rows(user.id) == [(today, 1, 1, 3600)]
+    task_usecase.remove_task(Task.get_by_id(other.id))
+    assert _stats_rows(user.id) == []
+
+    task_usecase.import_tasks(user, bulk_import.parse("outline", ["[x] Done", "Todo"]))
+    assert _stats_rows(user.id) == [(today, 1, 0, 0)]
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_backfill_task_stats(make_user, make_task):
+    user = make_user()
+    a_week_ago = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+    # Completed before completions were recorded.
+    legacy = make_task(user=user, created_at=a_week_ago, progress=100)
+    project = make_task(user=user)
+    leaves = [make_task(user=user, parent_task=project) for _ in range(2)]
+    task_usecase.complete_task(leaves[0])
+    task_usecase.remove_task(Task.get_by_id(leaves[1].id))
+    expected = _stats_rows(user.id)
+    DailyTaskStats.delete().execute()
+
+    assert stats_usecase.backfill_task_stats() == 1
+
+    assert Task.get_by_id(legacy.id).completed_at == a_week_ago
+    assert _stats_rows(user.id) == [(a_week_ago.date(), 1, 0, 0), *expected]
+
+    today = datetime.datetime.utcnow().date()
+    days = stats_usecase.get_daily_stats(user.id, a_week_ago.date(), today)
+    assert [d.completed_count for d in days] == [1, 0, 0, 0, 0, 0, 0, 1]
+    weeks = stats_usecase.get_weekly_stats(user.id, a_week_ago.date(), today)
+    assert sum(w.completed_count for w in weeks) == 2
+    assert weeks[0].first_day.weekday() == 0
+
+
+def test_stats_page(make_app):
+    app = make_app()
+    client = app.test_client()
+    form = {"username": "u", "password": "p", "password_copy": "p"}
+    client.post("/forms/sign-up", data=form)
+    client.post("/forms/login", data=form)
+    client.post("/forms/tasks/create", data={"name": "House"})
+    client.post("/forms/tasks/complete", data={"task_id": 1})
+
+    html = client.get("/stats").get_data(as_text=True)
+    assert "1 task(s) completed in 12 weeks" in html
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_task_stats__maintained_by_task_operations(make_user, make_task):
+    user = make_user()
+    today = datetime.datetime.utcnow().date()
+    tasks = [make_task(user=user) for _ in range(2)]
+    Op = task_usecase.TaskOperation
+
+    task_usecase.apply_task_operations(
+        user, [Op("complete", task_id=t.id) for t in tasks]
+    )
+    assert [row[:2] for row in _stats_rows(user.id)] == [(today, 2)]
+
+    task_usecase.apply_task_operations(user, [Op("remove", task_id=tasks[0].id)])
+    assert [row[:2] for row in _stats_rows(user.id)] == [(today, 1)]
@@ -1,5 +1,6 @@
 import datetime
 
+import peewee as pw
 import pytest
 
 from planner.core.models import Task
@@ -42,6 +43,9 @@ def test_remove_task(make_task):
     assert Task.select().count() == 1
 
     task_usecase.remove_task(task)
+    assert task_usecase.select_tasks(task.user_id).count() == 0
+
+    assert task_usecase.purge_removed_tasks(batch_size=10) == 1
     assert Task.select().count() == 0
 
 
@@ -54,6 +58,7 @@ def test_remove_task__recursive(make_task):
     assert Task.select().count() == 3
 
     task_usecase.remove_task(task2)
+    task_usecase.purge_removed_tasks(batch_size=10)
     assert Task.select().count() == 1
 
 
@@ -66,32 +71,49 @@ def test_complete_task(make_task):
 
 
 @pytest.mark.usefixtures("with_memory_database")
-def test_recalculate_task_chain_progress(make_user, make_task):
+def test_recalculate_task_chain_progress(make_user):
     user = make_user()
-    parent_task = make_task(user=user)
-    child_task1 = make_task(user=user, parent_task=parent_task)
-    child_task2 = make_task(user=user, parent_task=parent_task)
-
-    task_usecase._recalculate_task_chain_progress(parent_task)
-    assert parent_task.progress == 0
+    parent_task = task_usecase.create_task(user=user, name="parent")
+    child_task1 = task_usecase.create_task(
+        user=user, name="child 1", parent_task=parent_task
+    )
+    child_task2 = task_usecase.create_task(
+        user=user, name="child 2", parent_task=parent_task
+    )
+    subtask1 = task_usecase.create_task(
+        user=user, name="subtask 1", parent_task=child_task1
+    )
+    subtask2 = task_usecase.create_task(
+        user=user, name="subtask 2", parent_task=child_task1
+    )
+    assert Task.get_by_id(parent_task.id).progress == 0
 
-    child_task1.progress = 50
-    child_task1.save()
+    task_usecase.complete_task(subtask1)
+    assert Task.get_by_id(child_task1.id).progress == 50
+    assert Task.get_by_id(parent_task.id).progress == 25
 
-    task_usecase._recalculate_task_chain_progress(parent_task)
-    assert parent_task.progress == 25
+    task_usecase.complete_task(subtask2)
+    assert Task.get_by_id(parent_task.id).progress == 50
 
-    child_task1.progress = 100
-    child_task1.save()
+    task_usecase.complete_task(child_task2)
+    assert Task.get_by_id(parent_task.id).progress == 100
 
-    task_usecase._recalculate_task_chain_progress(parent_task)
-    assert parent_task.progress == 50
 
-    child_task2.progress = 100
-    child_task2.save()
+@pytest.mark.usefixtures("with_memory_database")
+def test_recalculate_task_chain_progress__removed_children_not_counted(make_user):
+    user = make_user()
+    parent_task = task_usecase.create_task(user=user, name="parent")
+    child_task1 = task_usecase.create_task(
+        user=user, name="child 1", parent_task=parent_task
+    )
+    child_task2 = task_usecase.create_task(
+        user=user, name="child 2", parent_task=parent_task
+    )
+    task_usecase.complete_task(child_task1)
+    assert Task.get_by_id(parent_task.id).progress == 50
 
-    task_usecase._recalculate_task_chain_progress(parent_task)
-    assert parent_task.progress == 100
+    task_usecase.remove_task(child_task2)
+    assert Task.get_by_id(parent_task.id).progress == 100
 
 
 @pytest.mark.usefixtures("with_memory_database")
@@ -170,3 +192,395 @@ def test_recalculate_task_chain_progress__long_task_chain_completion(
     assert task3.progress == 100
     assert task4.progress == 100
     assert task5.progress == 100
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_create_task__updates_parent_aggregates(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1, progress=100)
+
+    task_usecase.create_task(user=user, name="Go for a walk", parent_task=task2)
+
+    task1 = Task.get_by_id(task1.id)
+    task2 = Task.get_by_id(task2.id)
+    assert (task2.child_count, task2.child_progress_sum, task2.progress) == (1, 0, 0)
+    assert (task1.child_count, task1.child_progress_sum, task1.progress) == (1, 0, 0)
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_complete_task__wide_tree(make_user, make_task):
+    user = make_user()
+    root = make_task(user=user)
+    parent = make_task(user=user, parent_task=root)
+    for _ in range(50):
+        make_task(user=user, parent_task=parent)
+    leaf = make_task(user=user, parent_task=parent)
+
+    task_usecase.complete_task(leaf)
+
+    assert Task.get_by_id(parent.id).progress == round(100 / 51, 2)
+    assert Task.get_by_id(root.id).progress == round(100 / 51, 2)
+    assert task_usecase.check_task_aggregates() == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_check_task_aggregates(make_user):
+    user = make_user()
+    task1 = task_usecase.create_task(user=user, name="Build a house")
+    task2 = task_usecase.create_task(user=user, name="Walls", parent_task=task1)
+    task3 = task_usecase.create_task(user=user, name="Bricks", parent_task=task2)
+    task_usecase.complete_task(task3)
+    assert task_usecase.check_task_aggregates() == []
+
+    Task.update(child_count=0, child_progress_sum=0).where(
+        Task.id == task2.id
+    ).execute()
+
+    drift = task_usecase.check_task_aggregates()
+    assert drift == [
+        task_usecase.TaskAggregatesDrift(
+            task_id=task2.id, stored=(0, 0, 100), expected=(1, 100, 100)
+        ),
+    ]
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_check_task_aggregates__completed_task_with_subtasks(make_user):
+    user = make_user()
+    task = task_usecase.create_task(user=user, name="Build a house")
+    task_usecase.create_task(user=user, name="Walls", parent_task=task)
+    task_usecase.complete_task(task)
+
+    assert task_usecase.check_task_aggregates() == []
+    assert task_usecase.rebuild_task_aggregates() == []
+    assert Task.get_by_id(task.id).progress == 100
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_rebuild_task_aggregates(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1)
+    make_task(user=user, parent_task=task2, progress=100)
+    Task.update(child_count=0, child_progress_sum=0).execute()
+
+    drift = task_usecase.rebuild_task_aggregates()
+    assert [i.task_id for i in drift] == [task1.id, task2.id]
+    assert task_usecase.check_task_aggregates() == []
+    assert Task.get_by_id(task1.id).progress == 100
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_create_task__hierarchy(make_user):
+    user = make_user()
+    task1 = task_usecase.create_task(user=user, name="Build a house")
+    task2 = task_usecase.create_task(user=user, name="Walls", parent_task=task1)
+    task3 = task_usecase.create_task(user=user, name="Bricks", parent_task=task2)
+
+    assert (task1.root_task_id, task1.path, task1.depth) == (task1.id, "/", 0)
+    assert (task2.root_task_id, task2.path, task2.depth) == (task1.id, "/1/", 1)
+    assert (task3.root_task_id, task3.path, task3.depth) == (task1.id, "/1/2/", 2)
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_task_ancestors(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1)
+    task3 = make_task(user=user, parent_task=task2)
+
+    assert task_usecase.get_task_ancestors(task1) == []
+    assert task_usecase.get_task_ancestors(task3) == [task1, task2]
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_task_subtree(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1)
+    task3 = make_task(user=user, parent_task=task2)
+    task4 = make_task(user=user, parent_task=task1)
+    for _ in range(9):
+        make_task(user=user)
+    task14 = make_task(user=user, parent_task=task1)
+
+    assert task_usecase.get_task_subtree(task1) == [task2, task4, task14, task3]
+    assert task_usecase.get_task_subtree(task2) == [task3]
+    assert task_usecase.count_task_descendants(task1) == 4
+    assert task_usecase.count_task_descendants(task3) == 0
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_remove_task__deep_subtree(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1)
+    parent_task = task2
+    for _ in range(20):
+        parent_task = make_task(user=user, parent_task=parent_task)
+    task3 = make_task(user=user, parent_task=task1)
+
+    task_usecase.remove_task(task2)
+    assert task_usecase.check_task_aggregates() == []
+
+    # The subtree goes in batches, subtasks before their parents.
+    assert [task_usecase.purge_removed_tasks(batch_size=5) for _ in range(6)] == [
+        5,
+        5,
+        5,
+        5,
+        1,
+        0,
+    ]
+    assert list(Task.select()) == [task1, task3]
+    assert task_usecase.check_task_aggregates() == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_remove_task__hides_subtree_until_purged(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user, name="House")
+    task2 = make_task(user=user, parent_task=task1, name="Walls")
+    task3 = make_task(user=user, parent_task=task2, name="Bricks")
+    task4 = make_task(user=user, parent_task=task1, name="Roof")
+    task_usecase.complete_task(task4)
+
+    task_usecase.remove_task(task2)
+
+    task1 = Task.get_by_id(task1.id)
+    assert (task1.child_count, task1.progress) == (1, 100)
+    assert task_usecase.get_task(user.id, task3.id) is None
+    assert task_usecase.get_task_chain(user.id, task3.id) == []
+    assert [t.id for t in task_usecase.select_subtasks(task1)] == [task4.id]
+    assert task_usecase.get_task_subtree(task1) == [task4]
+    assert task_usecase.search_tasks(user.id, "Bricks", 10) == []
+    assert task_usecase.count_removed_tasks() == 1
+    # Changes to the removed tasks are ignored.
+    task_usecase.complete_task(task3)
+    assert Task.get_by_id(task1.id).progress == 100
+    with pytest.raises(pw.IntegrityError):
+        task_usecase.create_task(user, "Paint", parent_task=task3)
+
+    assert task_usecase.purge_removed_tasks(batch_size=10) == 2
+    assert task_usecase.count_removed_tasks() == 0
+    assert list(Task.select()) == [task1, task4]
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_rebuild_task_hierarchy(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1)
+    task3 = make_task(user=user, parent_task=task2)
+    Task.update(root_task=None, path="/", depth=0).execute()
+
+    assert task_usecase.rebuild_task_hierarchy() == 3
+    assert task_usecase.rebuild_task_hierarchy() == 0
+
+    task3 = Task.get_by_id(task3.id)
+    assert (task3.root_task_id, task3.path, task3.depth) == (task1.id, "/1/2/", 2)
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_search_tasks(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user, name="Build a house", note="4 bedrooms and pool")
+    task2 = make_task(user=user, parent_task=task1, name="Pool", note="for the house")
+    task3 = make_task(user=user, parent_task=task2, name="Buy tiles")
+    make_task(name="House of cards")
+
+    assert task_usecase.search_tasks(user.id, "hous", 10) == [task1, task2]
+    assert task_usecase.search_tasks(user.id, "pool", 10) == [task2, task1]
+    assert task_usecase.search_tasks(user.id, "pool", 1, offset=1) == [task1]
+    assert task_usecase.search_tasks(user.id, 'buy "tiles*', 10) == [task3]
+    assert task_usecase.search_tasks(user.id, " -- ", 10) == []
+
+    task_usecase.remove_task(task2)
+    assert task_usecase.search_tasks(user.id, "pool", 10) == [task1]
+
+    Task.update(name="Build a cottage").where(Task.id == task1.id).execute()
+    assert task_usecase.search_tasks(user.id, "house", 10) == []
+    assert task_usecase.search_tasks(user.id, "cottage", 10) == [task1]
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_tasks_breadcrumbs(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user, name="a")
+    task2 = make_task(user=user, parent_task=task1, name="b")
+    task3 = make_task(user=user, parent_task=task2, name="c")
+
+    breadcrumbs = task_usecase.get_tasks_breadcrumbs([task3, task1])
+    assert breadcrumbs == {task3.id: [task1, task2], task1.id: []}
+    assert [t.name for t in breadcrumbs[task3.id]] == ["a", "b"]
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_task_tree(make_user, make_task):
+    user = make_user()
+    root = make_task(user=user, name="root")
+    a = make_task(user=user, parent_task=root, name="a")
+    b = make_task(user=user, parent_task=root, name="b", progress=100)
+    a1 = make_task(user=user, parent_task=a, name="a1")
+    a1x = make_task(user=user, parent_task=a1, name="a1x")
+    make_task(user=user, name="other root")
+
+    tree = task_usecase.get_task_tree(root, max_depth=3, max_nodes=100)
+    assert tree.root.id == root.id
+    assert [n.id for n in tree.children_of(tree.root)] == [a.id, b.id]
+    (a_node, b_node) = tree.children_of(tree.root)
+    assert [n.id for n in tree.children_of(a_node)] == [a1.id]
+    assert [n.id for n in tree.children_of(tree.children_of(a_node)[0])] == [a1x.id]
+    assert tree.children_of(b_node) == []
+    assert (tree.completed_count(), tree.loaded_count()) == (1, 4)
+
+    tree = task_usecase.get_task_tree(root, max_depth=1, max_nodes=100)
+    (a_node, b_node) = tree.children_of(tree.root)
+    assert tree.children_of(a_node) == []
+    assert tree.hidden_children_count(a_node) == 1
+    assert tree.hidden_children_count(b_node) == 0
+
+    tree = task_usecase.get_task_tree(root, max_depth=3, max_nodes=1)
+    assert [n.id for n in tree.children_of(tree.root)] == [a.id]
+    assert tree.hidden_children_count(tree.root) == 1
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_task_tree__constant_query_count(make_user, make_task, count_queries):
+    user = make_user()
+    small = make_task(user=user)
+    make_task(user=user, parent_task=small)
+
+    large = make_task(user=user)
+    parents = [large]
+    for _ in range(3):
+        parents = [
+            make_task(user=user, parent_task=parent)
+            for parent in parents
+            for _ in range(3)
+        ]
+
+    with count_queries() as small_queries:
+        task_usecase.get_task_tree(small, max_depth=4, max_nodes=500)
+    with count_queries() as large_queries:
+        tree = task_usecase.get_task_tree(large, max_depth=4, max_nodes=500)
+
+    assert tree.loaded_count() == 3 + 9 + 27
+    assert small_queries["count"] == large_queries["count"] == 1
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_task_chain(make_user, make_task):
+    user = make_user()
+    task1 = make_task(user=user)
+    task2 = make_task(user=user, parent_task=task1)
+    task3 = make_task(user=user, parent_task=task2)
+    make_task(user=user, parent_task=task1)
+
+    assert [t.id for t in task_usecase.get_task_chain(user.id, task3.id)] == [
+        task1.id,
+        task2.id,
+        task3.id,
+    ]
+    assert [t.id for t in task_usecase.get_task_chain(user.id, task1.id)] == [task1.id]
+    assert task_usecase.get_task_chain(make_user().id, task3.id) == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_get_task_chain__constant_query_count(make_user, make_task, count_queries):
+    user = make_user()
+    chain = [make_task(user=user)]
+    for _ in range(30):
+        chain.append(make_task(user=user, parent_task=chain[-1]))
+
+    with count_queries() as shallow_queries:
+        task_usecase.get_task_chain(user.id, chain[1].id)
+    with count_queries() as deep_queries:
+        loaded = task_usecase.get_task_chain(user.id, chain[-1].id)
+
+    assert [t.id for t in loaded] == [t.id for t in chain]
+    assert shallow_queries["count"] == deep_queries["count"] == 1
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_apply_task_operations(make_user, make_task):
+    user = make_user()
+    task = make_task(user=user)
+    subtask1 = make_task(user=user, parent_task=task)
+    subtask2 = make_task(user=user, parent_task=task)
+    make_task(user=user, parent_task=subtask2)
+    Op = task_usecase.TaskOperation
+
+    results = task_usecase.apply_task_operations(
+        user,
+        [
+            Op("create", name="New", parent_task_id=subtask1.id),
+            Op("create", name="New child", parent_ref=0),
+            Op("remove", task_id=subtask2.id),
+            Op("create", name="Top"),
+        ],
+    )
+
+    new_task_id, new_child_id, _, top_task_id = results
+    assert results[2] is None
+    new_child = Task.get_by_id(new_child_id)
+    assert new_child.path == f"{subtask1.subtree_path()}{new_task_id}/"
+    assert Task.get_by_id(top_task_id).root_task_id == top_task_id
+
+    task_usecase.apply_task_operations(user, [Op("complete", task_id=new_child_id)])
+    assert Task.get_by_id(task.id).progress == 100
+    assert task_usecase.check_task_aggregates() == []
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_apply_task_operations__invalid_operation_rolls_back(make_user, make_task):
+    user = make_user()
+    task = make_task(user=user)
+    make_task(user=user, parent_task=task)
+    Op = task_usecase.TaskOperation
+
+    with pytest.raises(task_usecase.InvalidTaskOperation) as exc_info:
+        task_usecase.apply_task_operations(
+            user,
+            [
+                Op("create", name="New", parent_task_id=task.id),
+                Op("complete", task_id=-1),
+            ],
+        )
+
+    assert exc_info.value.index == 1
+    assert Task.select().count() == 2
+    assert Task.get_by_id(task.id).child_count == 1
+
+
+@pytest.mark.usefixtures("with_memory_database")
+def test_apply_task_operations__complete_task_with_subtasks(make_user):
+    user = make_user()
+    task = task_usecase.create_task(user=user, name="Task")
+    task_usecase.create_task(user=user, name="Subtask", parent_task=task)
+    other_task = task_usecase.create_task(user=user, name="Other task")
+    Op = task_usecase.TaskOperation
+
+    # As with complete_task, the task is completed whatever its subtasks and
+    # keeps its progress until one of them changes.
+    task_usecase.apply_task_operations(
+        user,
+        [
+            Op("create", name="New", parent_task_id=task.id),
+            Op("complete", task_id=task.id),
+            Op("create", name="New", parent_task_id=other_task.id),
+        ],
+    )
+    assert Task.get_by_id(task.id).progress == 100
+    assert Task.get_by_id(task.id).child_count == 2
+    assert Task.get_by_id(other_task.id).progress == 0
+
+    task_usecase.apply_task_operations(
+        user,
+        [
+            Op("complete", task_id=other_task.id),
+            Op("create", name="New", parent_task_id=other_task.id),
+        ],
+    )
+    assert Task.get_by_id(other_task.id).progress == 0
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from planner.web.throttle import MemoryTokenBuckets
+from planner.web.throttle import SqliteTokenBuckets
+from planner.web.throttle import TokenBucketLimit
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_token_buckets(backend, tmp_path):
+    if backend == "memory":
+        buckets = MemoryTokenBuckets()
+    else:
+        buckets = SqliteTokenBuckets(str(tmp_path / "throttle.db"))
+    limit = TokenBucketLimit(burst=3, per_minute=600)
+
+    assert [buckets.take("a", limit) for _ in range(3)] == [0, 0, 0]
+    assert 0 < buckets.take("a", limit) <= 0.1
+    assert buckets.take("b", limit) == 0
+
+    time.sleep(0.1)
+    assert buckets.take("a", limit) == 0
+
+    buckets.prune(0)
+    assert [buckets.take("a", limit) for _ in range(3)] == [0, 0, 0]
+
+
+def test_sqlite_token_buckets__shared(tmp_path):
+    # Two processes' stores on one file drain the same bucket.
+    path = str(tmp_path / "throttle.db")
+    first, second = SqliteTokenBuckets(path), SqliteTokenBuckets(path)
+    limit = TokenBucketLimit(burst=2, per_minute=1)
+
+    assert first.take("a", limit) == 0
+    assert second.take("a", limit) == 0
+    assert first.take("a", limit) > 59
+
+
+def test_login_throttle(make_app):
+    app = make_app(LOGIN_THROTTLE_USERNAME_BURST="2")
+    client = app.test_client()
+    form = {"username": "u", "password": "p", "password_copy": "p"}
+    client.post("/forms/sign-up", data=form)
+
+    for _ in range(2):
+        response = client.post("/forms/login", data=form)
+        assert response.status_code == 302
+
+    # Turned down before the user is even looked up.
+    queries = []
+    app.config["DATABASE"].add_query_listener(lambda sql, _: queries.append(sql))
+    response = client.post("/forms/login", data=form)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert queries == []
+    # Another user from the same address is not held back.
+    response = client.post("/forms/login", data={"username": "v", "password": "p"})
+    assert response.status_code == 302
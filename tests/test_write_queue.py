@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from planner.core import events
+from planner.core.models import Task
+from planner.core.usecase import tasks as task_usecase
+from planner.core.write_queue import WriteQueue
+
+
+@pytest.fixture
+def make_write_queue(file_database):
+    write_queues = []
+
+    def _make_write_queue(max_batch_size: int = 64, max_delay: float = 0.05):
+        write_queue = WriteQueue(file_database, max_batch_size, max_delay)
+        write_queues.append(write_queue)
+        return write_queue
+
+    yield _make_write_queue
+
+    for write_queue in write_queues:
+        write_queue.close()
+
+
+def test_write_queue__groups_concurrent_writes(make_write_queue, make_user):
+    write_queue = make_write_queue()
+    user = make_user()
+    root = task_usecase.create_task(user, "root")
+    barrier = threading.Barrier(16)
+
+    def create_subtask(i: int) -> Task:
+        barrier.wait()
+        return write_queue.call(task_usecase.create_task, user, f"#{i}", None, root)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        subtasks = list(executor.map(create_subtask, range(16)))
+
+    assert sorted(t.name for t in subtasks) == sorted(f"#{i}" for i in range(16))
+    assert Task.get_by_id(root.id).child_count == 16
+
+    stats = write_queue.stats()
+    assert stats.operations == 16
+    assert stats.batches < 16
+    assert task_usecase.check_task_aggregates() == []
+
+
+def test_write_queue__failed_operation_is_isolated(make_write_queue, make_user):
+    write_queue = make_write_queue(max_delay=0.2)
+    user = make_user()
+
+    def create_and_fail():
+        task_usecase.create_task(user, "rolled back")
+        raise RuntimeError("boom")
+
+    failing = write_queue.submit(create_and_fail)
+    succeeding = write_queue.submit(task_usecase.create_task, user, "stored")
+
+    with pytest.raises(RuntimeError):
+        failing.result()
+    assert succeeding.result().name == "stored"
+
+    assert [t.name for t in Task.select()] == ["stored"]
+    stats = write_queue.stats()
+    assert (stats.batches, stats.operations, stats.failed_operations) == (1, 2, 1)
+
+
+def test_write_queue__events_are_emitted_after_commit(make_write_queue, make_user):
+    write_queue = make_write_queue()
+    user = make_user()
+    seen = []
+
+    def handler(event: events.TasksChanged) -> None:
+        # A reader on another connection must already see the change.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            seen.append(executor.submit(Task.select().count).result())
+
+    events.subscribe(events.TasksChanged, handler)
+    try:
+        write_queue.call(task_usecase.create_task, user, "root")
+        write_queue.call(task_usecase.create_task, user, "another root")
+        with pytest.raises(RuntimeError):
+            write_queue.call(_raise_after, task_usecase.create_task, user, "x")
+    finally:
+        events.unsubscribe(events.TasksChanged, handler)
+
+    assert seen == [1, 2]
+
+
+def _raise_after(func, *args):
+    func(*args)
+    raise RuntimeError("boom")